@@ -0,0 +1,11 @@
+import pytest
+
+
+@pytest.fixture(scope='session', autouse=True)
+def temp_files(django_test_environment):
+    """Кэш и карта сайта тестов — во временном каталоге, а не в рабочей
+    копии (как TempFilesRunner для manage.py test)."""
+    from core.testing import temp_files
+
+    with temp_files():
+        yield
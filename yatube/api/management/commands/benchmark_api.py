@@ -0,0 +1,76 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from posts.models import Group, User
+
+DUMMY_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает время ответа и объём HTML-страниц лент и тех же '
+        'данных из JSON API.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=20,
+            help='Сколько раз запрашивать каждую страницу.'
+        )
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Отключить кэш: замерить саму отрисовку и сериализацию.'
+        )
+
+    def pages(self):
+        group = Group.objects.order_by('pk').first()
+        author = User.objects.filter(posts__isnull=False).first()
+        if author is None:
+            raise CommandError('Нет записей для замера.')
+        yield 'index', reverse('posts:index'), reverse('api:posts')
+        if group is not None:
+            yield (
+                'group_posts',
+                reverse('posts:group_posts', args=[group.slug]),
+                reverse('api:group_posts', args=[group.slug]),
+            )
+        yield (
+            'profile',
+            reverse('posts:profile', args=[author.username]),
+            reverse('api:profile_posts', args=[author.username]),
+        )
+
+    def measure(self, client, url, count):
+        started = time.perf_counter()
+        for _ in range(count):
+            response = client.get(url)
+            if response.streaming:
+                size = len(b''.join(response.streaming_content))
+            else:
+                size = len(response.content)
+        return (time.perf_counter() - started) / count, size
+
+    def handle(self, *args, **options):
+        count = options['requests']
+        if count < 1:
+            raise CommandError('--requests должно быть положительным.')
+        client = Client()
+        with override_settings(
+            **({'CACHES': DUMMY_CACHES} if options['cold'] else {})
+        ):
+            for name, html_url, json_url in self.pages():
+                # Первый запрос прогревает шаблоны и кэши и не считается.
+                client.get(html_url)
+                client.get(json_url)
+                html_time, html_size = self.measure(client, html_url, count)
+                json_time, json_size = self.measure(client, json_url, count)
+                self.stdout.write(
+                    f'{name}: HTML {html_time * 1000:.1f} мс, '
+                    f'{html_size} байт; JSON {json_time * 1000:.1f} мс, '
+                    f'{json_size} байт'
+                )
@@ -0,0 +1,141 @@
+import json
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db.models.signals import post_init
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+def read_json(response):
+    return json.loads(b''.join(response.streaming_content))
+
+
+@override_settings(API_PAGE_SIZE=2)
+class ApiViewsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.posts = [
+            Post.objects.create(
+                text=f'Запись {number}', author=cls.author, group=cls.group
+            )
+            for number in range(5)
+        ]
+        Comment.objects.create(
+            post=cls.posts[0], author=cls.reader, text='Комментарий'
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_posts_are_paginated_by_cursor(self):
+        """Записи листаются курсором от новых к старым без повторов"""
+        url = reverse('api:posts')
+        response = self.client.get(url)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertTrue(response.streaming)
+        seen = []
+        data = read_json(response)
+        while True:
+            self.assertLessEqual(len(data['results']), 2)
+            seen += [item['id'] for item in data['results']]
+            if not data['next']:
+                break
+            data = read_json(self.client.get(url, {'after': data['next']}))
+        expected = [post.pk for post in reversed(self.posts)]
+        self.assertEqual(seen, expected)
+
+    def test_fields_select_keys(self):
+        """?fields= оставляет в ответе только перечисленные поля"""
+        response = self.client.get(
+            reverse('api:group_posts', args=[self.group.slug]),
+            {'fields': 'text,author'},
+        )
+        item = read_json(response)['results'][0]
+        self.assertEqual(item, {'text': 'Запись 4', 'author': 'author'})
+
+    def test_bad_parameters(self):
+        """Неизвестное поле и limit вне границ дают 400"""
+        url = reverse('api:posts')
+        for params in (
+            {'fields': 'text,password'},
+            {'limit': 0},
+            {'limit': 100000},
+            {'limit': 'all'},
+        ):
+            with self.subTest(params=params):
+                response = self.client.get(url, params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+
+    def test_no_model_instances_are_built(self):
+        """Строки ответа не превращаются в экземпляры моделей"""
+        created = []
+
+        def count(sender, **kwargs):
+            created.append(sender)
+
+        post_init.connect(count)
+        try:
+            for url in (
+                reverse('api:posts'),
+                reverse('api:group_posts', args=[self.group.slug]),
+                reverse('api:post_comments', args=[self.posts[0].pk]),
+                reverse('api:groups'),
+            ):
+                read_json(self.client.get(url))
+        finally:
+            post_init.disconnect(count)
+        # Допустимы только объекты, найденные по slug или pk в URL.
+        self.assertNotIn(Comment, created)
+        self.assertLessEqual(created.count(Post), 1)
+        self.assertLessEqual(created.count(Group), 1)
+
+    def test_comments_and_profile(self):
+        """Комментарии записи и профиль автора"""
+        response = self.client.get(
+            reverse('api:post_comments', args=[self.posts[0].pk])
+        )
+        self.assertEqual(
+            [item['text'] for item in read_json(response)['results']],
+            ['Комментарий'],
+        )
+        Follow.objects.create(user=self.reader, author=self.author)
+        response = self.client.get(
+            reverse('api:profile', args=[self.author.username])
+        )
+        self.assertEqual(response.json()['posts_count'], 5)
+        self.assertEqual(response.json()['followers_count'], 1)
+
+    def test_follow_feed(self):
+        """Лента подписок доступна только авторизованному пользователю"""
+        url = reverse('api:follow_feed')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.client.force_login(self.reader)
+        data = read_json(self.client.get(url, {'limit': 10}))
+        self.assertEqual(
+            [item['id'] for item in data['results']],
+            [post.pk for post in reversed(self.posts)],
+        )
+        self.assertEqual(data['results'][0]['author'], 'author')
+
+    def test_benchmark_command(self):
+        """Команда сравнивает HTML- и JSON-страницы"""
+        out = StringIO()
+        with mock.patch('posts.thumbnails.queue'):
+            call_command('benchmark_api', '--requests', '1', stdout=out)
+        self.assertIn('index', out.getvalue())
+        self.assertIn('JSON', out.getvalue())
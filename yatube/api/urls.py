@@ -0,0 +1,20 @@
+from django.urls import path
+
+from . import views
+
+
+app_name = 'api'
+
+urlpatterns = [
+    path('posts/', views.posts, name='posts'),
+    path('posts/<int:post_id>/comments/',
+         views.post_comments,
+         name='post_comments'),
+    path('groups/', views.groups, name='groups'),
+    path('groups/<slug:slug>/posts/', views.group_posts, name='group_posts'),
+    path('profiles/<str:username>/', views.profile, name='profile'),
+    path('profiles/<str:username>/posts/',
+         views.profile_posts,
+         name='profile_posts'),
+    path('follow/', views.follow_feed, name='follow_feed'),
+]
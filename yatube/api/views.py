@@ -0,0 +1,174 @@
+"""JSON API только для чтения поверх тех же запросов, что и HTML-ленты.
+
+Строки выбираются через `values()`, без создания экземпляров моделей,
+и кодируются в JSON по одной прямо в ответ (StreamingHttpResponse).
+Списки листаются курсором (`?after=` / `?before=`), размер страницы
+задаётся `?limit=`, а набор полей — `?fields=id,text,author`.
+"""
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+
+from posts import follow_graph, timeline
+from posts.models import Group, Post, TimelineEntry, User
+from posts.utils import CursorPaginator
+
+POST_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'image': 'image',
+    'comments_count': 'comments_count',
+}
+GROUP_FIELDS = {
+    'slug': 'slug',
+    'title': 'title',
+    'description': 'description',
+    'posts_count': 'posts_count',
+}
+COMMENT_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'created': 'created',
+    'author': 'author__username',
+}
+FEED_KEYS = ('-pub_date', '-id')
+
+
+class BadRequest(Exception):
+    pass
+
+
+def image_url(name):
+    return settings.MEDIA_URL + name if name else None
+
+
+CONVERTERS = {'image': image_url}
+
+
+def error(message, status=400):
+    return JsonResponse({'error': message}, status=status)
+
+
+def select_fields(request, fields):
+    """Поля из ?fields= (по умолчанию все) и пути к ним в values()."""
+    names = request.GET.get('fields')
+    if not names:
+        return fields
+    names = names.split(',')
+    unknown = [name for name in names if name not in fields]
+    if unknown:
+        raise BadRequest(
+            'Неизвестные поля: %s. Доступны: %s.'
+            % (', '.join(unknown), ', '.join(fields))
+        )
+    return {name: fields[name] for name in names}
+
+
+def page_size(request):
+    try:
+        limit = int(request.GET.get('limit', settings.API_PAGE_SIZE))
+    except ValueError:
+        raise BadRequest('limit должен быть числом.')
+    if not 1 <= limit <= settings.API_MAX_PAGE_SIZE:
+        raise BadRequest(
+            f'limit должен быть от 1 до {settings.API_MAX_PAGE_SIZE}.'
+        )
+    return limit
+
+
+def stream(page, fields):
+    """Кодирует страницу по одной строке."""
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    yield '{"results": ['
+    for index, row in enumerate(page):
+        item = {}
+        for name, path in fields.items():
+            convert = CONVERTERS.get(name)
+            item[name] = convert(row[path]) if convert else row[path]
+        yield (',' if index else '') + encoder.encode(item)
+    yield '], "next": %s, "previous": %s}' % (
+        encoder.encode(page.next_cursor), encoder.encode(page.previous_cursor)
+    )
+
+
+def cursor_response(request, queryset, fields, keys=FEED_KEYS):
+    try:
+        fields = select_fields(request, fields)
+        limit = page_size(request)
+    except BadRequest as exc:
+        return error(str(exc))
+    # Ключи курсора выбираются всегда, даже если их нет в ?fields=.
+    paths = set(fields.values()) | {key.lstrip('-') for key in keys}
+    paginator = CursorPaginator(
+        queryset.values(*paths).order_by(*keys), limit, keys
+    )
+    page = paginator.get_cursor_page(
+        request.GET.get('after'), request.GET.get('before')
+    )
+    return StreamingHttpResponse(
+        stream(page, fields), content_type='application/json'
+    )
+
+
+def posts(request):
+    return cursor_response(request, Post.objects.all(), POST_FIELDS)
+
+
+def group_posts(request, slug):
+    group = get_object_or_404(Group.objects.only('pk'), slug=slug)
+    return cursor_response(
+        request, Post.objects.filter(group=group), POST_FIELDS
+    )
+
+
+def profile_posts(request, username):
+    author = get_object_or_404(User.objects.only('pk'), username=username)
+    return cursor_response(
+        request, Post.objects.filter(author=author), POST_FIELDS
+    )
+
+
+def groups(request):
+    return cursor_response(
+        request, Group.objects.all(), GROUP_FIELDS, keys=('id',)
+    )
+
+
+def post_comments(request, post_id):
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    return cursor_response(
+        request, post.comments.all(), COMMENT_FIELDS,
+        keys=('created', 'id')
+    )
+
+
+def profile(request, username):
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    stats = getattr(author, 'stats', None)
+    return JsonResponse({
+        'username': author.username,
+        'full_name': author.get_full_name(),
+        'posts_count': stats.posts_count if stats else 0,
+        'followers_count': follow_graph.followers_count(author),
+        'following_count': follow_graph.following_count(author),
+    }, json_dumps_params={'ensure_ascii': False})
+
+
+def follow_feed(request):
+    if not request.user.is_authenticated:
+        return error('Нужна авторизация.', status=403)
+    queryset = timeline.get_timeline(request.user)
+    fields = POST_FIELDS
+    if queryset.model is TimelineEntry:
+        # Поля записи читаются через связь, курсор — по самой ленте.
+        fields = {
+            name: 'post_id' if path == 'id' else f'post__{path}'
+            for name, path in POST_FIELDS.items()
+        }
+    return cursor_response(request, queryset, fields)
@@ -0,0 +1,258 @@
+"""Кэш в файле SQLite, общий для всех процессов-воркеров на хосте.
+
+В отличие от LocMemCache все воркеры видят одни и те же записи
+и версии (`incr` атомарен между процессами), а память не дублируется.
+Объём ограничивается числом записей (MAX_ENTRIES) и суммарным размером
+значений в байтах (MAX_SIZE); при переполнении вытесняются записи,
+к которым дольше всего не обращались (LRU). Число записей и их размер
+триггеры ведут в отдельной строке, так что проверка переполнения
+при записи не просматривает всю таблицу.
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache.SQLiteCache',
+            'LOCATION': '/var/tmp/yatube-cache.sqlite3',
+            'OPTIONS': {'MAX_ENTRIES': 100000, 'MAX_SIZE': 256 * 2 ** 20},
+        }
+    }
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    ' key TEXT PRIMARY KEY,'
+    ' value BLOB NOT NULL,'
+    ' expires REAL,'
+    ' accessed REAL NOT NULL,'
+    ' size INTEGER NOT NULL'
+    ') WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+    'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)',
+    'CREATE TABLE IF NOT EXISTS cache_totals ('
+    ' id INTEGER PRIMARY KEY CHECK (id = 0),'
+    ' entries INTEGER NOT NULL,'
+    ' size INTEGER NOT NULL'
+    ')',
+    'CREATE TRIGGER IF NOT EXISTS cache_totals_insert AFTER INSERT ON cache'
+    ' BEGIN UPDATE cache_totals'
+    ' SET entries = entries + 1, size = size + new.size; END',
+    'CREATE TRIGGER IF NOT EXISTS cache_totals_delete AFTER DELETE ON cache'
+    ' BEGIN UPDATE cache_totals'
+    ' SET entries = entries - 1, size = size - old.size; END',
+    'CREATE TRIGGER IF NOT EXISTS cache_totals_update'
+    ' AFTER UPDATE OF size ON cache'
+    ' BEGIN UPDATE cache_totals SET size = size - old.size + new.size; END',
+    # Файл от прежней версии: итоги считаются один раз.
+    'INSERT OR IGNORE INTO cache_totals'
+    ' SELECT 0, count(*), coalesce(sum(size), 0) FROM cache',
+)
+
+# Время обращения обновляется не чаще раза в секунду на ключ, чтобы
+# чтения не превращались в запись на каждом обращении.
+ACCESS_RESOLUTION = 1.0
+
+
+class SQLiteCache(BaseCache):
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        options = params.get('OPTIONS', {})
+        self._max_size = options.get('MAX_SIZE')
+        self._local = threading.local()
+
+    @property
+    def _db(self):
+        # Соединение своё у каждого потока и у каждого процесса после fork.
+        pid = os.getpid()
+        if getattr(self._local, 'pid', None) != pid:
+            db = sqlite3.connect(
+                self._path, timeout=30, isolation_level=None,
+                check_same_thread=False,
+            )
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            # Иначе INSERT OR REPLACE удаляет старую строку без триггера.
+            db.execute('PRAGMA recursive_triggers=ON')
+            db.execute('BEGIN IMMEDIATE')
+            for statement in SCHEMA:
+                db.execute(statement)
+            db.execute('COMMIT')
+            self._local.db = db
+            self._local.pid = pid
+        return self._local.db
+
+    @contextmanager
+    def _write(self):
+        """Транзакция с блокировкой на запись с самого начала."""
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            yield db
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    @staticmethod
+    def _dump(value):
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    def _row(self, db, key, now):
+        row = db.execute(
+            'SELECT value, expires FROM cache WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None or (row[1] is not None and row[1] <= now):
+            return None
+        return row
+
+    def _store(self, db, key, value, timeout, now):
+        data = self._dump(value)
+        db.execute(
+            'INSERT OR REPLACE INTO cache'
+            ' (key, value, expires, accessed, size) VALUES (?, ?, ?, ?, ?)',
+            (key, data, self.get_backend_timeout(timeout), now, len(data))
+        )
+
+    def _touch_accessed(self, keys, now):
+        if keys:
+            self._db.execute(
+                'UPDATE cache SET accessed = ? WHERE key IN (%s)'
+                % ', '.join('?' * len(keys)),
+                (now, *keys)
+            )
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        if not keys:
+            return {}
+        cache_keys = {self._key(key, version): key for key in keys}
+        now = time.time()
+        rows = self._db.execute(
+            'SELECT key, value, expires, accessed FROM cache'
+            ' WHERE key IN (%s)' % ', '.join('?' * len(cache_keys)),
+            list(cache_keys)
+        ).fetchall()
+        result = {}
+        stale = []
+        for cache_key, data, expires, accessed in rows:
+            if expires is not None and expires <= now:
+                continue
+            result[cache_keys[cache_key]] = pickle.loads(data)
+            if now - accessed > ACCESS_RESOLUTION:
+                stale.append(cache_key)
+        self._touch_accessed(stale, now)
+        return result
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout=timeout, version=version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        now = time.time()
+        with self._write() as db:
+            for key, value in data.items():
+                self._store(db, self._key(key, version), value, timeout, now)
+            self._cull(db, now)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        with self._write() as db:
+            if self._row(db, key, now) is not None:
+                return False
+            self._store(db, key, value, timeout, now)
+            self._cull(db, now)
+        return True
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        with self._write() as db:
+            row = self._row(db, key, now)
+            if row is None:
+                raise ValueError("Key '%s' not found" % key)
+            value = pickle.loads(row[0]) + delta
+            data = self._dump(value)
+            db.execute(
+                'UPDATE cache SET value = ?, accessed = ?, size = ?'
+                ' WHERE key = ?',
+                (data, now, len(data), key)
+            )
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        with self._write() as db:
+            if self._row(db, key, now) is None:
+                return False
+            db.execute(
+                'UPDATE cache SET expires = ?, accessed = ? WHERE key = ?',
+                (self.get_backend_timeout(timeout), now, key)
+            )
+        return True
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        return self._row(self._db, key, time.time()) is not None
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version=version)
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        if keys:
+            self._db.execute(
+                'DELETE FROM cache WHERE key IN (%s)'
+                % ', '.join('?' * len(keys)),
+                keys
+            )
+
+    def clear(self):
+        self._db.execute('DELETE FROM cache')
+
+    def _cull(self, db, now):
+        db.execute('DELETE FROM cache WHERE expires <= ?', (now,))
+        count, size = db.execute(
+            'SELECT entries, size FROM cache_totals'
+        ).fetchone()
+        if count > self._max_entries:
+            # Как в остальных бэкендах Django: удаляем 1/CULL_FREQUENCY
+            # записей, а при CULL_FREQUENCY = 0 очищаем кэш целиком.
+            if not self._cull_frequency:
+                db.execute('DELETE FROM cache')
+                return
+            excess = max(
+                count - self._max_entries, count // self._cull_frequency
+            )
+            db.execute(
+                'DELETE FROM cache WHERE key IN ('
+                ' SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+                (excess,)
+            )
+        if self._max_size is not None and size > self._max_size:
+            # Самые давние записи, суммарно освобождающие лишние байты.
+            db.execute(
+                'DELETE FROM cache WHERE key IN ('
+                ' SELECT key FROM ('
+                '  SELECT key, sum(size) OVER (ORDER BY accessed, key)'
+                '   - size AS freed_before FROM cache'
+                ' ) WHERE freed_before < ?)',
+                (size - self._max_size,)
+            )
@@ -0,0 +1,184 @@
+"""Очередь фоновых задач в базе данных, без внешнего брокера.
+
+`enqueue()` записывает задачу в ту же транзакцию, что и данные, ради
+которых она ставится: исполнители увидят её только после фиксации,
+а при откате её не будет вовсе. Задачи выполняет `manage.py
+run_workers` в пуле потоков или процессов.
+
+Задача — любая функция модуля, импортируемая по полному имени
+(`posts.thumbnails.generate`); аргументы должны сериализоваться в JSON.
+Упавшая задача повторяется с экспоненциальной задержкой, пока не
+исчерпает попытки; задачи с одинаковым `key` не дублируются, пока
+первая не выполнена. Порядок — по убыванию приоритета, затем по
+времени.
+
+Исполнитель не держит блокировок: задача берётся условным UPDATE
+(только если её ещё никто не взял), поэтому схема работает и на SQLite.
+
+При JOB_EAGER (по умолчанию при DEBUG) готовая задача выполняется сразу
+после фиксации транзакции в том же процессе, так что для разработки
+run_workers не нужен; упавшая задача остаётся в очереди для повтора.
+"""
+import datetime
+import json
+import logging
+import random
+import traceback
+import uuid
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+HIGH = 10
+NORMAL = 0
+LOW = -10
+
+
+def task_name(task):
+    if isinstance(task, str):
+        return task
+    return f'{task.__module__}.{task.__qualname__}'
+
+
+def enqueue(task, *args, key=None, priority=NORMAL, delay=0,
+            max_attempts=None):
+    """Ставит задачу в очередь; её выполнят после фиксации текущей
+    транзакции. Возвращает Job или None, если задача с тем же `key`
+    уже ждёт выполнения."""
+    job = Job(
+        task=task_name(task),
+        args=json.dumps(args),
+        key=key,
+        priority=priority,
+        run_at=timezone.now() + datetime.timedelta(seconds=delay),
+        max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+    )
+    if key is None:
+        job.save()
+    else:
+        try:
+            # Точка сохранения: дубль не должен откатить внешнюю
+            # транзакцию.
+            with transaction.atomic():
+                job.save()
+        except IntegrityError:
+            return None
+    if settings.JOB_EAGER and not delay:
+        transaction.on_commit(lambda: run_now(job.pk))
+    return job
+
+
+def _visible(now):
+    return Q(run_at__lte=now, failed_at__isnull=True)
+
+
+def _take(job_id, worker, now):
+    """Берёт задачу; возвращает токен или None, если её уже взяли."""
+    token = (worker[:8] + uuid.uuid4().hex)[:32]
+    hidden_until = now + datetime.timedelta(
+        seconds=settings.JOB_VISIBILITY_TIMEOUT
+    )
+    # Условие повторяется в UPDATE: задачу, которую успел взять
+    # другой исполнитель, обновить не получится.
+    taken = Job.objects.filter(_visible(now), pk=job_id).update(
+        token=token, run_at=hidden_until, attempts=F('attempts') + 1
+    )
+    return token if taken else None
+
+
+def claim(limit, worker):
+    """Берёт до `limit` готовых задач; возвращает их id и токены."""
+    now = timezone.now()
+    candidates = list(
+        Job.objects.filter(_visible(now))
+        .order_by('-priority', 'run_at', 'id')
+        .values_list('id', flat=True)[:limit * 2]
+    )
+    claimed = []
+    for job_id in candidates:
+        token = _take(job_id, worker, now)
+        if token is not None:
+            claimed.append((job_id, token))
+            if len(claimed) == limit:
+                break
+    return claimed
+
+
+def retry_delay(attempts):
+    """Экспоненциальная задержка с разбросом, чтобы упавшие вместе
+    задачи не повторялись одновременно."""
+    delay = min(
+        settings.JOB_RETRY_DELAY * 2 ** (attempts - 1),
+        settings.JOB_RETRY_MAX_DELAY,
+    )
+    return delay * random.uniform(1, 1.5)
+
+
+def execute(job_id, token):
+    """Выполняет взятую задачу и записывает результат.
+
+    Если время видимости истекло и задачу взял другой исполнитель,
+    токен уже не совпадёт и результат этого запуска не записывается.
+    """
+    job = Job.objects.filter(pk=job_id, token=token).first()
+    if job is None:
+        return False
+    try:
+        # Изменения упавшей попытки откатываются до повтора.
+        with transaction.atomic():
+            import_string(job.task)(*json.loads(job.args))
+    except Exception:
+        logger.exception('Задача %s (%s) упала', job.pk, job.task)
+        fail(job, traceback.format_exc())
+        return False
+    Job.objects.filter(pk=job.pk, token=token).delete()
+    return True
+
+
+def work(job_id, token):
+    """`execute()` для пула исполнителей: как и запрос, задача
+    начинается и заканчивается проверкой соединений с базой."""
+    close_old_connections()
+    try:
+        return execute(job_id, token)
+    finally:
+        close_old_connections()
+
+
+def fail(job, error):
+    mine = Job.objects.filter(pk=job.pk, token=job.token)
+    if job.attempts >= job.max_attempts:
+        mine.update(failed_at=timezone.now(), last_error=error, token='')
+        return
+    mine.update(
+        run_at=timezone.now() + datetime.timedelta(
+            seconds=retry_delay(job.attempts)
+        ),
+        last_error=error,
+        token='',
+    )
+
+
+def run_now(job_id, worker='eager'):
+    """Выполняет одну задачу в текущем потоке, если её ещё никто
+    не взял (JOB_EAGER)."""
+    token = _take(job_id, worker, timezone.now())
+    return token is not None and execute(job_id, token)
+
+
+def run_pending(worker='inline'):
+    """Выполняет в текущем потоке все готовые задачи; для тестов
+    и разовых запусков. Возвращает число выполненных задач."""
+    done = 0
+    while True:
+        claimed = claim(1, worker)
+        if not claimed:
+            return done
+        done += execute(*claimed[0])
@@ -0,0 +1,103 @@
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from concurrent.futures import (FIRST_COMPLETED, ProcessPoolExecutor,
+                                ThreadPoolExecutor, wait)
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core import jobs
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет фоновые задачи из очереди в пуле потоков или процессов. '
+        'SIGTERM или Ctrl+C: новые задачи не берутся, начатые '
+        'доделываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help='Сколько задач выполнять одновременно '
+                 '(по умолчанию JOB_WORKERS).'
+        )
+        parser.add_argument(
+            '--processes', action='store_true',
+            help='Пул процессов вместо потоков: для задач, которые '
+                 'нагружают процессор (нарезка изображений).'
+        )
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Выйти, когда готовых задач не останется.'
+        )
+
+    def executor(self, workers, processes):
+        if not processes:
+            return ThreadPoolExecutor(workers)
+        # spawn, а не fork: дочерний процесс не должен унаследовать
+        # соединения с базой и кэшем родителя.
+        return ProcessPoolExecutor(
+            workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=django.setup,
+        )
+
+    def collect(self, finished):
+        done = 0
+        for future in finished:
+            try:
+                done += future.result()
+            except Exception:
+                # Задача вернётся в очередь по истечении времени видимости.
+                jobs.logger.exception('Исполнитель задачи упал')
+        return done
+
+    def stop(self, signum, frame):
+        self.stopping = True
+
+    def handle(self, *args, **options):
+        workers = options['workers'] or settings.JOB_WORKERS
+        if workers < 1:
+            raise CommandError('--workers должно быть положительным.')
+        name = f'{socket.gethostname()}:{os.getpid()}:'
+        self.stopping = False
+        previous = {
+            signum: signal.signal(signum, self.stop)
+            for signum in (signal.SIGTERM, signal.SIGINT)
+        }
+        try:
+            done = self.run(workers, name, options)
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+        self.stdout.write(f'Выполнено задач: {done}')
+
+    def run(self, workers, name, options):
+        done = 0
+        running = set()
+        with self.executor(workers, options['processes']) as executor:
+            while not self.stopping:
+                claimed = jobs.claim(workers - len(running), name)
+                running.update(
+                    executor.submit(jobs.work, job_id, token)
+                    for job_id, token in claimed
+                )
+                if not running:
+                    if options['burst']:
+                        break
+                    time.sleep(settings.JOB_POLL_INTERVAL)
+                    continue
+                # Пока есть свободные места, очередь опрашивается снова
+                # не реже раза в JOB_POLL_INTERVAL.
+                timeout = None
+                if len(running) < workers:
+                    timeout = settings.JOB_POLL_INTERVAL
+                finished, running = wait(running, timeout, FIRST_COMPLETED)
+                done += self.collect(finished)
+            done += self.collect(wait(running).done)
+        return done
@@ -0,0 +1,79 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from core.warmup import page_client, warmup
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогревает процесс: разбирает шаблоны, строит таблицы URL, '
+        'открывает соединения и заполняет кэши. С --compare печатает '
+        'время до первого байта в свежем процессе без прогрева и с ним.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--compare', action='store_true',
+            help='Сравнить первый запрос в новых процессах до и после '
+                 'прогрева.'
+        )
+        parser.add_argument(
+            '--probe', action='store_true',
+            help='Служебный режим для --compare: замерить первый запрос '
+                 'и напечатать результат в JSON.'
+        )
+        parser.add_argument(
+            '--warm', action='store_true',
+            help='С --probe: прогреть процесс перед замером.'
+        )
+
+    def first_byte(self):
+        timings = {}
+        client = page_client()
+        for url in settings.WARMUP_URLS:
+            started = time.perf_counter()
+            status = client.get(url).status_code
+            timings[url] = time.perf_counter() - started
+            # Иначе сравнивалось бы время страницы ошибки.
+            if status != 200:
+                raise CommandError(f'{url} ответил {status}.')
+        return timings
+
+    def run_probe(self, warm):
+        command = [
+            sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'),
+            'warmup', '--probe',
+        ]
+        if warm:
+            command.append('--warm')
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE)
+        result = subprocess.run(
+            command, env=env, stdout=subprocess.PIPE, universal_newlines=True
+        )
+        if result.returncode:
+            raise CommandError('Замер в отдельном процессе не удался.')
+        return json.loads(result.stdout.splitlines()[-1])
+
+    def handle(self, *args, **options):
+        if options['probe']:
+            if options['warm']:
+                warmup()
+            self.stdout.write(json.dumps(self.first_byte()))
+            return
+        if options['compare']:
+            cold = self.run_probe(warm=False)
+            warm = self.run_probe(warm=True)
+            for url in settings.WARMUP_URLS:
+                self.stdout.write(
+                    f'{url}: без прогрева {cold[url] * 1000:.1f} мс, '
+                    f'после прогрева {warm[url] * 1000:.1f} мс'
+                )
+            return
+        for name, count, seconds in warmup():
+            self.stdout.write(f'{name}: {count} за {seconds * 1000:.1f} мс')
+        self.stdout.write('Прогрев завершён')
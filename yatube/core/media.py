@@ -0,0 +1,152 @@
+"""Раздача загруженных файлов (MEDIA_ROOT).
+
+Если перед приложением стоит веб-сервер, файл отдаёт он сам:
+MEDIA_SENDFILE = 'x-sendfile' (Apache, lighttpd) или
+'x-accel-redirect' (nginx, внутренний location MEDIA_ACCEL_PREFIX).
+Иначе файл отдаётся через FileResponse, который WSGI-сервер с
+wsgi.file_wrapper (gunicorn) передаёт в os.sendfile без копирования
+в Python. Поддерживаются запросы диапазона (Range), If-None-Match и
+If-Modified-Since; файлы, названные по хэшу содержимого, кэшируются
+клиентами навсегда.
+"""
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .storage import INCOMING_DIR
+
+# Имена из хэша содержимого: наши (sha256) и миниатюры sorl (md5).
+HASHED_NAME = re.compile(r'(?:^|/)(?P<digest>[0-9a-f]{32}|[0-9a-f]{64})\.\w+$')
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+MUTABLE = 'public, max-age=3600'
+
+
+class RangeFile:
+    """Часть открытого файла для FileResponse.
+
+    `read()` не выходит за границу диапазона, а `fileno()` и `tell()`
+    позволяют gunicorn отдать её через sendfile (длину он берёт
+    из Content-Length).
+    """
+
+    def __init__(self, file_, start, length):
+        file_.seek(start)
+        self.file = file_
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def tell(self):
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """(начало, длина) для одного диапазона из заголовка Range,
+    None, если заголовок не поддерживается (отдаётся весь файл),
+    и ValueError, если диапазон вне файла."""
+    match = RANGE.match(header.replace(' ', ''))
+    if match is None or not any(match.groups()):
+        return None
+    first, last = match.groups()
+    if not first:
+        # bytes=-500: последние 500 байт.
+        length = min(int(last), size)
+        if not length:
+            raise ValueError(header)
+        return size - length, length
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError(header)
+    return start, end - start + 1
+
+
+def sendfile_response(path, name):
+    response = HttpResponse()
+    if settings.MEDIA_SENDFILE == 'x-accel-redirect':
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_PREFIX + name
+    else:
+        response['X-Sendfile'] = path
+    # Тип и длину выставит веб-сервер.
+    del response['Content-Type']
+    return response
+
+
+def serve(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404(path)
+    name = os.path.relpath(full_path, settings.MEDIA_ROOT).replace('\\', '/')
+    if name.split('/')[0] == INCOMING_DIR or not os.path.isfile(full_path):
+        raise Http404(path)
+    stat = os.stat(full_path)
+    hashed = HASHED_NAME.search(name)
+    if hashed:
+        etag = quote_etag(hashed.group('digest'))
+    else:
+        etag = quote_etag('%x-%x' % (int(stat.st_mtime), stat.st_size))
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(stat.st_mtime)
+    )
+    if response is None:
+        if settings.MEDIA_SENDFILE:
+            response = sendfile_response(full_path, name)
+        else:
+            response = file_response(request, full_path, stat.st_size, etag)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = IMMUTABLE if hashed else MUTABLE
+    return response
+
+
+def file_response(request, full_path, size, etag):
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+    file_range = None
+    header = request.META.get('HTTP_RANGE')
+    # If-Range: диапазон действителен, только если файл не изменился.
+    if header and request.META.get('HTTP_IF_RANGE', etag) == etag:
+        try:
+            file_range = parse_range(header, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+    file_ = open(full_path, 'rb')
+    if file_range is None:
+        response = FileResponse(file_, content_type=content_type)
+    else:
+        start, length = file_range
+        response = FileResponse(
+            RangeFile(file_, start, length), status=206,
+            content_type=content_type
+        )
+        response['Content-Range'] = (
+            f'bytes {start}-{start + length - 1}/{size}'
+        )
+        response['Content-Length'] = length
+    if encoding:
+        response['Content-Encoding'] = encoding
+    response['Accept-Ranges'] = 'bytes'
+    return response
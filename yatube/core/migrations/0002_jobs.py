@@ -0,0 +1,43 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:49
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task', models.CharField(max_length=200, verbose_name='Функция')),
+                ('args', models.TextField(default='[]', verbose_name='Аргументы в JSON')),
+                ('key', models.CharField(blank=True, max_length=200, null=True, verbose_name='Ключ для устранения дублей')),
+                ('priority', models.SmallIntegerField(default=0, verbose_name='Приоритет')),
+                ('run_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Выполнить не раньше')),
+                ('token', models.CharField(blank=True, max_length=32, verbose_name='Исполнитель')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Попыток')),
+                ('max_attempts', models.PositiveSmallIntegerField(default=5, verbose_name='Наибольшее число попыток')),
+                ('last_error', models.TextField(blank=True, verbose_name='Последняя ошибка')),
+                ('failed_at', models.DateTimeField(blank=True, null=True, verbose_name='Провалена')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Поставлена')),
+            ],
+            options={
+                'verbose_name': 'Задача',
+                'verbose_name_plural': 'Задачи',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['-priority', 'run_at'], name='job_queue_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='job',
+            constraint=models.UniqueConstraint(condition=models.Q(failed_at__isnull=True), fields=('key',), name='unique_pending_job_key'),
+        ),
+    ]
@@ -0,0 +1,98 @@
+from django.db import models
+from django.utils import timezone
+
+
+class StoredFile(models.Model):
+    """Файл в хранилище с адресацией по содержимому и число ссылок
+    на него."""
+    name = models.CharField(
+        max_length=255,
+        primary_key=True,
+        verbose_name='Имя файла'
+    )
+    references = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество ссылок'
+    )
+
+    class Meta:
+        verbose_name = 'Файл'
+        verbose_name_plural = 'Файлы'
+
+
+class Job(models.Model):
+    """Фоновая задача в очереди (см. core.jobs).
+
+    Задача видна исполнителям, когда наступило `run_at`. Взятая
+    задача получает `token` исполнителя, а `run_at` сдвигается на
+    время видимости: если исполнитель не завершил её к этому сроку,
+    задачу снова возьмёт кто-то другой.
+    """
+    task = models.CharField(
+        max_length=200,
+        verbose_name='Функция'
+    )
+    args = models.TextField(
+        default='[]',
+        verbose_name='Аргументы в JSON'
+    )
+    key = models.CharField(
+        max_length=200,
+        null=True,
+        blank=True,
+        verbose_name='Ключ для устранения дублей'
+    )
+    priority = models.SmallIntegerField(
+        default=0,
+        verbose_name='Приоритет'
+    )
+    run_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Выполнить не раньше'
+    )
+    token = models.CharField(
+        max_length=32,
+        blank=True,
+        verbose_name='Исполнитель'
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Попыток'
+    )
+    max_attempts = models.PositiveSmallIntegerField(
+        default=5,
+        verbose_name='Наибольшее число попыток'
+    )
+    last_error = models.TextField(
+        blank=True,
+        verbose_name='Последняя ошибка'
+    )
+    failed_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Провалена'
+    )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Поставлена'
+    )
+
+    class Meta:
+        verbose_name = 'Задача'
+        verbose_name_plural = 'Задачи'
+        indexes = (
+            models.Index(
+                fields=('-priority', 'run_at'),
+                name='job_queue_idx'
+            ),
+        )
+        constraints = (
+            models.UniqueConstraint(
+                fields=('key',),
+                condition=models.Q(failed_at__isnull=True),
+                name='unique_pending_job_key'
+            ),
+        )
+
+    def __str__(self):
+        return self.task
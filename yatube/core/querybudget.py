@@ -0,0 +1,201 @@
+"""Бюджет SQL-запросов на запрос к сайту и поиск N+1.
+
+`record()` собирает запросы к базе внутри блока: их число, суммарное
+время и «форму» — SQL без значений параметров. Одна и та же форма,
+повторённая много раз, — признак N+1: ленивой загрузки связанного
+объекта в цикле. Для каждого запроса запоминается, откуда он сделан:
+строка шаблона, если запрос вызван при отрисовке
+(`{{ comment.author.username }}`), иначе строка кода проекта.
+
+QueryBudgetMiddleware записывает отчёт для каждого запроса к сайту
+и сверяет его с бюджетом представления: QUERY_BUDGETS по имени вида
+'posts:index', иначе QUERY_BUDGET_DEFAULT. Превышение и повторы
+пишутся в журнал, а при QUERY_BUDGET_RAISE бросается
+QueryBudgetExceeded. Тестовому клиенту отчёт доступен как
+`response.query_report`, проверяет его
+`QueryBudgetMixin.assertWithinQueryBudget()`.
+
+Запросы, сделанные уже при отдаче потокового ответа (выгрузка),
+в отчёт не попадают: к этому времени middleware отработал.
+"""
+import logging
+import os
+import re
+import sys
+import time
+from collections import namedtuple
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.base import Node
+
+logger = logging.getLogger(__name__)
+
+Query = namedtuple('Query', 'sql shape duration origin')
+
+# Списки параметров разной длины дают одну форму запроса.
+IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+# Управление транзакцией не считается: atomic() даёт BEGIN в режиме
+# autocommit и точки сохранения внутри транзакции (в тестах TestCase),
+# и бюджет не должен зависеть от того, где выполняется вид.
+TRANSACTION_CONTROL = re.compile(
+    r'(?:BEGIN\b|(?:RELEASE |ROLLBACK TO )?SAVEPOINT )'
+)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def shape_of(sql):
+    return IN_LIST.sub('IN (...)', sql)
+
+
+def _is_project_code(filename):
+    return (
+        filename.startswith(settings.BASE_DIR)
+        and filename != __file__
+        and 'site-packages' not in filename
+    )
+
+
+def _origin(frame):
+    """Строка шаблона или кода проекта, из которой сделан запрос."""
+    code_line = None
+    while frame is not None:
+        node = frame.f_locals.get('self')
+        # Ближайший к запросу узел шаблона: переменная или тег.
+        # type(), а не isinstance(): isinstance() спрашивает __class__,
+        # и ленивый объект (request.user) вычислился бы новым запросом.
+        if issubclass(type(node), Node) and getattr(node, 'token', None):
+            origin = node.origin
+            return f'{origin.template_name or origin.name}:{node.token.lineno}'
+        filename = frame.f_code.co_filename
+        if code_line is None and _is_project_code(filename):
+            code_line = (
+                f'{os.path.relpath(filename, settings.BASE_DIR)}:'
+                f'{frame.f_lineno}'
+            )
+        frame = frame.f_back
+    return code_line or '?'
+
+
+class QueryReport:
+    """Запросы к базе за время одного запроса к сайту."""
+
+    def __init__(self, view_name=None):
+        self.view_name = view_name
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if TRANSACTION_CONTROL.match(sql):
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append(Query(
+                sql, shape_of(sql), time.perf_counter() - started,
+                _origin(sys._getframe(1)),
+            ))
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def duration(self):
+        return sum(query.duration for query in self.queries)
+
+    def duplicates(self, limit=None):
+        """Формы, повторённые не меньше `limit` раз, и места вызова."""
+        limit = limit or settings.QUERY_DUPLICATES_LIMIT
+        origins = {}
+        for query in self.queries:
+            origins.setdefault(query.shape, []).append(query.origin)
+        return {
+            shape: places for shape, places in origins.items()
+            if len(places) >= limit
+        }
+
+    def problems(self, budget=None, duplicates_limit=None):
+        if budget is None:
+            budget = settings.QUERY_BUDGETS.get(
+                self.view_name, settings.QUERY_BUDGET_DEFAULT
+            )
+        problems = []
+        if self.count > budget:
+            problems.append(f'{self.count} запросов при бюджете {budget}')
+        for shape, places in self.duplicates(duplicates_limit).items():
+            places_text = ', '.join(dict.fromkeys(places))
+            problems.append(
+                f'{len(places)} одинаковых запросов из {places_text}: {shape}'
+            )
+        return problems
+
+    def __str__(self):
+        return (
+            f'{self.view_name}: {self.count} запросов, '
+            f'{self.duration * 1000:.1f} мс'
+        )
+
+    def details(self):
+        return '\n'.join(
+            f'  {query.duration * 1000:6.1f} мс  {query.origin}  {query.sql}'
+            for query in self.queries
+        )
+
+
+@contextmanager
+def record(view_name=None):
+    """Записывает в QueryReport все запросы ко всем базам внутри блока."""
+    report = QueryReport(view_name)
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(report))
+        yield report
+
+
+class QueryBudgetMiddleware:
+    """Сверяет запросы к базе каждого запроса к сайту с бюджетом вида.
+
+    Стоит первым в MIDDLEWARE, чтобы учитывать и запросы сессий
+    и аутентификации. Работает при QUERY_BUDGET_ENABLED.
+    """
+
+    def __init__(self, get_response):
+        if not settings.QUERY_BUDGET_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with record() as report:
+            response = self.get_response(request)
+        match = request.resolver_match
+        report.view_name = match.view_name if match else None
+        response.query_report = report
+        problems = report.problems()
+        if not problems:
+            logger.debug('%s %s', request.path, report)
+            return response
+        message = f'{request.path} {report}: ' + '; '.join(problems)
+        if settings.QUERY_BUDGET_RAISE:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+        return response
+
+
+class QueryBudgetMixin:
+    """Проверка бюджета запросов для TestCase."""
+
+    def assertWithinQueryBudget(self, response, budget=None,
+                                duplicates_limit=None):
+        report = getattr(response, 'query_report', None)
+        if report is None:
+            self.fail('Нет отчёта о запросах: QueryBudgetMiddleware '
+                      'не включён или ответ не от тестового клиента')
+        problems = report.problems(budget, duplicates_limit)
+        if problems:
+            self.fail('\n'.join([str(report), *problems, report.details()]))
@@ -0,0 +1,97 @@
+"""Хранилище файлов с адресацией по содержимому.
+
+Файл сохраняется под именем из SHA-256 его содержимого в дереве
+каталогов по первым символам хэша (`posts/ab/cd/abcd….jpg`), поэтому
+в одном каталоге не оказывается миллионов файлов, а одинаковые
+загрузки хранятся один раз. Сколько объектов ссылается на файл,
+считает модель `StoredFile`: `acquire()` и `release()` вызываются
+при сохранении и удалении объектов, а файл без ссылок удаляется.
+"""
+import hashlib
+import os
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+from .models import StoredFile
+
+INCOMING_DIR = '.incoming'
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+
+    def get_available_name(self, name, max_length=None):
+        # Настоящее имя зависит от содержимого и выбирается в _save().
+        return name
+
+    def hashed_name(self, name, digest):
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(
+            directory, digest[:2], digest[2:4], digest + extension
+        ).replace('\\', '/')
+
+    def _save(self, name, content):
+        incoming = self.path(INCOMING_DIR)
+        os.makedirs(incoming, exist_ok=True)
+        digest = hashlib.sha256()
+        # Файл пишется во временный по частям и одновременно хэшируется:
+        # загрузка целиком в память не попадает.
+        fd, temp_path = tempfile.mkstemp(dir=incoming)
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp_file.write(chunk)
+            name = self.hashed_name(name, digest.hexdigest())
+            full_path = self.path(name)
+            if os.path.exists(full_path):
+                os.remove(temp_path)
+            else:
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                if self.file_permissions_mode is not None:
+                    os.chmod(temp_path, self.file_permissions_mode)
+                # Переименование атомарно: параллельная загрузка того же
+                # содержимого в худшем случае перезапишет файл таким же.
+                os.replace(temp_path, full_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return name
+
+
+def acquire(name):
+    """Добавляет ссылку на файл."""
+    if not name:
+        return
+    updated = StoredFile.objects.filter(name=name).update(
+        references=F('references') + 1
+    )
+    if not updated:
+        StoredFile.objects.create(name=name, references=1)
+
+
+def release(name, storage):
+    """Убирает ссылку на файл; последний удаляется после фиксации
+    транзакции. Возвращает True, если ссылок не осталось."""
+    if not name:
+        return False
+    StoredFile.objects.filter(name=name).update(
+        references=F('references') - 1
+    )
+    orphaned = StoredFile.objects.filter(name=name, references__lte=0)
+    if not orphaned.delete()[0]:
+        return False
+
+    def delete_file():
+        # Пока транзакция шла, тот же файл мог быть загружен снова.
+        if not StoredFile.objects.filter(name=name).exists():
+            storage.delete(name)
+
+    transaction.on_commit(delete_file)
+    return True
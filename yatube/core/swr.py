@@ -0,0 +1,119 @@
+"""Stale-while-revalidate и пересчёт в один поток для горячих ключей кэша.
+
+Когда запись устаревает, её пересчитывает только тот запрос, который
+первым взял блокировку (`cache.add` атомарен и между воркерами),
+остальные в это время получают устаревшее значение. Если значения
+нет совсем, остальные ждут результата вместо собственного пересчёта,
+но не дольше SWR_WAIT_TIMEOUT и только пока блокировка не снята.
+Кроме того, запись может быть пересчитана заранее с вероятностью,
+растущей к концу срока жизни (алгоритм XFetch), чтобы горячие ключи
+не истекали у всех одновременно.
+
+Счётчики `recomputed` и `saved` (сколько пересчётов удалось избежать)
+доступны через `get_stats()`.
+"""
+import math
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache as default_cache
+
+STATS_KEY = 'swr-stats:{}'
+STATS = ('recomputed', 'saved')
+MISSING = object()
+
+
+def _count(cache, stat):
+    key = STATS_KEY.format(stat)
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def get_stats(cache=default_cache):
+    values = cache.get_many([STATS_KEY.format(stat) for stat in STATS])
+    return {stat: values.get(STATS_KEY.format(stat), 0) for stat in STATS}
+
+
+def _is_fresh(expires, delta, beta, now):
+    # XFetch: -log(random()) > 0, поэтому чем дольше пересчёт (delta)
+    # и ближе срок, тем вероятнее досрочный пересчёт.
+    return now - delta * beta * math.log(1 - random.random()) < expires
+
+
+def _recompute(cache, key, compute, timeout, stale_timeout):
+    started = time.time()
+    value = compute()
+    delta = time.time() - started
+    cache.set(
+        key, (value, time.time() + timeout, delta), timeout + stale_timeout
+    )
+    _count(cache, 'recomputed')
+    return value
+
+
+def _serve_cached(cache, entry, lock_key, lock_timeout, beta):
+    """Значение записи, если оно свежее или его уже пересчитывает другой
+    запрос; иначе берёт блокировку и возвращает MISSING."""
+    value, expires, delta = entry
+    if _is_fresh(expires, delta, beta, time.time()):
+        return value
+    if cache.add(lock_key, 1, lock_timeout):
+        return MISSING
+    _count(cache, 'saved')
+    return value
+
+
+def _wait_for_value(cache, key, lock_key, lock_timeout):
+    """Ждёт чужого пересчёта. Возвращает (значение или MISSING,
+    взята ли блокировка)."""
+    deadline = time.time() + settings.SWR_WAIT_TIMEOUT
+    while True:
+        time.sleep(0.05)
+        entry = cache.get(key)
+        if entry is not None:
+            _count(cache, 'saved')
+            return entry[0], False
+        if time.time() >= deadline:
+            # Пересчитывающий запрос не уложился: дольше не ждём.
+            return MISSING, False
+        # Блокировку сняли, а значения нет — пересчёт упал.
+        # Пересчитывает тот, кто первым возьмёт блокировку заново.
+        if cache.get(lock_key) is None and cache.add(
+            lock_key, 1, lock_timeout
+        ):
+            return MISSING, True
+
+
+def get_or_compute(key, compute, timeout, stale_timeout=None, beta=None,
+                   cache=default_cache):
+    """Возвращает значение по ключу, вычисляя его `compute()` при
+    необходимости не более чем в одном потоке одновременно.
+
+    `timeout` — срок свежести значения; ещё `stale_timeout` секунд
+    после него значение отдаётся, пока идёт пересчёт.
+    """
+    if stale_timeout is None:
+        stale_timeout = settings.SWR_STALE_TIMEOUT
+    if beta is None:
+        beta = settings.SWR_BETA
+    lock_key = f'{key}:lock'
+    lock_timeout = settings.SWR_LOCK_TIMEOUT
+    entry = cache.get(key)
+    if entry is not None:
+        value = _serve_cached(cache, entry, lock_key, lock_timeout, beta)
+        if value is not MISSING:
+            return value
+    elif not cache.add(lock_key, 1, lock_timeout):
+        value, locked = _wait_for_value(cache, key, lock_key, lock_timeout)
+        if value is not MISSING:
+            return value
+        if not locked:
+            return _recompute(cache, key, compute, timeout, stale_timeout)
+    try:
+        return _recompute(cache, key, compute, timeout, stale_timeout)
+    finally:
+        cache.delete(lock_key)
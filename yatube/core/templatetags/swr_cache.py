@@ -0,0 +1,44 @@
+from django import template
+from django.core.cache.utils import make_template_fragment_key
+
+from core.swr import get_or_compute
+
+register = template.Library()
+
+
+class SWRCacheNode(template.Node):
+    def __init__(self, nodelist, timeout, fragment_name, vary_on):
+        self.nodelist = nodelist
+        self.timeout = timeout
+        self.fragment_name = fragment_name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        timeout = int(self.timeout.resolve(context))
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        key = make_template_fragment_key(self.fragment_name, vary_on)
+        return get_or_compute(
+            key, lambda: self.nodelist.render(context), timeout
+        )
+
+
+@register.tag
+def swrcache(parser, token):
+    """Как `{% cache %}`, но устаревший фрагмент отдаётся, пока его
+    пересчитывает один запрос:
+
+        {% swrcache 600 index_page page_obj %} ... {% endswrcache %}
+    """
+    nodelist = parser.parse(('endswrcache',))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    if len(tokens) < 3:
+        raise template.TemplateSyntaxError(
+            f'{tokens[0]!r} tag requires at least 2 arguments.'
+        )
+    return SWRCacheNode(
+        nodelist,
+        parser.compile_filter(tokens[1]),
+        tokens[2],
+        [parser.compile_filter(var) for var in tokens[3:]],
+    )
@@ -0,0 +1,71 @@
+"""Помощники для тестов.
+
+`capture_on_commit_callbacks()` — перенос `TestCase.captureOnCommitCallbacks()`
+из Django 3.2: внутри TestCase транзакция никогда не фиксируется,
+и обработчики `transaction.on_commit()` иначе не выполняются.
+
+`temp_files()` переносит файловые кэши SQLiteCache и SITEMAP_ROOT
+во временный каталог: тесты очищают кэш и карту сайта и не должны
+ни стирать их в рабочей копии, ни зависеть от оставшегося там.
+Им пользуются `TempFilesRunner` (manage.py test) и conftest.py (pytest).
+"""
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+@contextmanager
+def capture_on_commit_callbacks(using=DEFAULT_DB_ALIAS, execute=False):
+    """Собирает обработчики on_commit, добавленные внутри блока,
+    и при `execute` выполняет их (и добавленные ими) по выходе."""
+    callbacks = []
+    connection = connections[using]
+    start = len(connection.run_on_commit)
+    try:
+        yield callbacks
+    finally:
+        while True:
+            new = connection.run_on_commit[start:]
+            start = len(connection.run_on_commit)
+            callbacks.extend(func for sids, func in new)
+            if not execute or not new:
+                break
+            for sids, func in new:
+                func()
+
+
+@contextmanager
+def temp_files():
+    """Подменяет на время блока расположение кэшей и карты сайта."""
+    temp_dir = tempfile.mkdtemp()
+    caches = {}
+    for alias, options in settings.CACHES.items():
+        options = dict(options)
+        if options['BACKEND'] == 'core.cache.SQLiteCache':
+            options['LOCATION'] = os.path.join(temp_dir, f'{alias}.sqlite3')
+        caches[alias] = options
+    try:
+        with override_settings(
+            CACHES=caches,
+            SITEMAP_ROOT=os.path.join(temp_dir, 'sitemaps'),
+        ):
+            yield temp_dir
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+class TempFilesRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.temp_files = temp_files()
+        self.temp_files.__enter__()
+
+    def teardown_test_environment(self, **kwargs):
+        self.temp_files.__exit__(None, None, None)
+        super().teardown_test_environment(**kwargs)
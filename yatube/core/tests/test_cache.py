@@ -0,0 +1,100 @@
+import os
+import shutil
+import tempfile
+import threading
+
+from django.test import SimpleTestCase
+
+from core.cache import SQLiteCache
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.location = os.path.join(self.tmp_dir, 'cache.sqlite3')
+        self.cache = self.make_cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.location, {'OPTIONS': options})
+
+    def test_values_are_shared_between_instances(self):
+        """Два экземпляра на одном файле (два воркера) видят одни данные"""
+        other = self.make_cache()
+        self.cache.set('key', {'value': 1})
+        self.assertEqual(other.get('key'), {'value': 1})
+        other.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_add_incr_and_expiry(self):
+        """add не перезаписывает ключ, incr атомарен, истёкшие ключи
+        не читаются
+        """
+        self.assertTrue(self.cache.add('counter', 1))
+        self.assertFalse(self.cache.add('counter', 100))
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        threads = [
+            threading.Thread(target=self.cache.incr, args=('counter',))
+            for _ in range(10)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.cache.get('counter'), 11)
+        self.cache.set('expired', 'value', timeout=-1)
+        self.assertIsNone(self.cache.get('expired'))
+        self.assertTrue(self.cache.add('expired', 'new'))
+
+    def test_get_many_and_set_many(self):
+        """get_many и set_many работают одной пачкой"""
+        self.cache.set_many({'a': 1, 'b': 2})
+        self.assertEqual(
+            self.cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': 2}
+        )
+
+    def test_least_recently_used_entries_are_evicted(self):
+        """При переполнении вытесняются давно не читанные записи"""
+        cache = self.make_cache(MAX_ENTRIES=2, CULL_FREQUENCY=3)
+        cache.set('old', 1)
+        cache.set('used', 2)
+        cache._db.execute(
+            "UPDATE cache SET accessed = 0 WHERE key LIKE '%old'"
+        )
+        cache.set('new', 3)
+        self.assertEqual(cache.get_many(['old', 'used', 'new']),
+                         {'used': 2, 'new': 3})
+
+    def test_size_limit_evicts_entries(self):
+        """Суммарный размер значений не превышает MAX_SIZE"""
+        cache = self.make_cache(MAX_SIZE=3000)
+        for number in range(5):
+            cache.set(f'key{number}', 'x' * 1000)
+        size = cache._db.execute('SELECT sum(size) FROM cache').fetchone()[0]
+        self.assertLessEqual(size, 3000)
+        self.assertIsNotNone(cache.get('key4'))
+
+    def test_totals_follow_every_write(self):
+        """Число и размер записей ведутся без пересчёта таблицы"""
+        def totals():
+            return self.cache._db.execute(
+                'SELECT entries, size FROM cache_totals'
+            ).fetchone()
+
+        def actual():
+            return self.cache._db.execute(
+                'SELECT count(*), coalesce(sum(size), 0) FROM cache'
+            ).fetchone()
+
+        self.cache.set_many({'a': 1, 'b': 'x' * 100})
+        self.cache.set('a', 'y' * 50)
+        self.cache.add('c', 1)
+        self.cache.incr('c', 10 ** 30)
+        self.cache.delete('b')
+        self.assertEqual(totals(), actual())
+        self.assertEqual(totals()[0], 2)
+        self.cache.clear()
+        self.assertEqual(totals(), (0, 0))
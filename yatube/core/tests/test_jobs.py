@@ -0,0 +1,166 @@
+import datetime
+import json
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core import jobs
+from core.models import Job
+
+User = get_user_model()
+
+CALLS = []
+
+
+def record(value):
+    CALLS.append(value)
+
+
+def explode(value):
+    CALLS.append(value)
+    raise RuntimeError('не получилось')
+
+
+@override_settings(JOB_RETRY_DELAY=10, JOB_MAX_ATTEMPTS=2)
+class JobQueueTest(TestCase):
+    def setUp(self):
+        CALLS.clear()
+
+    def test_jobs_run_by_priority_and_are_removed(self):
+        """Задачи выполняются по приоритету и удаляются после успеха"""
+        jobs.enqueue(record, 'обычная')
+        jobs.enqueue(record, 'срочная', priority=jobs.HIGH)
+        jobs.enqueue(record, 'отложенная', delay=60)
+        self.assertEqual(jobs.run_pending(), 2)
+        self.assertEqual(CALLS, ['срочная', 'обычная'])
+        self.assertEqual(Job.objects.get().task, jobs.task_name(record))
+
+    def test_duplicate_key_is_ignored_until_done(self):
+        """Задача с тем же ключом не ставится, пока первая ждёт"""
+        self.assertIsNotNone(jobs.enqueue(record, 1, key='один'))
+        self.assertIsNone(jobs.enqueue(record, 2, key='один'))
+        jobs.run_pending()
+        self.assertIsNotNone(jobs.enqueue(record, 3, key='один'))
+        self.assertEqual(CALLS, [1])
+
+    def test_failed_job_is_retried_with_backoff(self):
+        """Упавшая задача повторяется позже, а после последней попытки
+        остаётся проваленной"""
+        job = jobs.enqueue(explode, 'раз')
+        with self.assertLogs('core.jobs', 'ERROR') as logs:
+            jobs.run_pending()
+        self.assertIn('не получилось', logs.output[0])
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 1)
+        self.assertIn('не получилось', job.last_error)
+        self.assertGreaterEqual(
+            job.run_at, timezone.now() + datetime.timedelta(seconds=9)
+        )
+        Job.objects.update(run_at=timezone.now())
+        with self.assertLogs('core.jobs', 'ERROR'):
+            jobs.run_pending()
+        job.refresh_from_db()
+        self.assertIsNotNone(job.failed_at)
+        self.assertEqual(CALLS, ['раз', 'раз'])
+        Job.objects.update(run_at=timezone.now())
+        self.assertEqual(jobs.run_pending(), 0)
+
+    def test_unfinished_job_becomes_visible_again(self):
+        """Взятая, но не завершённая задача возвращается после таймаута"""
+        job = jobs.enqueue(record, 'потерянная')
+        [(job_id, stale_token)] = jobs.claim(1, 'first')
+        self.assertEqual(jobs.claim(1, 'second'), [])
+        Job.objects.update(run_at=timezone.now())
+        [(_, token)] = jobs.claim(1, 'second')
+        # Первый исполнитель опоздал: его результат не засчитывается.
+        self.assertFalse(jobs.execute(job_id, stale_token))
+        self.assertTrue(jobs.execute(job_id, token))
+        self.assertFalse(Job.objects.filter(pk=job.pk).exists())
+
+    def test_rolled_back_job_is_not_queued(self):
+        """Задача из откаченной транзакции не выполняется"""
+        try:
+            with transaction.atomic():
+                jobs.enqueue(record, 'откат')
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertFalse(Job.objects.exists())
+
+    def test_password_reset_mail_is_sent_by_worker(self):
+        """Письмо для сброса пароля отправляется из очереди"""
+        User.objects.create_user(
+            username='forgetful', email='forgetful@example.com',
+            password='secret-password'
+        )
+        response = self.client.post(
+            reverse('users:password_reset'),
+            {'email': 'forgetful@example.com'},
+        )
+        self.assertRedirects(response, reverse('users:password_reset_done'))
+        self.assertEqual(len(mail.outbox), 0)
+        jobs.run_pending()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['forgetful@example.com'])
+
+
+@override_settings(JOB_EAGER=True, JOB_MAX_ATTEMPTS=2)
+class EagerJobsTest(TransactionTestCase):
+    def setUp(self):
+        CALLS.clear()
+
+    def test_jobs_run_on_commit(self):
+        """При JOB_EAGER задача выполняется после фиксации транзакции"""
+        with transaction.atomic():
+            jobs.enqueue(record, 'сразу')
+            jobs.enqueue(record, 'отложенная', delay=60)
+            self.assertEqual(CALLS, [])
+        self.assertEqual(CALLS, ['сразу'])
+        self.assertEqual(json.loads(Job.objects.get().args), ['отложенная'])
+
+    def test_failed_job_stays_queued(self):
+        """Упавшая задача остаётся в очереди для повтора"""
+        with self.assertLogs('core.jobs', 'ERROR') as logs:
+            jobs.enqueue(explode, 'раз')
+        self.assertIn('не получилось', logs.output[0])
+        job = Job.objects.get()
+        self.assertEqual(job.attempts, 1)
+        self.assertIsNone(job.failed_at)
+
+    def test_password_reset_mail_is_sent_without_workers(self):
+        """Письмо для сброса пароля уходит без run_workers"""
+        User.objects.create_user(
+            username='forgetful', email='forgetful@example.com',
+            password='secret-password'
+        )
+        self.client.post(
+            reverse('users:password_reset'),
+            {'email': 'forgetful@example.com'},
+        )
+        self.assertEqual(len(mail.outbox), 1)
+
+
+@override_settings(JOB_EAGER=False)
+class RunWorkersTest(TransactionTestCase):
+    def setUp(self):
+        CALLS.clear()
+
+    def test_run_workers_burst(self):
+        """run_workers --burst выполняет очередь в пуле и выходит"""
+        for number in range(3):
+            jobs.enqueue(record, number)
+        out = StringIO()
+        # Один исполнитель: следующая задача берётся только после
+        # завершения предыдущей. Тестовая база в памяти работает в режиме
+        # общего кэша, и одновременные запись и выборка из двух потоков
+        # падают с «database table is locked» вместо ожидания.
+        call_command('run_workers', '--burst', '--workers', '1', stdout=out)
+        self.assertEqual(sorted(CALLS), [0, 1, 2])
+        self.assertFalse(Job.objects.exists())
+        self.assertIn('Выполнено задач: 3', out.getvalue())
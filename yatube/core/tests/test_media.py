@@ -0,0 +1,93 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+CONTENT = b'0123456789'
+DIGEST = 'ab' * 32
+HASHED = f'posts/ab/ab/{DIGEST}.gif'
+
+
+class MediaServingTest(SimpleTestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        for name in ('posts/old.gif', HASHED):
+            path = os.path.join(self.media_root, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file_:
+                file_.write(CONTENT)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def tearDown(self):
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def get(self, name, **headers):
+        return self.client.get(settings.MEDIA_URL + name, **headers)
+
+    def test_file_is_served_with_validators(self):
+        """Файл отдаётся целиком с ETag и кэшированием на время"""
+        response = self.get('posts/old.gif')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), CONTENT)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=3600')
+        self.assertIn('ETag', response)
+
+    def test_hashed_file_is_immutable(self):
+        """Файл с именем из хэша кэшируется навсегда и проверяется по ETag"""
+        response = self.get(HASHED)
+        self.assertEqual(response['ETag'], f'"{DIGEST}"')
+        self.assertIn('immutable', response['Cache-Control'])
+        response = self.get(HASHED, HTTP_IF_NONE_MATCH=f'"{DIGEST}"')
+        self.assertEqual(response.status_code, 304)
+
+    def test_range_requests(self):
+        """Запросы диапазона отдают только нужные байты"""
+        cases = (
+            ('bytes=2-5', b'2345', 'bytes 2-5/10'),
+            ('bytes=7-', b'789', 'bytes 7-9/10'),
+            ('bytes=-3', b'789', 'bytes 7-9/10'),
+            ('bytes=8-100', b'89', 'bytes 8-9/10'),
+        )
+        for header, body, content_range in cases:
+            with self.subTest(header=header):
+                response = self.get(HASHED, HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(b''.join(response.streaming_content), body)
+                self.assertEqual(response['Content-Range'], content_range)
+                self.assertEqual(response['Content-Length'], str(len(body)))
+        response = self.get(HASHED, HTTP_RANGE='bytes=10-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+        response = self.get(
+            HASHED, HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE='"changed"'
+        )
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(MEDIA_SENDFILE='x-accel-redirect')
+    def test_accel_redirect(self):
+        """С nginx приложение отдаёт только заголовок, а файл — сервер"""
+        response = self.get(HASHED)
+        self.assertEqual(response.content, b'')
+        location = response['X-Accel-Redirect']
+        self.assertEqual(location, settings.MEDIA_ACCEL_PREFIX + HASHED)
+        # Так internal location nginx находит файл по заголовку.
+        path = os.path.join(
+            self.media_root, location[len(settings.MEDIA_ACCEL_PREFIX):]
+        )
+        with open(path, 'rb') as file_:
+            self.assertEqual(file_.read(), CONTENT)
+        self.assertIn('immutable', response['Cache-Control'])
+
+    def test_paths_outside_media_are_not_served(self):
+        """Файлы вне MEDIA_ROOT и недокачанные загрузки не отдаются"""
+        os.makedirs(os.path.join(self.media_root, '.incoming'))
+        with open(os.path.join(self.media_root, '.incoming', 'tmp'), 'w'):
+            pass
+        for name in ('../settings.py', '.incoming/tmp', 'posts/missing.gif'):
+            with self.subTest(name=name):
+                self.assertEqual(self.get(name).status_code, 404)
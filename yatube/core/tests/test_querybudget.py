@@ -0,0 +1,70 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core import querybudget
+from posts.models import Post
+
+User = get_user_model()
+
+LAZY_TEMPLATE = Template(
+    '{% for post in posts %}\n'
+    '{{ post.text }}\n'
+    '{{ post.author.username }}\n'
+    '{% endfor %}'
+)
+
+
+class QueryBudgetTest(querybudget.QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for number in range(3):
+            Post.objects.create(
+                text=f'Запись {number}',
+                author=User.objects.create_user(username=f'user{number}'),
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_lazy_load_points_to_template_line(self):
+        """Повторы ленивой загрузки указывают на строку шаблона"""
+        with querybudget.record() as report:
+            LAZY_TEMPLATE.render(Context({'posts': Post.objects.all()}))
+        self.assertEqual(report.count, 4)
+        [(shape, places)] = report.duplicates(limit=3).items()
+        self.assertIn('"auth_user"', shape)
+        self.assertEqual(set(places), {'<unknown source>:3'})
+
+        with querybudget.record() as report:
+            LAZY_TEMPLATE.render(Context({
+                'posts': Post.objects.select_related('author'),
+            }))
+        self.assertEqual(report.count, 1)
+        self.assertEqual(report.duplicates(limit=2), {})
+
+    def test_in_lists_of_any_length_have_one_shape(self):
+        """Списки IN разной длины считаются одной формой запроса"""
+        self.assertEqual(
+            querybudget.shape_of('SELECT 1 WHERE "id" IN (%s, %s, %s)'),
+            querybudget.shape_of('SELECT 1 WHERE "id" IN (%s)'),
+        )
+
+    @override_settings(QUERY_BUDGETS={'posts:index': 1})
+    def test_over_budget_is_logged(self):
+        """Превышение бюджета пишется в журнал с именем вида"""
+        with self.assertLogs('core.querybudget', 'WARNING') as logs:
+            response = self.client.get(reverse('posts:index'))
+        self.assertIn('posts:index', logs.output[0])
+        self.assertEqual(response.query_report.view_name, 'posts:index')
+        with self.assertRaises(AssertionError):
+            self.assertWithinQueryBudget(response)
+
+    @override_settings(QUERY_BUDGETS={'posts:index': 1},
+                       QUERY_BUDGET_RAISE=True)
+    def test_over_budget_raises(self):
+        """С QUERY_BUDGET_RAISE превышение бюджета — ошибка"""
+        with self.assertRaises(querybudget.QueryBudgetExceeded):
+            self.client.get(reverse('posts:index'))
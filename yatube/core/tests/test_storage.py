@@ -0,0 +1,44 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.test import TransactionTestCase
+
+from core import storage
+from core.models import StoredFile
+
+
+class ContentAddressedStorageTest(TransactionTestCase):
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.storage = storage.ContentAddressedStorage(location=self.location)
+
+    def tearDown(self):
+        shutil.rmtree(self.location, ignore_errors=True)
+
+    def test_identical_uploads_are_stored_once(self):
+        """Одинаковое содержимое хранится одним файлом в дереве по хэшу"""
+        digest = hashlib.sha256(b'picture').hexdigest()
+        first = self.storage.save('posts/a.JPG', ContentFile(b'picture'))
+        second = self.storage.save('posts/b.jpg', ContentFile(b'picture'))
+        self.assertEqual(
+            first, f'posts/{digest[:2]}/{digest[2:4]}/{digest}.jpg'
+        )
+        self.assertEqual(first, second)
+        incoming = self.storage.path(storage.INCOMING_DIR)
+        self.assertEqual(os.listdir(incoming), [])
+        other = self.storage.save('posts/c.jpg', ContentFile(b'other'))
+        self.assertNotEqual(other, first)
+
+    def test_file_is_deleted_with_last_reference(self):
+        """Файл удаляется, когда на него не остаётся ссылок"""
+        name = self.storage.save('posts/a.gif', ContentFile(b'picture'))
+        storage.acquire(name)
+        storage.acquire(name)
+        self.assertFalse(storage.release(name, self.storage))
+        self.assertTrue(self.storage.exists(name))
+        self.assertTrue(storage.release(name, self.storage))
+        self.assertFalse(self.storage.exists(name))
+        self.assertFalse(StoredFile.objects.filter(name=name).exists())
@@ -0,0 +1,89 @@
+import threading
+import time
+
+from django.core.cache import cache
+from django.template import Context, Template
+from django.test import SimpleTestCase, override_settings
+
+from core.swr import get_or_compute, get_stats
+
+
+class Counter:
+    def __init__(self, delay=0):
+        self.calls = 0
+        self.delay = delay
+
+    def __call__(self):
+        time.sleep(self.delay)
+        self.calls += 1
+        return self.calls
+
+
+@override_settings(SWR_BETA=0)
+class StaleWhileRevalidateTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_concurrent_misses_compute_once(self):
+        """Одновременные промахи вычисляют значение один раз"""
+        compute = Counter(delay=0.2)
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(
+                get_or_compute('key', compute, 60)
+            ))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(compute.calls, 1)
+        self.assertEqual(results, [1] * 5)
+        self.assertEqual(get_stats(), {'recomputed': 1, 'saved': 4})
+
+    def test_waiters_stop_when_lock_is_released(self):
+        """Если пересчёт упал и снял блокировку, ожидающий считает сам"""
+        compute = Counter()
+        cache.add('key:lock', 1)
+        threading.Timer(0.1, cache.delete, ['key:lock']).start()
+        started = time.time()
+        self.assertEqual(get_or_compute('key', compute, 60), 1)
+        self.assertLess(time.time() - started, 1)
+        self.assertIsNone(cache.get('key:lock'))
+
+    @override_settings(SWR_WAIT_TIMEOUT=0.2)
+    def test_wait_is_capped(self):
+        """Без значения ожидание ограничено SWR_WAIT_TIMEOUT"""
+        compute = Counter()
+        cache.add('key:lock', 1)
+        started = time.time()
+        self.assertEqual(get_or_compute('key', compute, 60), 1)
+        self.assertLess(time.time() - started, 1)
+
+    def test_stale_value_is_served_while_recomputing(self):
+        """Пока один запрос пересчитывает значение, другие получают старое"""
+        compute = Counter()
+        get_or_compute('key', compute, timeout=-1)
+        cache.add('key:lock', 1)
+        self.assertEqual(get_or_compute('key', compute, 60), 1)
+        self.assertEqual(compute.calls, 1)
+        cache.delete('key:lock')
+        self.assertEqual(get_or_compute('key', compute, 60), 2)
+
+    @override_settings(SWR_BETA=10 ** 9)
+    def test_probabilistic_early_expiry(self):
+        """Близкое к истечению значение пересчитывается заранее"""
+        compute = Counter(delay=0.01)
+        get_or_compute('key', compute, 60)
+        self.assertEqual(get_or_compute('key', compute, 60), 2)
+
+    def test_template_tag(self):
+        """Тег swrcache кэширует фрагмент шаблона"""
+        template = Template(
+            '{% load swr_cache %}{% swrcache 60 fragment name %}'
+            '{{ value }}{% endswrcache %}'
+        )
+        first = template.render(Context({'name': 'a', 'value': 'old'}))
+        second = template.render(Context({'name': 'a', 'value': 'new'}))
+        self.assertEqual(first, second)
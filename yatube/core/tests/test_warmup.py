@@ -0,0 +1,76 @@
+import json
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.template import engines
+from django.test import Client, TestCase, override_settings
+
+from core.warmup import compile_templates, prime_pages, warmup
+
+# Как в settings_production: загрузчики заданы явно, APP_DIRS выключен.
+CACHED_TEMPLATES = [dict(settings.TEMPLATES[0], APP_DIRS=False)]
+CACHED_TEMPLATES[0]['OPTIONS'] = dict(
+    CACHED_TEMPLATES[0]['OPTIONS'], loaders=[
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
+)
+
+
+class WarmupTest(TestCase):
+    def test_warmup_reports_every_step(self):
+        """Прогрев проходит все шаги и разбирает шаблоны проекта"""
+        report = {name: count for name, count, _ in warmup()}
+        self.assertEqual(set(report), {
+            'modules', 'templates', 'urls', 'password validators',
+            'connections', 'pages',
+        })
+        templates = [
+            'base.html', 'includes/header.html',
+            'posts/includes/paginator.html',
+        ]
+        self.assertGreaterEqual(report['templates'], len(templates))
+        self.assertGreater(report['urls'], 0)
+        for name in templates:
+            engines['django'].get_template(name)
+
+    def test_command(self):
+        """Команда warmup печатает отчёт"""
+        out = StringIO()
+        call_command('warmup', stdout=out)
+        self.assertIn('Прогрев завершён', out.getvalue())
+
+    def test_cached_loaders_compile_app_templates(self):
+        """С явными загрузчиками разбираются и шаблоны приложений"""
+        count = compile_templates()
+        with override_settings(TEMPLATES=CACHED_TEMPLATES):
+            self.assertEqual(compile_templates(), count)
+
+    @override_settings(ALLOWED_HOSTS=['.yatube.example'], WARMUP_URLS=['/'])
+    def test_pages_are_requested_with_allowed_host(self):
+        """Страницы прогреваются с разрешённым Host"""
+        self.assertEqual(prime_pages(), 1)
+
+    def test_failing_page_does_not_break_warmup(self):
+        """Упавшая страница не прерывает прогрев"""
+        with mock.patch.object(Client, 'get', side_effect=RuntimeError), \
+                self.assertLogs('core.warmup', 'ERROR'):
+            report = {name: count for name, count, _ in warmup()}
+        self.assertEqual(report['pages'], 0)
+
+    @override_settings(ALLOWED_HOSTS=['.yatube.example'], WARMUP_URLS=['/'])
+    def test_probe_uses_allowed_host(self):
+        """Замер для --compare запрашивает страницы с разрешённым Host"""
+        out = StringIO()
+        call_command('warmup', '--probe', stdout=out)
+        self.assertEqual(set(json.loads(out.getvalue())), {'/'})
+
+    @override_settings(WARMUP_URLS=['/missing-page/'])
+    def test_probe_rejects_error_pages(self):
+        """Замер не засчитывает страницы, ответившие ошибкой"""
+        with self.assertRaisesMessage(CommandError, '404'):
+            call_command('warmup', '--probe', stdout=StringIO())
@@ -0,0 +1,165 @@
+"""Прогрев процесса до первого запроса.
+
+Первый запрос после старта воркера платит за импорт тяжёлых модулей
+(sorl.thumbnail, PIL), разбор шаблонов, построение таблиц URL,
+загрузку валидаторов паролей и соединения с базой и кэшем. `warmup()`
+делает всё это заранее; вызывается командой `manage.py warmup` или из
+`wsgi.py` при загрузке приложения.
+"""
+import importlib
+import logging
+import os
+import time
+
+from django.conf import settings
+from django.contrib.auth.password_validation import (
+    get_default_password_validators,
+)
+from django.core.cache import caches
+from django.db import connections
+from django.template import TemplateSyntaxError, engines
+from django.test import Client
+from django.urls import URLResolver, get_resolver
+
+logger = logging.getLogger(__name__)
+
+MODULES = ('PIL.Image', 'sorl.thumbnail', 'sorl.thumbnail.shortcuts')
+
+
+def import_modules():
+    for name in MODULES:
+        importlib.import_module(name)
+    return len(MODULES)
+
+
+def _loader_dirs(loaders):
+    for loader in loaders:
+        # Кэширующий загрузчик сам каталогов не знает.
+        if hasattr(loader, 'loaders'):
+            yield from _loader_dirs(loader.loaders)
+        elif hasattr(loader, 'get_dirs'):
+            yield from loader.get_dirs()
+
+
+def template_dirs(engine):
+    """Каталоги, из которых загрузчики движка берут шаблоны.
+
+    `engine.template_dirs` учитывает каталоги приложений только при
+    APP_DIRS, а с явным app_directories.Loader их пропускает.
+    """
+    loaders = getattr(getattr(engine, 'engine', None), 'template_loaders',
+                      None)
+    if loaders is None:
+        return engine.template_dirs
+    return list(dict.fromkeys(_loader_dirs(loaders)))
+
+
+def compile_templates():
+    """Разбирает все шаблоны; с кэширующим загрузчиком они остаются
+    в памяти и больше не читаются с диска."""
+    count = 0
+    for engine in engines.all():
+        for directory in template_dirs(engine):
+            for root, _, files in os.walk(directory):
+                for filename in files:
+                    name = os.path.relpath(
+                        os.path.join(root, filename), directory
+                    )
+                    try:
+                        engine.get_template(name)
+                    except (TemplateSyntaxError, UnicodeDecodeError):
+                        continue
+                    count += 1
+    return count
+
+
+def _populate(resolver):
+    # reverse_dict строится лениво при первом reverse() в каждом
+    # пространстве имён.
+    count = len(resolver.reverse_dict)
+    for pattern in resolver.url_patterns:
+        if isinstance(pattern, URLResolver):
+            count += _populate(pattern)
+    return count
+
+
+def resolve_urls():
+    return _populate(get_resolver())
+
+
+def load_validators():
+    return len(get_default_password_validators())
+
+
+def connect(databases=True):
+    count = 0
+    if databases:
+        for connection in connections.all():
+            connection.ensure_connection()
+            count += 1
+    for alias in settings.CACHES:
+        caches[alias].get('warmup')
+        count += 1
+    return count
+
+
+def page_client():
+    """Тестовый клиент для запросов страниц изнутри процесса.
+
+    По умолчанию клиент представляется testserver, которого
+    в ALLOWED_HOSTS боевого сервера нет: ответом был бы 400.
+    """
+    host = 'localhost'
+    for allowed in settings.ALLOWED_HOSTS:
+        if allowed != '*':
+            host = allowed.lstrip('.')
+            break
+    return Client(HTTP_HOST=host)
+
+
+def prime_pages():
+    """Запрашивает страницы из WARMUP_URLS, заполняя кэши фрагментов.
+
+    Возвращает число страниц, ответивших без ошибки; упавшая страница
+    пишется в журнал и не мешает старту воркера.
+    """
+    client = page_client()
+    count = 0
+    for url in settings.WARMUP_URLS:
+        try:
+            response = client.get(url)
+        except Exception:
+            logger.exception('Прогрев %s не удался', url)
+            continue
+        if response.status_code >= 400:
+            logger.warning('Прогрев %s: ответ %s', url, response.status_code)
+            continue
+        count += 1
+    return count
+
+
+def warmup(databases=True):
+    """Прогревает процесс и возвращает список шагов
+    (название, число объектов, секунды).
+
+    При `databases=False` соединения с базой не открываются: так
+    нужно при загрузке до fork, когда соединение не должно
+    достаться нескольким воркерам сразу.
+    """
+    steps = (
+        ('modules', import_modules),
+        ('templates', compile_templates),
+        ('urls', resolve_urls),
+        ('password validators', load_validators),
+        ('connections', lambda: connect(databases)),
+        ('pages', prime_pages),
+    )
+    report = []
+    for name, step in steps:
+        started = time.perf_counter()
+        count = step()
+        report.append((name, count, time.perf_counter() - started))
+    if not databases:
+        # prime_pages() всё же обращается к базе.
+        connections.close_all()
+    return report
@@ -0,0 +1,79 @@
+"""Условные GET-запросы (ETag / Last-Modified) для лент и постов.
+
+Валидаторы строятся из версий кэша лент (см. feed_cache): версия
+области меняется при каждой записи поста или комментария, поэтому
+304 Not Modified отдаётся без запросов к ленте и без рендеринга.
+Для авторизованных пользователей ETag зависит ещё от пользователя
+и его подписок: у них отличаются кнопка подписки и форма комментария.
+Форма несёт CSRF-токен, поэтому в ETag входит и он: после нового входа
+токен меняется, и закэшированная браузером форма уже не годится.
+"""
+import hashlib
+
+from django.views.decorators.http import condition
+
+from . import feed_cache
+from .models import Group, Post, User
+
+
+def index_scopes(request):
+    return ['index']
+
+
+def group_scopes(request, slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'pk', flat=True
+    ).first()
+    return None if group_id is None else [f'group:{group_id}']
+
+
+def profile_scopes(request, username):
+    author_id = User.objects.filter(username=username).values_list(
+        'pk', flat=True
+    ).first()
+    return None if author_id is None else [f'author:{author_id}']
+
+
+def post_scopes(request, post_id):
+    # На странице записи выводится и число записей автора.
+    author_id = Post.objects.filter(pk=post_id).values_list(
+        'author_id', flat=True
+    ).first()
+    if author_id is None:
+        return None
+    return [f'post:{post_id}', f'author:{author_id}']
+
+
+def conditional_page(get_scopes):
+    """Декоратор: отвечает 304, если страница не менялась."""
+
+    def scopes(request, *args, **kwargs):
+        if not hasattr(request, '_page_scopes'):
+            request._page_scopes = get_scopes(request, *args, **kwargs)
+            user = request.user
+            if request._page_scopes is not None and user.is_authenticated:
+                request._page_scopes.append(f'follows:{user.pk}')
+        return request._page_scopes
+
+    def etag(request, *args, **kwargs):
+        page_scopes = scopes(request, *args, **kwargs)
+        if page_scopes is None:
+            return None
+        parts = (
+            feed_cache.get_version(*page_scopes),
+            request.GET.urlencode(),
+            str(request.user.pk or ''),
+            request.META.get('CSRF_COOKIE', ''),
+        )
+        return hashlib.md5('|'.join(parts).encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        # Для авторизованных страница зависит не только от записей.
+        if request.user.is_authenticated:
+            return None
+        page_scopes = scopes(request, *args, **kwargs)
+        if page_scopes is None:
+            return None
+        return feed_cache.last_modified(*page_scopes)
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
@@ -0,0 +1,84 @@
+"""Денормализованные счётчики записей и комментариев.
+
+Счётчики меняются обработчиками сигналов внутри транзакции, в которой
+создаётся или удаляется запись, поэтому шаблонам не нужен COUNT(*).
+Если счётчики разошлись с данными (например, после bulk_create),
+их пересчитывает команда `manage.py rebuild_counters`.
+"""
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Group, Post, UserStats
+
+
+def _add_author_posts(user_id, delta):
+    updated = UserStats.objects.filter(user_id=user_id).update(
+        posts_count=F('posts_count') + delta
+    )
+    if not updated:
+        UserStats.objects.get_or_create(
+            user_id=user_id,
+            defaults={
+                'posts_count': Post.objects.filter(author_id=user_id).count()
+            }
+        )
+
+
+def _add_group_posts(group_id, delta):
+    if group_id is not None:
+        Group.objects.filter(pk=group_id).update(
+            posts_count=F('posts_count') + delta
+        )
+
+
+def post_created(post):
+    _add_author_posts(post.author_id, 1)
+    _add_group_posts(post.group_id, 1)
+
+
+def post_moved(old_group_id, new_group_id):
+    if old_group_id != new_group_id:
+        _add_group_posts(old_group_id, -1)
+        _add_group_posts(new_group_id, 1)
+
+
+def post_deleted(post):
+    _add_author_posts(post.author_id, -1)
+    _add_group_posts(post.group_id, -1)
+
+
+def comment_added(comment, delta):
+    if comment.post_id is not None:
+        Post.objects.filter(pk=comment.post_id).update(
+            comments_count=F('comments_count') + delta
+        )
+
+
+def _count(queryset, field):
+    """Подзапрос количества строк queryset для OuterRef('pk')."""
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(count=Count('pk'))
+            .values('count'),
+            output_field=IntegerField()
+        ),
+        0
+    )
+
+
+def rebuild():
+    """Пересчитывает все счётчики по данным."""
+    with transaction.atomic():
+        Group.objects.update(posts_count=_count(Post.objects, 'group'))
+        Post.objects.update(comments_count=_count(Comment.objects, 'post'))
+        UserStats.objects.all().delete()
+        UserStats.objects.bulk_create(
+            UserStats(user_id=row['author'], posts_count=row['count'])
+            for row in Post.objects.order_by().values('author').annotate(
+                count=Count('pk')
+            )
+        )
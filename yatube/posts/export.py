@@ -0,0 +1,119 @@
+"""Выгрузка записей и комментариев в CSV или JSONL.
+
+Строки читаются через `values_list().iterator(chunk_size=...)`:
+курсор базы отдаёт их порциями, экземпляры моделей не создаются,
+а каждая порция сразу кодируется в одну строку и отдаётся дальше
+(в StreamingHttpResponse или в файл). Поэтому память не зависит
+от размера выгрузки.
+
+Даты выгружаются строкой в UTC в том виде, в каком их отдаёт база:
+разбор в datetime и обратное форматирование занимали больше половины
+времени выгрузки.
+"""
+import csv
+import datetime
+import io
+import json
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import CharField
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from .models import Comment, Post
+
+# Имя колонки -> путь или выражение для values_list().
+FIELDS = {
+    'posts': {
+        'id': 'id',
+        'pub_date': Cast('pub_date', CharField()),
+        'author': 'author__username',
+        'group': 'group__slug',
+        'text': 'text',
+        'image': 'image',
+        'comments_count': 'comments_count',
+    },
+    'comments': {
+        'id': 'id',
+        'post': 'post_id',
+        'created': Cast('created', CharField()),
+        'author': 'author__username',
+        'text': 'text',
+    },
+}
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+
+def _start_of(day):
+    return timezone.make_aware(
+        datetime.datetime.combine(day, datetime.time.min)
+    )
+
+
+def get_queryset(kind, group=None, author=None, since=None, until=None):
+    """Строки выгрузки с фильтрами; `until` включительно."""
+    if kind == 'posts':
+        queryset, date_field, group_path = Post.objects, 'pub_date', 'group'
+    else:
+        queryset, date_field = Comment.objects, 'created'
+        group_path = 'post__group'
+    filters = {}
+    if group:
+        filters[f'{group_path}__slug'] = group
+    if author:
+        filters['author__username'] = author
+    if since:
+        filters[f'{date_field}__gte'] = _start_of(since)
+    if until:
+        filters[f'{date_field}__lt'] = _start_of(
+            until + datetime.timedelta(days=1)
+        )
+    return (
+        queryset.filter(**filters)
+        .order_by('id')
+        .values_list(*FIELDS[kind].values())
+    )
+
+
+def _chunks(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def csv_lines(header, chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for chunk in chunks:
+        writer.writerows(chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        # Пустая выгрузка: только заголовок.
+        yield buffer.getvalue()
+
+
+def jsonl_lines(header, chunks):
+    encode = json.JSONEncoder(ensure_ascii=False).encode
+    for chunk in chunks:
+        yield ''.join(
+            encode(dict(zip(header, row))) + '\n' for row in chunk
+        )
+
+
+def stream(kind, data_format, chunk_size=None, **filters):
+    """Генератор строк выгрузки: по одной на порцию из `chunk_size`
+    записей."""
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    rows = get_queryset(kind, **filters).iterator(chunk_size=chunk_size)
+    encode = csv_lines if data_format == 'csv' else jsonl_lines
+    return encode(list(FIELDS[kind]), _chunks(rows, chunk_size))
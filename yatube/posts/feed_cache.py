@@ -0,0 +1,112 @@
+"""Поколения (версии) кэша фрагментов лент.
+
+Ключ каждого закэшированного фрагмента включает версию его области:
+всей ленты (`index`), группы, автора или поста. Запись в область
+увеличивает версию, и старые фрагменты перестают читаться сразу,
+а не по истечении срока жизни, поэтому сам срок можно делать долгим.
+
+Обработчики сигналов увеличивают версию через `bump_on_commit()`: если
+сделать это до фиксации, параллельный запрос успеет отрисовать ещё
+прежние данные и закэшировать их под новой версией.
+"""
+import datetime
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Comment, Post
+
+VERSION_KEY = 'feed-version:{}'
+MODIFIED_KEY = 'feed-modified:{}'
+
+
+def _initial_version():
+    # После вытеснения ключа версия не должна вернуться к уже
+    # использованному значению, поэтому начинаем с текущего времени.
+    return int(time.time() * 1000)
+
+
+def get_version(*scopes):
+    """Возвращает общую версию для набора областей."""
+    keys = [VERSION_KEY.format(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _initial_version(), None)
+            versions[key] = cache.get(key)
+    return '.'.join(str(versions[key]) for key in keys)
+
+
+def last_modified(*scopes):
+    """Время последней записи в любую из областей.
+
+    Если время неизвестно (ключ вытеснен), им становится текущее время:
+    лучше отдать страницу заново, чем ответить 304 на устаревшую.
+    """
+    keys = [MODIFIED_KEY.format(scope) for scope in scopes]
+    times = cache.get_many(keys)
+    for key in keys:
+        if key not in times:
+            cache.add(key, time.time(), None)
+            times[key] = cache.get(key)
+    return datetime.datetime.fromtimestamp(
+        max(times.values()), tz=datetime.timezone.utc
+    )
+
+
+def bump(*scopes):
+    """Инвалидирует все фрагменты перечисленных областей."""
+    now = time.time()
+    for scope in scopes:
+        key = VERSION_KEY.format(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _initial_version(), None)
+    cache.set_many(
+        {MODIFIED_KEY.format(scope): now for scope in scopes}, None
+    )
+
+
+def bump_on_commit(*scopes):
+    """`bump()` после фиксации текущей транзакции (без транзакции —
+    сразу)."""
+    transaction.on_commit(lambda: bump(*scopes))
+
+
+def post_scopes(post, *extra_group_ids):
+    """Области, которые затрагивает изменение записи."""
+    scopes = ['index', f'author:{post.author_id}', f'post:{post.pk}']
+    for group_id in {post.group_id, *extra_group_ids}:
+        if group_id is not None:
+            scopes.append(f'group:{group_id}')
+    return scopes
+
+
+def _scopes_of_posts(posts):
+    rows = posts.order_by().values_list('pk', 'author_id', 'group_id')
+    scopes = {'index'}
+    for pk, author_id, group_id in rows.iterator():
+        scopes.update((f'post:{pk}', f'author:{author_id}'))
+        if group_id is not None:
+            scopes.add(f'group:{group_id}')
+    return scopes
+
+
+def user_scopes(user_id):
+    """Области, где выводится имя пользователя: его записи и записи
+    с его комментариями."""
+    commented = Comment.objects.filter(author_id=user_id).values('post_id')
+    return _scopes_of_posts(
+        Post.objects.filter(author_id=user_id)
+    ) | _scopes_of_posts(
+        Post.objects.filter(pk__in=commented)
+    ) | {f'author:{user_id}'}
+
+
+def group_scopes(group_id):
+    """Области, где выводятся название и адрес группы."""
+    return _scopes_of_posts(
+        Post.objects.filter(group_id=group_id)
+    ) | {f'group:{group_id}'}
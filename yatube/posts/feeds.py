@@ -0,0 +1,160 @@
+"""RSS и Atom: последние записи сайта, группы и автора.
+
+Готовый XML кэшируется под ключом с версией области из feed_cache,
+поэтому новая запись сразу делает старую копию недостижимой. ETag
+тоже строится из версии: на повторный опрос с If-None-Match читатель
+получает 304 без выборки записей и без рендеринга.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.syndication.views import Feed
+from django.core.cache import cache
+from django.http import Http404, HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed
+from django.utils.text import Truncator
+from django.views.decorators.http import condition
+
+from . import feed_cache
+from .conditional import group_scopes, index_scopes, profile_scopes
+from .models import Group, Post, User
+
+FEED_KEY = 'feed:{}'
+
+
+class PostsFeed(Feed):
+    title = 'Yatube: последние записи'
+    description = 'Новые записи всех авторов Yatube.'
+
+    def link(self):
+        return reverse('posts:index')
+
+    def items(self):
+        return Post.objects.select_related(
+            'author', 'group'
+        )[:settings.FEED_ITEMS]
+
+    def item_title(self, item):
+        return Truncator(item.text).words(10)
+
+    def item_description(self, item):
+        return item.text
+
+    def item_link(self, item):
+        return reverse('posts:post_detail', args=[item.pk])
+
+    def item_pubdate(self, item):
+        return item.pub_date
+
+    def item_author_name(self, item):
+        return item.author.get_full_name() or item.author.username
+
+    def item_categories(self, item):
+        return [item.group.title] if item.group else []
+
+
+class GroupPostsFeed(PostsFeed):
+
+    def get_object(self, request, slug):
+        return get_object_or_404(Group, slug=slug)
+
+    def title(self, group):
+        return f'Yatube: {group.title}'
+
+    def description(self, group):
+        return group.description
+
+    def link(self, group):
+        return reverse('posts:group_posts', args=[group.slug])
+
+    def items(self, group):
+        return group.posts.select_related(
+            'author', 'group'
+        )[:settings.FEED_ITEMS]
+
+
+class AuthorPostsFeed(PostsFeed):
+
+    def get_object(self, request, username):
+        return get_object_or_404(User, username=username)
+
+    def title(self, author):
+        return f'Yatube: {author.get_full_name() or author.username}'
+
+    def description(self, author):
+        return f'Новые записи пользователя {author.username}.'
+
+    def link(self, author):
+        return reverse('posts:profile', args=[author.username])
+
+    def items(self, author):
+        return author.posts.select_related(
+            'author', 'group'
+        )[:settings.FEED_ITEMS]
+
+
+class PostsAtomFeed(PostsFeed):
+    feed_type = Atom1Feed
+
+
+class GroupPostsAtomFeed(GroupPostsFeed):
+    feed_type = Atom1Feed
+
+
+class AuthorPostsAtomFeed(AuthorPostsFeed):
+    feed_type = Atom1Feed
+
+
+def cached_feed(feed_class, get_scopes):
+    """Представление ленты с ETag и кэшем по версии её области."""
+    feed = feed_class()
+
+    def cache_key(request, **kwargs):
+        if not hasattr(request, '_feed_key'):
+            scopes = get_scopes(request, **kwargs)
+            request._feed_key = None
+            if scopes is not None:
+                # Ссылки в ленте абсолютные: хост входит в ключ.
+                parts = (
+                    feed_class.__name__,
+                    request.build_absolute_uri('/'),
+                    *kwargs.values(),
+                    feed_cache.get_version(*scopes),
+                )
+                request._feed_key = hashlib.md5(
+                    '|'.join(parts).encode()
+                ).hexdigest()
+                request._feed_scopes = scopes
+        return request._feed_key
+
+    def last_modified(request, **kwargs):
+        if cache_key(request, **kwargs) is None:
+            return None
+        return feed_cache.last_modified(*request._feed_scopes)
+
+    @condition(etag_func=cache_key, last_modified_func=last_modified)
+    def view(request, **kwargs):
+        key = cache_key(request, **kwargs)
+        if key is None:
+            raise Http404
+        cached = cache.get(FEED_KEY.format(key))
+        if cached is None:
+            response = feed(request, **kwargs)
+            cached = (response['Content-Type'], response.content)
+            cache.set(
+                FEED_KEY.format(key), cached, settings.FEED_CACHE_TIMEOUT
+            )
+        content_type, content = cached
+        return HttpResponse(content, content_type=content_type)
+
+    return view
+
+
+index_rss = cached_feed(PostsFeed, index_scopes)
+index_atom = cached_feed(PostsAtomFeed, index_scopes)
+group_rss = cached_feed(GroupPostsFeed, group_scopes)
+group_atom = cached_feed(GroupPostsAtomFeed, group_scopes)
+profile_rss = cached_feed(AuthorPostsFeed, profile_scopes)
+profile_atom = cached_feed(AuthorPostsAtomFeed, profile_scopes)
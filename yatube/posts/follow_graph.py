@@ -0,0 +1,60 @@
+"""Кэш графа подписок.
+
+Для каждого пользователя в кэше хранится множество id авторов,
+на которых он подписан, и число его подписчиков, поэтому проверка
+`is_following()` и счётчики не обращаются к таблице Follow.
+Обработчики сигналов Follow сбрасывают кэш после фиксации транзакции;
+записи, минующие сигналы (bulk_create, импорт), устаревают
+через FOLLOW_GRAPH_TIMEOUT.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Follow
+
+FOLLOWING_KEY = 'follow-graph:following:{}'
+FOLLOWERS_KEY = 'follow-graph:followers:{}'
+
+
+def following_ids(user_id):
+    """Множество id авторов, на которых подписан пользователь."""
+    key = FOLLOWING_KEY.format(user_id)
+    ids = cache.get(key)
+    if ids is None:
+        ids = frozenset(
+            Follow.objects.filter(user_id=user_id)
+            .values_list('author_id', flat=True)
+        )
+        cache.set(key, ids, settings.FOLLOW_GRAPH_TIMEOUT)
+    return ids
+
+
+def is_following(user, author):
+    if not user.is_authenticated:
+        return False
+    return author.pk in following_ids(user.pk)
+
+
+def following_count(user):
+    return len(following_ids(user.pk))
+
+
+def followers_count(author):
+    key = FOLLOWERS_KEY.format(author.pk)
+    count = cache.get(key)
+    if count is None:
+        count = Follow.objects.filter(author=author).count()
+        cache.add(key, count, settings.FOLLOW_GRAPH_TIMEOUT)
+    return count
+
+
+def follow_changed(user_id, author_id):
+    """Сбрасывает кэш после подписки или отписки.
+
+    Сброс откладывается до фиксации: иначе параллельный запрос успел бы
+    закэшировать ещё не изменённый граф заново.
+    """
+    transaction.on_commit(lambda: cache.delete_many([
+        FOLLOWING_KEY.format(user_id), FOLLOWERS_KEY.format(author_id)
+    ]))
@@ -1,4 +1,5 @@
 from django import forms
+from django.core.exceptions import ValidationError
 
 from .models import Post, Comment
 
@@ -15,3 +16,30 @@ class CommentForm(forms.ModelForm):
     class Meta:
         model = Comment
         fields = ('text',)
+
+
+class ExportForm(forms.Form):
+    """Параметры выгрузки: общие для представления и команды."""
+    kind = forms.ChoiceField(
+        choices=(('posts', 'Записи'), ('comments', 'Комментарии')),
+        initial='posts',
+        required=False
+    )
+    format = forms.ChoiceField(
+        choices=(('csv', 'CSV'), ('jsonl', 'JSONL')),
+        initial='csv',
+        required=False
+    )
+    group = forms.SlugField(required=False)
+    author = forms.CharField(required=False)
+    since = forms.DateField(required=False)
+    until = forms.DateField(required=False)
+
+    def clean(self):
+        data = super().clean()
+        data['kind'] = data.get('kind') or 'posts'
+        data['format'] = data.get('format') or 'csv'
+        since, until = data.get('since'), data.get('until')
+        if since and until and since > until:
+            raise ValidationError('Начало периода позже его конца.')
+        return data
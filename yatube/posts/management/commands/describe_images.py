@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Сохраняет размеры, основной цвет и размер файла для записей, '
+        'загруженных до появления этих полей.'
+    )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').filter(
+            Q(image_width__isnull=True) | Q(image_color='')
+            | Q(image_size__isnull=True)
+        ).order_by('pk').values_list('pk', 'image')
+        # Не создаём экземпляры Post: ImageField открыл бы файл каждой
+        # записи без размеров ещё при инициализации.
+        field = Post._meta.get_field('image')
+        done = failed = 0
+        for pk, name in posts.iterator():
+            image = field.attr_class(None, field, name)
+            try:
+                fields = thumbnails.describe(image)
+            except (OSError, SyntaxError) as error:
+                # Файла нет или это не изображение: запись пропускаем.
+                self.stderr.write(f'Запись {pk}: {error}')
+                failed += 1
+                continue
+            finally:
+                image.close()
+            Post.objects.filter(pk=pk).update(**fields)
+            done += 1
+        self.stdout.write(f'Обработано записей: {done}, с ошибками: {failed}')
@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Follow, Group, Post
+from posts.urls import urlpatterns
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет GET-запрос к каждому адресу приложения posts '
+        'и печатает план выполнения каждого SQL-запроса.'
+    )
+
+    def sample_kwargs(self):
+        post = Post.objects.select_related('author').first()
+        group = Group.objects.first()
+        if post is None or group is None:
+            raise CommandError('Нужны хотя бы одна запись и одна группа.')
+        return {
+            'post_id': post.pk,
+            'slug': group.slug,
+            'username': post.author.username,
+        }, post.author
+
+    def explain(self, sql):
+        prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else (
+            'EXPLAIN '
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def handle(self, *args, **options):
+        sample, author = self.sample_kwargs()
+        viewer = Follow.objects.values_list('user', flat=True).first()
+        client = Client()
+        client.force_login(author if viewer is None else (
+            type(author).objects.get(pk=viewer)
+        ))
+        for pattern in urlpatterns:
+            kwargs = {
+                name: sample[name] for name in pattern.pattern.converters
+            }
+            url = reverse(f'posts:{pattern.name}', kwargs=kwargs)
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'posts:{pattern.name} {url}'
+            ))
+            # Обработчики подписки пишут в базу: откатываем изменения.
+            with transaction.atomic():
+                with CaptureQueriesContext(connection) as queries:
+                    client.get(url)
+                transaction.set_rollback(True)
+            for query in queries.captured_queries:
+                sql = query['sql']
+                self.stdout.write(f'  {sql}')
+                if not sql.lstrip().upper().startswith('SELECT'):
+                    continue
+                for line in self.explain(sql):
+                    self.stdout.write(f'    -> {line}')
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import export
+from posts.forms import ExportForm
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает записи или комментарии в CSV или JSONL потоком, '
+        'не загружая их в память целиком.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--kind', choices=('posts', 'comments'), default='posts'
+        )
+        parser.add_argument(
+            '--format', choices=('csv', 'jsonl'), default='csv'
+        )
+        parser.add_argument('--group', help='Slug группы.')
+        parser.add_argument('--author', help='Имя пользователя автора.')
+        parser.add_argument('--since', help='Начало периода, ГГГГ-ММ-ДД.')
+        parser.add_argument(
+            '--until', help='Конец периода включительно, ГГГГ-ММ-ДД.'
+        )
+        parser.add_argument(
+            '--output', default='-',
+            help='Файл для выгрузки (по умолчанию стандартный вывод).'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=None,
+            help='Сколько строк читать из базы за раз.'
+        )
+
+    def handle(self, *args, **options):
+        form = ExportForm({
+            name: options[name]
+            for name in ('kind', 'format', 'group', 'author', 'since',
+                         'until')
+            if options[name] is not None
+        })
+        if not form.is_valid():
+            raise CommandError(form.errors.as_text())
+        filters = dict(form.cleaned_data)
+        kind, data_format = filters.pop('kind'), filters.pop('format')
+        lines = export.stream(
+            kind, data_format, options['chunk_size'], **filters
+        )
+        if options['output'] == '-':
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        with open(
+            options['output'], 'w', encoding='utf-8', newline=''
+        ) as output:
+            output.writelines(lines)
@@ -0,0 +1,39 @@
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+import django
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт недостающие миниатюры и варианты WebP для всех записей '
+        'с изображениями. Уже созданные миниатюры не пересоздаются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Сколько процессов нарезают изображения.'
+        )
+
+    def handle(self, *args, **options):
+        post_ids = list(
+            Post.objects.exclude(image='').order_by('pk')
+            .values_list('pk', flat=True)
+        )
+        if options['workers'] > 1:
+            with ProcessPoolExecutor(
+                options['workers'],
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=django.setup,
+            ) as executor:
+                # list() пробрасывает исключения из процессов.
+                list(executor.map(thumbnails.generate, post_ids))
+        else:
+            for post_id in post_ids:
+                thumbnails.generate(post_id)
+        self.stdout.write(f'Обработано записей: {len(post_ids)}')
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+
+from posts import search
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Дополняет полнотекстовый индекс записями, которых в нём нет. '
+        'С --full переиндексирует все записи пачками.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Переиндексировать все записи, а не только новые.'
+        )
+        parser.add_argument(
+            '--start-id', type=int, default=None,
+            help='С какого id продолжить прерванную переиндексацию.'
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if not search.is_supported():
+            raise CommandError('Полнотекстовый индекс есть только в SQLite.')
+        start_id = options['start_id']
+        if start_id is None:
+            start_id = 1 if options['full'] else search.last_indexed_id() + 1
+        last_id = Post.objects.aggregate(last=Max('id'))['last'] or 0
+        batch_size = options['batch_size']
+        for first_id in range(start_id, last_id + 1, batch_size):
+            # Каждая пачка в своей транзакции: база не блокируется надолго,
+            # а прерванную команду можно продолжить с --start-id.
+            with transaction.atomic():
+                search.index_batch(first_id, first_id + batch_size - 1)
+            self.stdout.write(
+                f'Проиндексированы id {first_id}..'
+                f'{min(first_id + batch_size - 1, last_id)}'
+            )
+        search.optimize()
+        self.stdout.write('Индекс готов')
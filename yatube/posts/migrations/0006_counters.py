@@ -0,0 +1,67 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:18
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def count_rows(queryset, field):
+    # Как counters._count(): подзапрос количества строк для OuterRef('pk').
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(count=models.Count('pk'))
+            .values('count'),
+            output_field=models.IntegerField()
+        ),
+        0
+    )
+
+
+def fill_counters(apps, schema_editor):
+    # Как counters.rebuild(): по одному UPDATE на таблицу.
+    Comment = apps.get_model('posts', 'Comment')
+    Group = apps.get_model('posts', 'Group')
+    Post = apps.get_model('posts', 'Post')
+    UserStats = apps.get_model('posts', 'UserStats')
+    Group.objects.update(posts_count=count_rows(Post.objects, 'group'))
+    Post.objects.update(comments_count=count_rows(Comment.objects, 'post'))
+    UserStats.objects.bulk_create(
+        UserStats(user_id=row['author'], posts_count=row['count'])
+        for row in Post.objects.order_by().values('author').annotate(
+            count=models.Count('pk')
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0005_timeline'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Количество записей')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='posts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество записей'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество комментариев'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:24
+
+from django.db import migrations
+
+CREATE_SQL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS posts_post_fts USING fts5("
+    "text, tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS posts_post_fts_insert "
+    "AFTER INSERT ON posts_post BEGIN "
+    "INSERT INTO posts_post_fts(rowid, text) VALUES (new.id, new.text); END",
+    "CREATE TRIGGER IF NOT EXISTS posts_post_fts_delete "
+    "AFTER DELETE ON posts_post BEGIN "
+    "DELETE FROM posts_post_fts WHERE rowid = old.id; END",
+    "CREATE TRIGGER IF NOT EXISTS posts_post_fts_update "
+    "AFTER UPDATE OF text ON posts_post BEGIN "
+    "UPDATE posts_post_fts SET text = new.text WHERE rowid = old.id; END",
+    "INSERT INTO posts_post_fts(rowid, text) SELECT id, text FROM posts_post",
+)
+
+DROP_SQL = (
+    'DROP TRIGGER IF EXISTS posts_post_fts_insert',
+    'DROP TRIGGER IF EXISTS posts_post_fts_delete',
+    'DROP TRIGGER IF EXISTS posts_post_fts_update',
+    'DROP TABLE IF EXISTS posts_post_fts',
+)
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for sql in CREATE_SQL:
+            schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for sql in DROP_SQL:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0007_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:32
+
+import core.storage
+from django.db import migrations, models
+
+
+def count_references(apps, schema_editor):
+    # Уже загруженные файлы остаются на прежних местах, но тоже
+    # учитываются, чтобы удаляться вместе с последней записью.
+    Post = apps.get_model('posts', 'Post')
+    StoredFile = apps.get_model('core', 'StoredFile')
+    StoredFile.objects.bulk_create(
+        StoredFile(name=row['image'], references=row['count'])
+        for row in Post.objects.exclude(image='').order_by().values(
+            'image'
+        ).annotate(count=models.Count('pk'))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('posts', '0008_post_search'),
+    ]
+
+    operations = [
+        # Схема таблицы не меняется, а AlterField в SQLite пересоздал бы
+        # posts_post целиком вместе с триггерами поискового индекса.
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.AlterField(
+                model_name='post',
+                name='image',
+                field=models.ImageField(blank=True, storage=core.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Картинка'),
+            ),
+        ]),
+        migrations.RunPython(count_references, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:34
+
+import core.storage
+from django.db import migrations, models
+
+# SQLite добавляет столбцы, пересоздавая таблицу, а вместе со старой
+# таблицей удаляются и триггеры поискового индекса из 0008.
+TRIGGERS_SQL = (
+    "CREATE TRIGGER IF NOT EXISTS posts_post_fts_insert "
+    "AFTER INSERT ON posts_post BEGIN "
+    "INSERT INTO posts_post_fts(rowid, text) VALUES (new.id, new.text); END",
+    "CREATE TRIGGER IF NOT EXISTS posts_post_fts_delete "
+    "AFTER DELETE ON posts_post BEGIN "
+    "DELETE FROM posts_post_fts WHERE rowid = old.id; END",
+    "CREATE TRIGGER IF NOT EXISTS posts_post_fts_update "
+    "AFTER UPDATE OF text ON posts_post BEGIN "
+    "UPDATE posts_post_fts SET text = new.text WHERE rowid = old.id; END",
+)
+
+
+def restore_search_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for sql in TRIGGERS_SQL:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_stored_files'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_color',
+            field=models.CharField(blank=True, editable=False, max_length=7, verbose_name='Основной цвет картинки'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_height',
+            field=models.PositiveIntegerField(editable=False, null=True, verbose_name='Высота картинки'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_size',
+            field=models.PositiveIntegerField(editable=False, null=True, verbose_name='Размер файла картинки'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_width',
+            field=models.PositiveIntegerField(editable=False, null=True, verbose_name='Ширина картинки'),
+        ),
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.AlterField(
+                model_name='post',
+                name='image',
+                field=models.ImageField(blank=True, height_field='image_height', storage=core.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Картинка', width_field='image_width'),
+            ),
+        ]),
+        migrations.RunPython(
+            restore_search_triggers, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 2.2.16 on 2026-10-18 21:40
+
+import core.storage
+from PIL import Image
+from django.db import migrations, models
+from django.db.models import Q
+
+
+def describe(image):
+    # Копия thumbnails.describe() на момент миграции.
+    image.open()
+    try:
+        with Image.open(image) as picture:
+            width, height = picture.size
+            picture.draft('RGB', (64, 64))
+            picture = picture.convert('RGB')
+            picture.thumbnail((64, 64))
+            color = picture.resize((1, 1), Image.BOX).getpixel((0, 0))
+    finally:
+        image.seek(0)
+    return {
+        'image_width': width,
+        'image_height': height,
+        'image_color': '#%02x%02x%02x' % color,
+        'image_size': image.size,
+    }
+
+
+def describe_images(apps, schema_editor):
+    # Как management-команда describe_images: экземпляры Post не
+    # создаются, а записи с отсутствующим или битым файлом пропускаются.
+    Post = apps.get_model('posts', 'Post')
+    field = Post._meta.get_field('image')
+    posts = Post.objects.exclude(image='').filter(
+        Q(image_width__isnull=True) | Q(image_color='')
+        | Q(image_size__isnull=True)
+    ).order_by('pk').values_list('pk', 'image')
+    for pk, name in posts.iterator():
+        image = field.attr_class(None, field, name)
+        try:
+            fields = describe(image)
+        except (OSError, SyntaxError):
+            continue
+        finally:
+            image.close()
+        Post.objects.filter(pk=pk).update(**fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_image_metadata'),
+    ]
+
+    operations = [
+        # width_field/height_field в базе не видны; без
+        # SeparateDatabaseAndState SQLite пересоздал бы таблицу и удалил
+        # триггеры поискового индекса.
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.AlterField(
+                model_name='post',
+                name='image',
+                field=models.ImageField(blank=True, storage=core.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Картинка'),
+            ),
+        ]),
+        migrations.RunPython(describe_images, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 2.2.16 on 2026-10-18 21:55
+
+from django.conf import settings
+from django.db import migrations
+
+
+def backfill_timelines(apps, schema_editor):
+    # Ленты подписок, появившихся до 0005: то же, что timeline.backfill()
+    # для каждой подписки, но по одному проходу на автора.
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    PulledAuthor = apps.get_model('posts', 'PulledAuthor')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    limit = settings.TIMELINE_FANOUT_LIMIT
+    pulled = set(PulledAuthor.objects.values_list('author_id', flat=True))
+    authors = Follow.objects.order_by('author_id').values_list(
+        'author_id', flat=True
+    ).distinct()
+    for author_id in authors.iterator():
+        if author_id in pulled:
+            continue
+        followers = list(
+            Follow.objects.filter(author_id=author_id)
+            .values_list('user_id', flat=True)[:limit + 1]
+        )
+        if len(followers) > limit:
+            PulledAuthor.objects.get_or_create(author_id=author_id)
+            continue
+        posts = list(
+            Post.objects.filter(author_id=author_id)
+            .order_by('-pub_date', '-id')
+            .values_list('pk', 'pub_date')[:settings.TIMELINE_BACKFILL_LIMIT]
+        )
+        TimelineEntry.objects.bulk_create(
+            (
+                TimelineEntry(
+                    user_id=user_id, post_id=post_id,
+                    author_id=author_id, pub_date=pub_date,
+                )
+                for user_id in followers
+                for post_id, pub_date in posts
+            ),
+            batch_size=1000, ignore_conflicts=True
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_describe_images'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_timelines, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,9 @@
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
 
+from core.storage import ContentAddressedStorage
+
 
 User = get_user_model()
 
@@ -11,6 +13,11 @@ class Group(models.Model):
     slug = models.SlugField(unique=True)
     description = models.TextField(verbose_name='Название',
                                    help_text='Описание группы')
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество записей'
+    )
 
     def __str__(self):
         return self.title
@@ -42,16 +49,66 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True
     )
+    # Заполняются при загрузке (signals.describe_image), чтобы страницам
+    # не приходилось открывать файл изображения. width_field и
+    # height_field не используются: с ними ImageField открывает файл
+    # при создании каждого экземпляра записи без размеров.
+    image_width = models.PositiveIntegerField(
+        null=True,
+        editable=False,
+        verbose_name='Ширина картинки'
+    )
+    image_height = models.PositiveIntegerField(
+        null=True,
+        editable=False,
+        verbose_name='Высота картинки'
+    )
+    image_color = models.CharField(
+        max_length=7,
+        blank=True,
+        editable=False,
+        verbose_name='Основной цвет картинки'
+    )
+    image_size = models.PositiveIntegerField(
+        null=True,
+        editable=False,
+        verbose_name='Размер файла картинки'
+    )
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество комментариев'
+    )
 
     def __str__(self):
         return self.text[:settings.LETTERS_LIMIT]
 
+    def save(self, *args, **kwargs):
+        # Счётчики обновляются в обработчиках сигналов в той же транзакции.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Запись'
         verbose_name_plural = 'Посты'
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='post_date_idx'
+            ),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='post_author_date_idx'
+            ),
+            models.Index(
+                fields=('group', '-pub_date', '-id'),
+                name='post_group_date_idx'
+            ),
+        )
 
 
 class Comment(models.Model):
@@ -79,6 +136,18 @@ class Comment(models.Model):
         auto_now_add=True,
     )
 
+    class Meta:
+        indexes = (
+            models.Index(
+                fields=('post', 'created', 'id'),
+                name='comment_post_created_idx'
+            ),
+        )
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -93,3 +162,81 @@ class Follow(models.Model):
         related_name='following',
         verbose_name='Подписаться'
     )
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'author'),
+                name='unique_follow'
+            ),
+        )
+
+
+class UserStats(models.Model):
+    """Денормализованные счётчики пользователя."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь'
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество записей'
+    )
+
+
+class TimelineEntry(models.Model):
+    """Запись материализованной ленты подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Подписчик'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Запись'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        ordering = ('-pub_date', '-id')
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'post'),
+                name='unique_timeline_entry'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-id'),
+                name='timeline_user_date_idx'
+            ),
+            models.Index(
+                fields=('user', 'author'),
+                name='timeline_user_author_idx'
+            ),
+        )
+
+
+class PulledAuthor(models.Model):
+    """Автор, чьи записи не раскладываются по лентам подписчиков,
+    а подмешиваются в ленту при чтении.
+    """
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='+',
+        verbose_name='Автор'
+    )
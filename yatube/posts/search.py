@@ -0,0 +1,141 @@
+"""Полнотекстовый поиск по записям на SQLite FTS5.
+
+Индекс — виртуальная таблица `posts_post_fts` (rowid = id записи),
+которую синхронизируют триггеры на `posts_post`: они срабатывают
+и при save()/delete(), и при bulk_create()/update(). Массовый импорт
+снимает триггер вставки (`deferred_indexing()`) и индексирует новые
+записи пачками через `index_batch()`. Результаты
+ранжируются по BM25 и листаются по ключу (rank, id) без OFFSET.
+На других СУБД поиск откатывается к `text__icontains`.
+"""
+import contextlib
+import re
+
+from django.conf import settings
+from django.db import connection
+
+from .models import Post
+from .utils import CursorPaginator, InvalidCursor, is_cursor_value
+
+FTS_TABLE = 'posts_post_fts'
+# NUL обрывает строку запроса в SQLite, остальные управляющие символы
+# словами для токенизатора всё равно не являются.
+CONTROL_CHARACTERS = re.compile(r'[\x00-\x1f\x7f]')
+# Как в миграции 0008.
+INSERT_TRIGGER = (
+    f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert '
+    'AFTER INSERT ON posts_post BEGIN '
+    f'INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text); END'
+)
+
+
+def is_supported():
+    return connection.vendor == 'sqlite'
+
+
+def match_expression(query):
+    """Превращает пользовательский ввод в безопасный запрос FTS5:
+    каждое слово берётся в кавычки, слова объединяются через AND.
+    Управляющие символы отбрасываются; без слов выражение пустое.
+    """
+    words = CONTROL_CHARACTERS.sub(' ', query).split()
+    return ' '.join('"%s"' % word.replace('"', '""') for word in words)
+
+
+class SearchPaginator(CursorPaginator):
+    """Курсорная пагинация результатов поиска по ключу (rank, id)."""
+
+    def __init__(self, object_list, per_page, query):
+        super().__init__(object_list, per_page, keys=('search_rank', 'id'))
+        self.match = match_expression(query)
+
+    def decode_cursor(self, cursor):
+        rank, post_id = self.load_cursor(cursor)
+        try:
+            values = [float(rank), int(post_id)]
+        except (TypeError, ValueError):
+            raise InvalidCursor(cursor)
+        if not all(is_cursor_value(value) for value in values):
+            raise InvalidCursor(cursor)
+        return values
+
+    def fetch(self, values, backwards):
+        sql = (
+            f'SELECT rowid, rank FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s'
+        )
+        params = [self.match]
+        if values is not None:
+            op = '<' if backwards else '>'
+            sql += f' AND (rank {op} %s OR (rank = %s AND rowid {op} %s))'
+            params += [values[0], values[0], values[1]]
+        direction = 'DESC' if backwards else 'ASC'
+        sql += f' ORDER BY rank {direction}, rowid {direction} LIMIT %s'
+        params.append(self.per_page + 1)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            ranks = cursor.fetchall()
+        posts = self.object_list.in_bulk([post_id for post_id, _ in ranks])
+        items = []
+        for post_id, rank in ranks:
+            post = posts.get(post_id)
+            if post is not None:
+                post.search_rank = rank
+                items.append(post)
+        return items
+
+
+def search_posts(query, after=None, before=None):
+    """Возвращает страницу записей, найденных по запросу."""
+    posts = Post.objects.select_related('author', 'group')
+    if not is_supported():
+        paginator = CursorPaginator(
+            posts.filter(text__icontains=query), settings.POSTS_LIMIT
+        )
+    elif match_expression(query):
+        paginator = SearchPaginator(posts, settings.POSTS_LIMIT, query)
+    else:
+        paginator = CursorPaginator(posts.none(), settings.POSTS_LIMIT)
+    return paginator.get_cursor_page(after, before)
+
+
+def index_batch(first_id, last_id):
+    """Переиндексирует записи с id в диапазоне [first_id, last_id]."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid BETWEEN %s AND %s',
+            [first_id, last_id]
+        )
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE}(rowid, text) '
+            'SELECT id, text FROM posts_post WHERE id BETWEEN %s AND %s',
+            [first_id, last_id]
+        )
+
+
+@contextlib.contextmanager
+def deferred_indexing():
+    """Снимает триггер, индексирующий каждую новую запись, на время
+    массовой вставки. Записи, вставленные за это время, нужно затем
+    проиндексировать через index_batch() от last_indexed_id() + 1:
+    триггер снят, поэтому индекс за ними не продвигается."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP TRIGGER IF EXISTS {FTS_TABLE}_insert')
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute(INSERT_TRIGGER)
+
+
+def last_indexed_id():
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT coalesce(max(rowid), 0) FROM {FTS_TABLE}')
+        return cursor.fetchone()[0]
+
+
+def optimize():
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')"
+        )
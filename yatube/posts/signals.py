@@ -0,0 +1,221 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core import jobs, storage
+from . import (counters, feed_cache, follow_graph, sitemaps, thumbnails,
+               timeline)
+from .models import Comment, Follow, Group, Post, User
+
+
+@receiver(pre_save, sender=Post)
+def remember_old_values(sender, instance, raw=False, **kwargs):
+    instance._old_group_id = instance._old_image = None
+    if not instance._state.adding and not raw:
+        instance._old_group_id, instance._old_image = Post.objects.filter(
+            pk=instance.pk
+        ).values_list('group_id', 'image').first() or (None, None)
+
+
+@receiver(pre_save, sender=Post)
+def describe_image(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if not instance.image:
+        instance.image_width = instance.image_height = None
+        instance.image_color, instance.image_size = '', None
+    elif not instance.image._committed:
+        for field, value in thumbnails.describe(instance.image).items():
+            setattr(instance, field, value)
+
+
+@receiver(post_save, sender=Post)
+def count_post(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.post_created(instance)
+    else:
+        counters.post_moved(instance._old_group_id, instance.group_id)
+
+
+@receiver(post_delete, sender=Post)
+def uncount_post(sender, instance, **kwargs):
+    counters.post_deleted(instance)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.comment_added(instance, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, **kwargs):
+    counters.comment_added(instance, -1)
+
+
+@receiver(post_save, sender=Post)
+def invalidate_post_fragments(sender, instance, raw=False, **kwargs):
+    if not raw:
+        feed_cache.bump_on_commit(*feed_cache.post_scopes(
+            instance, getattr(instance, '_old_group_id', None)
+        ))
+
+
+@receiver(post_delete, sender=Post)
+def invalidate_deleted_post_fragments(sender, instance, **kwargs):
+    feed_cache.bump_on_commit(*feed_cache.post_scopes(instance))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_fragments(sender, instance, raw=False, **kwargs):
+    if not raw and instance.post_id is not None:
+        feed_cache.bump_on_commit(f'post:{instance.post_id}')
+
+
+def displayed_fields_changed(instance, fields, update_fields):
+    """Изменились ли поля, которые выводятся на страницах с записями."""
+    if instance._state.adding:
+        return False
+    if update_fields is not None and not set(fields) & set(update_fields):
+        return False
+    old = type(instance).objects.filter(pk=instance.pk).values_list(
+        *fields
+    ).first()
+    return old != tuple(getattr(instance, field) for field in fields)
+
+
+@receiver(pre_save, sender=User)
+def remember_user_name_change(sender, instance, raw=False,
+                              update_fields=None, **kwargs):
+    instance._name_changed = not raw and displayed_fields_changed(
+        instance, ('username', 'first_name', 'last_name'), update_fields
+    )
+    # Имя пользователя входит в адрес профиля в карте сайта.
+    instance._username_changed = (
+        instance._name_changed
+        and displayed_fields_changed(instance, ('username',), update_fields)
+    )
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_fragments(sender, instance, **kwargs):
+    if getattr(instance, '_name_changed', False):
+        feed_cache.bump_on_commit(*feed_cache.user_scopes(instance.pk))
+
+
+@receiver(pre_save, sender=Group)
+def remember_group_change(sender, instance, raw=False, update_fields=None,
+                          **kwargs):
+    instance._shown_changed = not raw and displayed_fields_changed(
+        instance, ('title', 'slug', 'description'), update_fields
+    )
+
+
+@receiver(post_save, sender=Group)
+def invalidate_group_fragments(sender, instance, **kwargs):
+    if getattr(instance, '_shown_changed', False):
+        feed_cache.bump_on_commit(*feed_cache.group_scopes(instance.pk))
+
+
+def invalidate_sitemaps(post, *extra_group_ids):
+    # Значения берутся сейчас: после удаления у записи уже нет pk.
+    ids = (post.pk, post.author_id, post.group_id, *extra_group_ids)
+    transaction.on_commit(lambda: sitemaps.post_changed(*ids))
+
+
+@receiver(post_save, sender=Post)
+def invalidate_post_sitemaps(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_sitemaps(
+            instance, getattr(instance, '_old_group_id', None)
+        )
+
+
+@receiver(post_delete, sender=Post)
+def invalidate_deleted_post_sitemaps(sender, instance, **kwargs):
+    invalidate_sitemaps(instance)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_sitemaps(sender, instance, raw=False, **kwargs):
+    if not raw:
+        group_id = instance.pk
+        transaction.on_commit(lambda: sitemaps.invalidate('groups', group_id))
+
+
+@receiver(post_save, sender=User)
+def invalidate_profile_sitemaps(sender, instance, **kwargs):
+    if getattr(instance, '_username_changed', False):
+        user_id = instance.pk
+        transaction.on_commit(
+            lambda: sitemaps.invalidate('profiles', user_id)
+        )
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        jobs.enqueue(
+            timeline.fan_out_post, instance.pk, key=f'fan-out:{instance.pk}'
+        )
+
+
+@receiver(post_save, sender=Post)
+def queue_thumbnails(sender, instance, raw=False, **kwargs):
+    old_image = getattr(instance, '_old_image', None)
+    if not raw and instance.image and instance.image.name != old_image:
+        thumbnails.queue(instance)
+
+
+def release_image(post, name):
+    if storage.release(name, post.image.storage):
+        transaction.on_commit(lambda: thumbnails.forget(name))
+
+
+@receiver(post_save, sender=Post)
+def count_image_references(sender, instance, raw=False, **kwargs):
+    old_image = getattr(instance, '_old_image', None) or ''
+    if raw or instance.image.name == old_image:
+        return
+    storage.acquire(instance.image.name)
+    release_image(instance, old_image)
+
+
+@receiver(post_delete, sender=Post)
+def release_deleted_image(sender, instance, **kwargs):
+    release_image(instance, instance.image.name)
+
+
+@receiver(post_save, sender=Follow)
+def follow_graph_add(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        follow_graph.follow_changed(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_graph_remove(sender, instance, **kwargs):
+    follow_graph.follow_changed(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follower_pages(sender, instance, raw=False, **kwargs):
+    if not raw:
+        feed_cache.bump_on_commit(
+            f'follows:{instance.user_id}', f'author:{instance.author_id}'
+        )
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    timeline.prune(instance.user_id, instance.author_id)
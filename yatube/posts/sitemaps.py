@@ -0,0 +1,203 @@
+"""Карта сайта, разбитая на шарды по диапазонам id.
+
+Каждый раздел (записи, профили авторов, группы) делится на шарды
+по SITEMAP_SHARD_SIZE id: шард записей N содержит записи с id
+от N * SITEMAP_SHARD_SIZE + 1, шард профилей — авторов с такими id.
+Шард хранится на диске сжатым (`posts-3.xml.gz`) и пересоздаётся
+при первом запросе после того, как запись из его диапазона
+добавили, изменили или удалили. Остальные шарды не трогаются.
+
+Ссылки в карте абсолютные, поэтому файлы лежат в отдельном каталоге
+для каждого адреса сайта.
+"""
+import datetime
+import glob
+import gzip
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.db.models import Max
+from django.urls import reverse
+
+from . import feed_cache
+from .models import Post
+
+SECTIONS = {
+    # Раздел: поле Post, по которому делятся шарды.
+    'posts': 'id',
+    'profiles': 'author_id',
+    'groups': 'group_id',
+}
+VERSION_SCOPE = 'sitemap:{}:{}'
+
+URLSET_START = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+)
+URLSET_END = '</urlset>\n'
+
+
+def w3c_date(value):
+    if not isinstance(value, datetime.datetime):
+        value = datetime.datetime.fromtimestamp(value, datetime.timezone.utc)
+    return value.isoformat(timespec='seconds')
+
+
+def shard_of(pk):
+    return (pk - 1) // settings.SITEMAP_SHARD_SIZE
+
+
+def shard_range(number):
+    first = number * settings.SITEMAP_SHARD_SIZE + 1
+    return first, first + settings.SITEMAP_SHARD_SIZE - 1
+
+
+def shard_count(section):
+    last = Post.objects.aggregate(last=Max(SECTIONS[section]))['last']
+    return 0 if last is None else shard_of(last) + 1
+
+
+def _posts(first, last):
+    rows = Post.objects.filter(pk__range=(first, last)).order_by(
+        'pk'
+    ).values_list('pk', 'pub_date')
+    for pk, pub_date in rows.iterator():
+        yield reverse('posts:post_detail', args=[pk]), pub_date
+
+
+def _grouped(field, name_field, url_name, first, last):
+    """Страницы авторов или групп с датой их последней записи."""
+    # У внешних ключей нет lookup range.
+    rows = Post.objects.filter(
+        **{f'{field}__gte': first, f'{field}__lte': last}
+    ).order_by(field).values(field, name_field).annotate(
+        last=Max('pub_date')
+    )
+    for row in rows.iterator():
+        yield reverse(url_name, args=[row[name_field]]), row['last']
+
+
+def _profiles(first, last):
+    return _grouped(
+        'author_id', 'author__username', 'posts:profile', first, last
+    )
+
+
+def _groups(first, last):
+    return _grouped(
+        'group_id', 'group__slug', 'posts:group_posts', first, last
+    )
+
+
+PAGES = {'posts': _posts, 'profiles': _profiles, 'groups': _groups}
+
+
+def site_directory(base_url):
+    name = hashlib.md5(base_url.encode()).hexdigest()[:12]
+    return os.path.join(settings.SITEMAP_ROOT, name)
+
+
+def shard_path(base_url, section, number):
+    return os.path.join(
+        site_directory(base_url), f'{section}-{number}.xml.gz'
+    )
+
+
+def _write(path, base_url, section, number):
+    with gzip.open(path, 'wt', encoding='utf-8') as sitemap:
+        sitemap.write(URLSET_START)
+        for location, lastmod in PAGES[section](*shard_range(number)):
+            sitemap.write(
+                f'<url><loc>{escape(base_url + location)}</loc>'
+                f'<lastmod>{w3c_date(lastmod)}</lastmod></url>\n'
+            )
+        sitemap.write(URLSET_END)
+
+
+def open_shard(base_url, section, number):
+    """Шард (файл) и время его изменения; шард создаётся, если его
+    ещё нет или он устарел."""
+    path = shard_path(base_url, section, number)
+    try:
+        shard = open(path, 'rb')
+    except FileNotFoundError:
+        pass
+    else:
+        return shard, os.fstat(shard.fileno()).st_mtime
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    scope = VERSION_SCOPE.format(section, number)
+    version = feed_cache.get_version(scope)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    os.close(fd)
+    try:
+        _write(temp_path, base_url, section, number)
+        with open(temp_path, 'rb') as built:
+            shard = io.BytesIO(built.read())
+        modified = os.path.getmtime(temp_path)
+        # Если шард изменился, пока строился, этот ответ отдаётся,
+        # но на диске не остаётся.
+        if feed_cache.get_version(scope) == version:
+            os.replace(temp_path, path)
+        return shard, modified
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def index(base_url):
+    """XML индекса карты: все шарды всех разделов."""
+    lines = [
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<sitemapindex '
+        'xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    ]
+    for section in SECTIONS:
+        for number in range(shard_count(section)):
+            location = base_url + reverse(
+                'posts:sitemap_shard', args=[section, number]
+            )
+            lines.append(f'<sitemap><loc>{escape(location)}</loc>')
+            try:
+                modified = os.path.getmtime(
+                    shard_path(base_url, section, number)
+                )
+            except FileNotFoundError:
+                pass
+            else:
+                lines.append(f'<lastmod>{w3c_date(modified)}</lastmod>')
+            lines.append('</sitemap>\n')
+    lines.append('</sitemapindex>\n')
+    return ''.join(lines)
+
+
+def invalidate(section, pk):
+    """Удаляет шард с объектом `pk` во всех каталогах сайта."""
+    if pk is None:
+        return
+    number = shard_of(pk)
+    feed_cache.bump(VERSION_SCOPE.format(section, number))
+    pattern = os.path.join(
+        settings.SITEMAP_ROOT, '*', f'{section}-{number}.xml.gz'
+    )
+    for path in glob.glob(pattern):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def post_changed(post_id, author_id, *group_ids):
+    invalidate('posts', post_id)
+    invalidate('profiles', author_id)
+    for group_id in set(group_ids):
+        invalidate('groups', group_id)
+
+
+def clear():
+    """Удаляет все шарды (например, после массового импорта)."""
+    shutil.rmtree(settings.SITEMAP_ROOT, ignore_errors=True)
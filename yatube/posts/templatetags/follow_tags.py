@@ -0,0 +1,11 @@
+from django import template
+
+from posts import follow_graph
+
+register = template.Library()
+
+
+@register.filter
+def is_following(user, author):
+    """{% if user|is_following:author %} без запроса к базе."""
+    return follow_graph.is_following(user, author)
@@ -0,0 +1,28 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_picture(image, geometry):
+    """Готовые миниатюры изображения; отсутствующие ставятся в очередь.
+
+    {% post_picture post.image "960x339" as picture %}
+    """
+    picture = thumbnails.picture(image, geometry)
+    if picture.src is None and image:
+        thumbnails.queue(image.instance)
+    return picture
+
+
+@register.simple_tag
+def prefetch_pictures(posts, geometry):
+    """Находит миниатюры всех записей страницы одним обращением
+    к хранилищу ключей; ставится перед циклом по записям.
+
+    {% prefetch_pictures page_obj "960x339" %}
+    """
+    thumbnails.prefetch_pictures(posts, geometry)
+    return ''
@@ -0,0 +1,93 @@
+import csv
+import json
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db.models.signals import post_init
+from django.test import TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Group, Post
+
+User = get_user_model()
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        cls.author = User.objects.create_user(username='author')
+        cls.other = User.objects.create_user(username='other')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.post = Post.objects.create(
+            text='В группе, с "кавычками"', author=cls.author, group=cls.group
+        )
+        Post.objects.create(text='Чужая запись', author=cls.other)
+        Comment.objects.create(post=cls.post, author=cls.other, text='Ответ')
+
+    def download(self, **params):
+        response = self.client.get(reverse('posts:post_export'), params)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_export_is_for_staff_only(self):
+        """Выгрузка доступна только персоналу"""
+        response = self.client.get(reverse('posts:post_export'))
+        self.assertEqual(response.status_code, 302)
+        self.client.force_login(self.author)
+        response = self.client.get(reverse('posts:post_export'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_csv_export_with_filters(self):
+        """CSV содержит заголовок и только отфильтрованные записи"""
+        self.client.force_login(self.staff)
+        rows = list(csv.DictReader(StringIO(self.download(group='group'))))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['text'], self.post.text)
+        self.assertEqual(rows[0]['author'], 'author')
+        self.assertTrue(
+            rows[0]['pub_date'].startswith(f'{self.post.pub_date:%Y-%m-%d}')
+        )
+        rows = list(csv.reader(StringIO(self.download(author='nobody'))))
+        self.assertEqual(rows, [list(rows[0])])
+
+    def test_jsonl_export_of_comments(self):
+        """Комментарии выгружаются в JSONL без создания объектов"""
+        self.client.force_login(self.staff)
+        created = []
+
+        def count(sender, **kwargs):
+            created.append(sender)
+
+        post_init.connect(count, sender=Comment)
+        try:
+            lines = self.download(kind='comments', format='jsonl')
+        finally:
+            post_init.disconnect(count, sender=Comment)
+        self.assertEqual(created, [])
+        rows = [json.loads(line) for line in lines.splitlines()]
+        self.assertEqual(rows[0]['post'], self.post.pk)
+        self.assertEqual(rows[0]['author'], 'other')
+
+    def test_bad_filters(self):
+        """Неверные параметры дают 400"""
+        self.client.force_login(self.staff)
+        response = self.client.get(
+            reverse('posts:post_export'),
+            {'since': '2020-02-01', 'until': '2020-01-01'},
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_command_uses_same_format(self):
+        """Команда выгружает то же, что и представление"""
+        self.client.force_login(self.staff)
+        out = StringIO()
+        call_command(
+            'export_posts', '--since', '2000-01-01', '--chunk-size', '1',
+            stdout=out
+        )
+        self.assertEqual(out.getvalue(), self.download(since='2000-01-01'))
+        self.assertEqual(len(out.getvalue().splitlines()), 3)
@@ -0,0 +1,91 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.testing import capture_on_commit_callbacks
+from posts.models import Group, Post
+
+User = get_user_model()
+
+
+@override_settings(FEED_ITEMS=2)
+class FeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание группы'
+        )
+        for number in range(3):
+            Post.objects.create(
+                text=f'Запись номер {number}', author=cls.author,
+                group=cls.group
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_feeds_render(self):
+        """Ленты сайта, группы и автора отдаются в RSS и Atom"""
+        feeds = (
+            (reverse('posts:index_rss'), 'application/rss+xml'),
+            (reverse('posts:index_atom'), 'application/atom+xml'),
+            (reverse('posts:group_rss', args=['group']),
+             'application/rss+xml'),
+            (reverse('posts:group_atom', args=['group']),
+             'application/atom+xml'),
+            (reverse('posts:profile_rss', args=['author']),
+             'application/rss+xml'),
+            (reverse('posts:profile_atom', args=['author']),
+             'application/atom+xml'),
+        )
+        for url, content_type in feeds:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertTrue(response['Content-Type'].startswith(
+                    content_type
+                ))
+                self.assertTrue(response['ETag'].startswith('"'))
+                # Не больше FEED_ITEMS записей, самые новые.
+                self.assertContains(response, 'Запись номер 2')
+                self.assertContains(response, 'Запись номер 1')
+                self.assertNotContains(response, 'Запись номер 0')
+
+    def test_unknown_scope(self):
+        """Лента несуществующей группы или автора — 404"""
+        for url in (
+            reverse('posts:group_rss', args=['missing']),
+            reverse('posts:profile_atom', args=['missing']),
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_not_modified_and_invalidation(self):
+        """Неизменная лента отвечает 304 без выборки записей и
+        обновляется после новой записи"""
+        url = reverse('posts:group_rss', args=['group'])
+        etag = self.client.get(url)['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(any(
+            'posts_post' in query['sql'] for query in queries.captured_queries
+        ))
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertFalse(any(
+            'posts_post' in query['sql'] for query in queries.captured_queries
+        ))
+
+        with capture_on_commit_callbacks(execute=True):
+            Post.objects.create(
+                text='Свежая запись', author=self.author, group=self.group
+            )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertContains(response, 'Свежая запись')
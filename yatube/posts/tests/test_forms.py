@@ -1,3 +1,4 @@
+import hashlib
 import tempfile
 import shutil
 
@@ -55,6 +56,7 @@ class PostFormTest(TestCase):
             content=small_gif,
             content_type='image/gif'
         )
+        digest = hashlib.sha256(small_gif).hexdigest()
         form_data = {
             'text': 'Новый пост',
             'group': self.group.id,
@@ -73,7 +75,7 @@ class PostFormTest(TestCase):
             group__slug=self.group.slug,
             text=form_data.get('text'),
             author=self.user,
-            image='posts/small.gif'
+            image=f'posts/{digest[:2]}/{digest[2:4]}/{digest}.gif'
         ).exists())
 
     def test_edit_post_form(self):
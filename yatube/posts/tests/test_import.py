@@ -0,0 +1,222 @@
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from posts import feed_cache, search
+from posts.management.commands.import_posts import Command
+from posts.models import Follow, Group, Post, TimelineEntry
+
+User = get_user_model()
+
+TEMP_SITEMAP_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(SITEMAP_ROOT=TEMP_SITEMAP_ROOT)
+class ImportPostsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Архив', slug='archive', description='Старые записи'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_SITEMAP_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as data:
+            data.write(content)
+        return path
+
+    def insert_trigger_exists(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' "
+                "AND name = %s", [f'{search.FTS_TABLE}_insert']
+            )
+            return cursor.fetchone()[0] == 1
+
+    def jsonl(self, records):
+        return self.write(
+            'posts.jsonl',
+            ''.join(json.dumps(record) + '\n' for record in records)
+        )
+
+    def test_import_keeps_dates_and_rebuilds_derived_data(self):
+        """Импорт сохраняет даты и пересобирает счётчики, индекс и ленты"""
+        version = feed_cache.get_version('index')
+        path = self.jsonl([
+            {'text': 'Первая архивная', 'author': 'author',
+             'group': 'archive', 'pub_date': '2015-03-01T10:00:00+00:00'},
+            {'text': 'Вторая архивная', 'author': 'author',
+             'pub_date': '2016-03-01T10:00:00+00:00'},
+            {'text': 'Без группы', 'author': 'newcomer'},
+        ])
+        call_command(
+            'import_posts', path, '--batch-size', '2', '--create-authors',
+            stdout=StringIO()
+        )
+        self.assertEqual(Post.objects.count(), 3)
+        self.assertEqual(
+            Post.objects.get(text='Первая архивная').pub_date,
+            datetime(2015, 3, 1, 10, tzinfo=timezone.utc),
+        )
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+        self.assertEqual(self.author.stats.posts_count, 2)
+        self.assertTrue(User.objects.filter(username='newcomer').exists())
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 2
+        )
+        if search.is_supported():
+            page = search.search_posts('архивная')
+            self.assertEqual(len(page.object_list), 2)
+        self.assertNotEqual(feed_cache.get_version('index'), version)
+
+    def test_import_resumes_after_failure(self):
+        """Прерванный импорт продолжается без повторов"""
+        path = self.jsonl([
+            {'text': 'Раз', 'author': 'author'},
+            {'text': 'Два', 'author': 'author'},
+            {'text': 'Три', 'author': 'author', 'group': 'missing'},
+            {'text': 'Четыре', 'author': 'author'},
+        ])
+        with self.assertRaises(CommandError):
+            call_command(
+                'import_posts', path, '--batch-size', '2', stdout=StringIO()
+            )
+        self.assertEqual(Post.objects.count(), 2)
+        Group.objects.create(title='Нашлась', slug='missing')
+        call_command(
+            'import_posts', path, '--batch-size', '2', stdout=StringIO()
+        )
+        self.assertEqual(
+            sorted(Post.objects.values_list('text', flat=True)),
+            sorted(['Раз', 'Два', 'Три', 'Четыре']),
+        )
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 4
+        )
+        if search.is_supported():
+            self.assertTrue(self.insert_trigger_exists())
+            page = search.search_posts('Раз')
+            self.assertEqual(len(page.object_list), 1)
+
+    def test_lost_checkpoint_does_not_duplicate_batch(self):
+        """Пачка, сохранённая без чекпойнта, не импортируется повторно"""
+        path = self.jsonl([
+            {'text': 'Раз', 'author': 'author',
+             'pub_date': '2015-03-01T10:00:00+00:00'},
+            {'text': 'Два', 'author': 'author'},
+            {'text': 'Три', 'author': 'author'},
+        ])
+        save_checkpoint = Command.save_checkpoint
+
+        def crash_after_first_batch(command, checkpoint, done):
+            if done == 2:
+                raise KeyboardInterrupt
+            save_checkpoint(command, checkpoint, done)
+
+        with mock.patch.object(
+            Command, 'save_checkpoint', crash_after_first_batch
+        ), self.assertRaises(KeyboardInterrupt):
+            call_command(
+                'import_posts', path, '--batch-size', '2', stdout=StringIO()
+            )
+        self.assertEqual(Post.objects.count(), 2)
+        call_command(
+            'import_posts', path, '--batch-size', '2', stdout=StringIO()
+        )
+        self.assertEqual(
+            sorted(Post.objects.values_list('text', flat=True)),
+            sorted(['Раз', 'Два', 'Три']),
+        )
+        self.assertEqual(
+            User.objects.get(pk=self.author.pk).stats.posts_count, 3
+        )
+
+    def test_import_indexes_posts_after_bulk_load(self):
+        """На время импорта триггер вставки в индекс снимается,
+        а записи индексируются после загрузки"""
+        if not search.is_supported():
+            self.skipTest('Полнотекстовый индекс есть только в SQLite.')
+        path = self.jsonl([
+            {'text': f'Архивная {number}', 'author': 'author'}
+            for number in range(5)
+        ])
+        with CaptureQueriesContext(connection) as queries:
+            call_command(
+                'import_posts', path, '--batch-size', '2', stdout=StringIO()
+            )
+        self.assertTrue(any(
+            query['sql'].startswith('DROP TRIGGER')
+            for query in queries.captured_queries
+        ))
+        self.assertTrue(self.insert_trigger_exists())
+        page = search.search_posts('Архивная')
+        self.assertEqual(len(page.object_list), 5)
+
+    def test_import_csv(self):
+        """CSV читается так же, как JSONL; незнакомый автор — ошибка"""
+        path = self.write(
+            'posts.csv',
+            'text,author,group,pub_date\n'
+            'Из таблицы,author,archive,2014-01-01 12:00:00\n'
+        )
+        call_command('import_posts', path, stdout=StringIO())
+        post = Post.objects.get()
+        self.assertEqual(post.group, self.group)
+        self.assertEqual(post.pub_date.year, 2014)
+
+        path = self.write('other.csv', 'text,author\nТекст,stranger\n')
+        with self.assertRaisesMessage(CommandError, 'stranger'):
+            call_command('import_posts', path, stdout=StringIO())
+
+    def test_invalid_date_names_record(self):
+        """Несуществующая дата — ошибка с номером записи, а не трейсбек"""
+        path = self.write(
+            'posts.csv',
+            'text,author,pub_date\n'
+            'Верная,author,2020-02-28T00:00:00\n'
+            'Неверная,author,2020-02-30T00:00:00\n'
+        )
+        with self.assertRaisesMessage(CommandError, 'Запись 2'):
+            call_command('import_posts', path, stdout=StringIO())
+        self.assertFalse(Post.objects.exists())
+
+    def test_empty_author_is_not_created(self):
+        """Пустое имя автора не создаёт пользователя даже
+        с --create-authors"""
+        for author in ('', '   '):
+            with self.subTest(author=author):
+                path = self.jsonl([{'text': 'Без автора', 'author': author}])
+                with self.assertRaisesMessage(CommandError, 'Автор'):
+                    call_command(
+                        'import_posts', path, '--create-authors',
+                        stdout=StringIO()
+                    )
+                self.assertFalse(User.objects.filter(
+                    username=author
+                ).exists())
@@ -0,0 +1,169 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase, override_settings
+
+from .test_thumbnails import SMALL_GIF
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+class MigrationTestCase(TransactionTestCase):
+    """Откатывает posts к migrate_from, даёт заполнить старую схему
+    через setUpBeforeMigration и применяет migrate_to."""
+    migrate_from = None
+    migrate_to = None
+
+    def setUp(self):
+        super().setUp()
+        executor = MigrationExecutor(connection)
+        executor.migrate([('posts', self.migrate_from)])
+        old_apps = executor.loader.project_state(
+            [('posts', self.migrate_from)]
+        ).apps
+        self.setUpBeforeMigration(old_apps)
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate([('posts', self.migrate_to)])
+        self.apps = executor.loader.project_state(
+            [('posts', self.migrate_to)]
+        ).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+        super().tearDown()
+
+    def setUpBeforeMigration(self, apps):
+        pass
+
+
+class FillCountersMigrationTest(MigrationTestCase):
+    migrate_from = '0005_timeline'
+    migrate_to = '0006_counters'
+
+    def setUpBeforeMigration(self, apps):
+        User = apps.get_model('auth', 'User')
+        Group = apps.get_model('posts', 'Group')
+        Post = apps.get_model('posts', 'Post')
+        Comment = apps.get_model('posts', 'Comment')
+        self.author = User.objects.create(username='author')
+        self.group = Group.objects.create(title='Группа', slug='group')
+        self.empty = Group.objects.create(title='Пустая', slug='empty')
+        self.post = Post.objects.create(
+            author_id=self.author.pk, group_id=self.group.pk, text='Первая'
+        )
+        self.quiet = Post.objects.create(
+            author_id=self.author.pk, text='Вторая'
+        )
+        for text in ('Раз', 'Два'):
+            Comment.objects.create(
+                post_id=self.post.pk, author_id=self.author.pk, text=text
+            )
+
+    def test_counters_filled(self):
+        Group = self.apps.get_model('posts', 'Group')
+        Post = self.apps.get_model('posts', 'Post')
+        UserStats = self.apps.get_model('posts', 'UserStats')
+        self.assertEqual(
+            dict(Group.objects.values_list('pk', 'posts_count')),
+            {self.group.pk: 1, self.empty.pk: 0}
+        )
+        self.assertEqual(
+            dict(Post.objects.values_list('pk', 'comments_count')),
+            {self.post.pk: 2, self.quiet.pk: 0}
+        )
+        self.assertEqual(
+            UserStats.objects.get(user_id=self.author.pk).posts_count, 2
+        )
+
+
+class RemoveDuplicateFollowsTest(MigrationTestCase):
+    migrate_from = '0006_counters'
+    migrate_to = '0007_feed_indexes'
+
+    def setUpBeforeMigration(self, apps):
+        User = apps.get_model('auth', 'User')
+        Follow = apps.get_model('posts', 'Follow')
+        self.reader = User.objects.create(username='reader')
+        self.author = User.objects.create(username='author')
+        self.other = User.objects.create(username='other')
+        self.first = Follow.objects.create(
+            user_id=self.reader.pk, author_id=self.author.pk
+        )
+        Follow.objects.create(user_id=self.reader.pk, author_id=self.author.pk)
+        Follow.objects.create(user_id=self.reader.pk, author_id=self.other.pk)
+
+    def test_duplicates_removed_first_follow_kept(self):
+        Follow = self.apps.get_model('posts', 'Follow')
+        self.assertEqual(Follow.objects.count(), 2)
+        self.assertTrue(Follow.objects.filter(pk=self.first.pk).exists())
+        self.assertTrue(Follow.objects.filter(
+            user_id=self.reader.pk, author_id=self.other.pk
+        ).exists())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class DescribeImagesMigrationTest(MigrationTestCase):
+    migrate_from = '0010_image_metadata'
+    migrate_to = '0011_describe_images'
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUpBeforeMigration(self, apps):
+        User = apps.get_model('auth', 'User')
+        Post = apps.get_model('posts', 'Post')
+        author = User.objects.create(username='author')
+        default_storage.save('posts/small.gif', ContentFile(SMALL_GIF))
+        self.stored = Post.objects.create(author_id=author.pk, text='Есть')
+        self.missing = Post.objects.create(author_id=author.pk, text='Нет')
+        # Через update(): старое поле с width_field открыло бы файл
+        # уже при создании экземпляра.
+        Post.objects.filter(pk=self.stored.pk).update(
+            image='posts/small.gif'
+        )
+        Post.objects.filter(pk=self.missing.pk).update(
+            image='posts/missing.gif'
+        )
+
+    def test_dimensions_backfilled_missing_files_skipped(self):
+        Post = self.apps.get_model('posts', 'Post')
+        self.assertEqual(
+            Post.objects.values_list(
+                'image_width', 'image_height', 'image_size'
+            ).get(pk=self.stored.pk),
+            (2, 1, len(SMALL_GIF))
+        )
+        self.assertIsNone(Post.objects.get(pk=self.missing.pk).image_width)
+
+
+class BackfillTimelinesMigrationTest(MigrationTestCase):
+    migrate_from = '0011_describe_images'
+    migrate_to = '0012_backfill_timelines'
+
+    def setUpBeforeMigration(self, apps):
+        User = apps.get_model('auth', 'User')
+        Post = apps.get_model('posts', 'Post')
+        Follow = apps.get_model('posts', 'Follow')
+        self.reader = User.objects.create(username='reader')
+        author = User.objects.create(username='author')
+        stranger = User.objects.create(username='stranger')
+        self.post = Post.objects.create(author_id=author.pk, text='Запись')
+        Post.objects.create(author_id=stranger.pk, text='Чужая запись')
+        Follow.objects.create(user_id=self.reader.pk, author_id=author.pk)
+
+    def test_existing_follows_get_timelines(self):
+        TimelineEntry = self.apps.get_model('posts', 'TimelineEntry')
+        self.assertEqual(
+            list(TimelineEntry.objects.values_list('user_id', 'post_id')),
+            [(self.reader.pk, self.post.pk)]
+        )
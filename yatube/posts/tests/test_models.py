@@ -1,7 +1,10 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.test import TestCase
 
-from ..models import Group, Post
+from ..models import Comment, Group, Post
 
 User = get_user_model()
 
@@ -30,3 +33,62 @@ class PostModelTest(TestCase):
         for value, expected in test_str:
             with self.subTest(value=value):
                 self.assertEqual(str(value), expected)
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other-slug',
+            description='Тестовое описание',
+        )
+
+    def assertCounters(self, author_posts, group_posts, other_group_posts):
+        self.user.stats.refresh_from_db()
+        self.group.refresh_from_db()
+        self.other_group.refresh_from_db()
+        self.assertEqual(self.user.stats.posts_count, author_posts)
+        self.assertEqual(self.group.posts_count, group_posts)
+        self.assertEqual(self.other_group.posts_count, other_group_posts)
+
+    def test_post_counters_follow_writes(self):
+        """Счётчики записей автора и группы меняются при записи"""
+        post = Post.objects.create(
+            author=self.user, group=self.group, text='Тестовый пост'
+        )
+        Post.objects.create(author=self.user, text='Пост без группы')
+        self.assertCounters(2, 1, 0)
+        post.group = self.other_group
+        post.save()
+        self.assertCounters(2, 0, 1)
+        post.delete()
+        self.assertCounters(1, 0, 0)
+
+    def test_comment_counter_follows_writes(self):
+        """Счётчик комментариев поста меняется при записи"""
+        post = Post.objects.create(author=self.user, text='Тестовый пост')
+        comment = Comment.objects.create(
+            post=post, author=self.user, text='Тестовый коммент'
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+
+    def test_rebuild_counters_command(self):
+        """Команда rebuild_counters пересчитывает счётчики по данным"""
+        Post.objects.bulk_create([
+            Post(author=self.user, group=self.group, text=f'Пост {number}')
+            for number in range(3)
+        ])
+        call_command('rebuild_counters', stdout=StringIO())
+        self.assertCounters(3, 3, 0)
@@ -1,10 +1,15 @@
+import base64
+import json
 import math
 
 from django.test import Client, TestCase
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
+from posts import counters
 from posts.models import Group, Post
 
 User = get_user_model()
@@ -29,6 +34,8 @@ class PaginatorTest(TestCase):
             for number in range(cls.POSTS_NUMBER)
         ]
         Post.objects.bulk_create(pile_of_posts)
+        # bulk_create не вызывает сигналы счётчиков.
+        counters.rebuild()
 
     def setUp(self):
         self.guest_client = Client()
@@ -58,3 +65,93 @@ class PaginatorTest(TestCase):
             )
             self.assertEqual(
                 len(response.context['page_obj']), last_page_posts)
+
+    def test_numbered_pages_use_counters(self):
+        """Страницы группы и профиля берут число постов из счётчиков,
+        а не из COUNT(*)
+        """
+        pages = (
+            reverse('posts:group_posts', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user.username}),
+        )
+        for url in pages:
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.guest_client.get(url, {'page': 2})
+                self.assertEqual(
+                    response.context['page_obj'].paginator.count,
+                    self.POSTS_NUMBER
+                )
+                self.assertFalse(any(
+                    'COUNT(' in query['sql']
+                    for query in queries.captured_queries
+                ))
+
+    def test_cursor_pages_walk_through_all_posts(self):
+        """Курсорная пагинация обходит все посты без COUNT(*)
+        и умеет возвращаться назад
+        """
+        reverse_name = reverse('posts:index')
+        seen = []
+        cursor = ''
+        with CaptureQueriesContext(connection) as queries:
+            while cursor is not None:
+                response = self.guest_client.get(
+                    reverse_name, {'after': cursor}
+                )
+                page_obj = response.context['page_obj']
+                seen.extend(post.pk for post in page_obj)
+                cursor = page_obj.next_cursor
+        self.assertEqual(len(seen), self.POSTS_NUMBER)
+        self.assertEqual(len(set(seen)), self.POSTS_NUMBER)
+        self.assertFalse(
+            any('COUNT(' in query['sql'] for query in queries.captured_queries)
+        )
+        response = self.guest_client.get(
+            reverse_name, {'before': page_obj.previous_cursor}
+        )
+        self.assertEqual(
+            [post.pk for post in response.context['page_obj']],
+            seen[:settings.POSTS_LIMIT]
+        )
+
+    def test_crafted_cursors_lead_to_first_page(self):
+        """Курсор с неподходящими значениями ведёт на первую страницу,
+        а не к ошибке сервера
+        """
+        first_page = list(
+            Post.objects.order_by('-pub_date', '-id')
+            .values_list('pk', flat=True)[:settings.POSTS_LIMIT]
+        )
+        cursors = {
+            'число вместо даты': [5, 1],
+            'null': [None, 1],
+            'список': [[], 1],
+            'объект': ['2020-01-01T00:00:00+00:00', {}],
+            'логическое значение': ['2020-01-01T00:00:00+00:00', True],
+            'слишком большое id': ['2020-01-01T00:00:00+00:00', 10 ** 30],
+            'бесконечность': ['2020-01-01T00:00:00+00:00', float('inf')],
+        }
+        for name, values in cursors.items():
+            cursor = base64.urlsafe_b64encode(
+                json.dumps(values).encode()
+            ).decode()
+            with self.subTest(name):
+                response = self.guest_client.get(
+                    reverse('posts:index'), {'after': cursor}
+                )
+                self.assertEqual(
+                    [post.pk for post in response.context['page_obj']],
+                    first_page
+                )
+                response = self.guest_client.get(
+                    reverse('api:posts'), {'after': cursor}
+                )
+                self.assertEqual(response.status_code, 200)
+                data = json.loads(b''.join(response.streaming_content))
+                self.assertEqual(data['results'][0]['id'], first_page[0])
+                response = self.guest_client.get(
+                    reverse('posts:post_search'),
+                    {'q': 'Тестовый', 'after': cursor}
+                )
+                self.assertEqual(response.status_code, 200)
@@ -0,0 +1,203 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core.querybudget import QueryBudgetMixin
+from posts import urls
+from posts.models import Comment, Follow, Group, Post
+from .test_thumbnails import SMALL_GIF
+
+TEMP_SITEMAP_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+POSTS = 12
+
+User = get_user_model()
+
+
+def image():
+    return SimpleUploadedFile('small.gif', SMALL_GIF, content_type='image/gif')
+
+
+@override_settings(SITEMAP_ROOT=TEMP_SITEMAP_ROOT,
+                   MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class PostsQueryBudgetTest(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        groups = [
+            Group.objects.create(
+                title=f'Группа {number}', slug=f'group-{number}',
+                description='Описание'
+            )
+            for number in range(3)
+        ]
+        cls.group = groups[0]
+        # Разные группы и авторы комментариев: ленивая загрузка любого
+        # из них в цикле даст повторяющиеся запросы. С картинками: страницы
+        # ищут их миниатюры и ставят нарезку в очередь.
+        cls.posts = [
+            Post.objects.create(
+                text=f'Запись {number}', author=cls.author,
+                group=groups[number % len(groups)], image=image()
+            )
+            for number in range(POSTS)
+        ]
+        cls.post = cls.posts[-1]
+        # Подписка после записей: они попадают в ленту читателя.
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        commenters = [
+            User.objects.create_user(username=f'commenter{number}')
+            for number in range(4)
+        ]
+        for commenter in commenters:
+            Comment.objects.create(
+                post=cls.post, author=commenter, text='Комментарий'
+            )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_SITEMAP_ROOT, ignore_errors=True)
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.reader)
+
+    def requests(self):
+        """Запрос к каждому виду posts: имя, URL, метод, пользователь.
+
+        Страницы открывает вошедший пользователь: сессия и он сам — тоже
+        запросы к базе.
+        """
+        author, post = self.author.username, self.post.pk
+        return {
+            'index': (reverse('posts:index'), 'get', self.reader),
+            'index_rss': (reverse('posts:index_rss'), 'get', None),
+            'index_atom': (reverse('posts:index_atom'), 'get', None),
+            'group_posts': (
+                reverse('posts:group_posts', args=[self.group.slug]),
+                'get', self.reader,
+            ),
+            'group_rss': (
+                reverse('posts:group_rss', args=[self.group.slug]),
+                'get', None,
+            ),
+            'group_atom': (
+                reverse('posts:group_atom', args=[self.group.slug]),
+                'get', None,
+            ),
+            'profile': (
+                reverse('posts:profile', args=[author]), 'get', self.reader
+            ),
+            'profile_rss': (
+                reverse('posts:profile_rss', args=[author]), 'get', None
+            ),
+            'profile_atom': (
+                reverse('posts:profile_atom', args=[author]), 'get', None
+            ),
+            'post_detail': (
+                reverse('posts:post_detail', args=[post]), 'get', self.reader
+            ),
+            'post_search': (
+                reverse('posts:post_search') + '?q=Запись', 'get',
+                self.reader,
+            ),
+            'post_create': (reverse('posts:post_create'), 'get', self.author),
+            'post_edit': (
+                reverse('posts:post_edit', args=[post]), 'get', self.author
+            ),
+            'post_comments': (
+                reverse('posts:post_comments', args=[post]), 'get',
+                self.reader,
+            ),
+            'add_comment': (
+                reverse('posts:add_comment', args=[post]), 'post',
+                self.reader,
+            ),
+            'sitemap_index': (reverse('posts:sitemap_index'), 'get', None),
+            'sitemap_shard': (
+                reverse('posts:sitemap_shard', args=['posts', 0]),
+                'get', None,
+            ),
+            'post_export': (
+                reverse('posts:post_export') + '?kind=posts&format=csv',
+                'get', self.staff,
+            ),
+            'follow_index': (
+                reverse('posts:follow_index'), 'get', self.reader
+            ),
+            'profile_follow': (
+                reverse('posts:profile_follow', args=[author]), 'get',
+                self.staff,
+            ),
+            'profile_unfollow': (
+                reverse('posts:profile_unfollow', args=[author]), 'get',
+                self.reader,
+            ),
+        }
+
+    def test_every_url_is_covered(self):
+        """Бюджет проверяется для каждого адреса posts/urls.py"""
+        self.assertEqual(
+            set(self.requests()),
+            {pattern.name for pattern in urls.urlpatterns},
+        )
+
+    def write_requests(self):
+        """Отправка форм записи: имя, URL, пользователь, данные."""
+        return [
+            ('post_create', reverse('posts:post_create'), self.author, {
+                'text': 'Новая запись', 'group': self.group.pk,
+                'image': image(),
+            }),
+            (
+                'post_edit',
+                reverse('posts:post_edit', args=[self.post.pk]),
+                self.author,
+                {
+                    'text': 'Исправленная запись', 'group': self.group.pk,
+                    'image': SimpleUploadedFile(
+                        'other.gif', SMALL_GIF + b'\0',
+                        content_type='image/gif'
+                    ),
+                },
+            ),
+            ('add_comment', reverse('posts:add_comment', args=[self.post.pk]),
+             self.reader, {'text': 'Ещё комментарий'}),
+        ]
+
+    def request_within_budget(self, name, url, method, user, data=None):
+        cache.clear()
+        if user is None:
+            self.client.logout()
+        else:
+            self.client.force_login(user)
+        response = getattr(self.client, method)(url, data)
+        self.assertLess(response.status_code, 400)
+        self.assertEqual(response.query_report.view_name, f'posts:{name}')
+        self.assertWithinQueryBudget(response)
+
+    def test_views_stay_within_query_budget(self):
+        """Виды posts укладываются в бюджет запросов и не делают N+1"""
+        for name, (url, method, user) in self.requests().items():
+            with self.subTest(view=name):
+                self.request_within_budget(
+                    name, url, method, user, {'text': 'Ещё комментарий'}
+                    if method == 'post' else None
+                )
+
+    def test_writes_stay_within_query_budget(self):
+        """Отправка форм записи с картинкой укладывается в бюджет"""
+        for name, url, user, data in self.write_requests():
+            with self.subTest(view=name):
+                self.request_within_budget(name, url, 'post', user, data)
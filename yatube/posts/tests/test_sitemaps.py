@@ -0,0 +1,127 @@
+import gzip
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+
+from posts import sitemaps
+from posts.models import Group, Post
+
+TEMP_SITEMAP_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+BASE_URL = 'http://testserver'
+
+User = get_user_model()
+
+
+@override_settings(SITEMAP_ROOT=TEMP_SITEMAP_ROOT, SITEMAP_SHARD_SIZE=2)
+class SitemapTests(TransactionTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_SITEMAP_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        shutil.rmtree(TEMP_SITEMAP_ROOT, ignore_errors=True)
+        self.author = User.objects.create_user(username='author')
+        self.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        self.posts = [
+            Post.objects.create(
+                text=f'Запись {number}', author=self.author, group=self.group
+            )
+            for number in range(3)
+        ]
+
+    def shard(self, section, number):
+        url = reverse('posts:sitemap_shard', args=[section, number])
+        response = self.client.get(url)
+        return response, gzip.decompress(
+            b''.join(response.streaming_content)
+        ).decode()
+
+    def shard_file(self, section, number):
+        return sitemaps.shard_path(BASE_URL, section, number)
+
+    def test_index_lists_shards(self):
+        """Индекс ссылается на все шарды разделов"""
+        response = self.client.get(reverse('posts:sitemap_index'))
+        content = response.content.decode()
+        first_id = self.posts[0].pk
+        for section, number in (
+            ('posts', sitemaps.shard_of(first_id)),
+            ('posts', sitemaps.shard_of(self.posts[-1].pk)),
+            ('profiles', sitemaps.shard_of(self.author.pk)),
+            ('groups', sitemaps.shard_of(self.group.pk)),
+        ):
+            url = reverse('posts:sitemap_shard', args=[section, number])
+            self.assertIn(f'<loc>{BASE_URL}{url}</loc>', content)
+
+    def test_shard_is_gzipped_and_conditional(self):
+        """Шард отдаётся сжатым, с Last-Modified и 304"""
+        number = sitemaps.shard_of(self.posts[0].pk)
+        response, content = self.shard('posts', number)
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        url = reverse('posts:post_detail', args=[self.posts[0].pk])
+        self.assertIn(f'<loc>{BASE_URL}{url}</loc>', content)
+        self.assertTrue(os.path.exists(self.shard_file('posts', number)))
+
+        response = self.client.get(
+            reverse('posts:sitemap_shard', args=['posts', number]),
+            HTTP_IF_MODIFIED_SINCE=response['Last-Modified'],
+        )
+        self.assertEqual(response.status_code, 304)
+
+        _, content = self.shard(
+            'profiles', sitemaps.shard_of(self.author.pk)
+        )
+        profile = reverse('posts:profile', args=['author'])
+        self.assertIn(f'<loc>{BASE_URL}{profile}</loc>', content)
+
+    def test_only_changed_shard_is_regenerated(self):
+        """Правка записи удаляет только шард с её id"""
+        numbers = {sitemaps.shard_of(post.pk) for post in self.posts}
+        self.assertEqual(len(numbers), 2)
+        for number in numbers:
+            self.shard('posts', number)
+        edited = self.posts[-1]
+        edited_shard = sitemaps.shard_of(edited.pk)
+        edited.text = 'Исправлено'
+        edited.save()
+        for number in numbers:
+            self.assertEqual(
+                os.path.exists(self.shard_file('posts', number)),
+                number != edited_shard,
+            )
+
+        deleted = self.posts[0]
+        url = reverse('posts:post_detail', args=[deleted.pk])
+        deleted_shard = sitemaps.shard_of(deleted.pk)
+        deleted.delete()
+        _, content = self.shard('posts', deleted_shard)
+        self.assertNotIn(f'<loc>{BASE_URL}{url}</loc>', content)
+
+    def test_username_change_regenerates_profiles_shard(self):
+        """После смены имени пользователя в шарде профилей новый адрес"""
+        number = sitemaps.shard_of(self.author.pk)
+        self.shard('profiles', number)
+        self.assertTrue(os.path.exists(self.shard_file('profiles', number)))
+        self.author.username = 'renamed'
+        self.author.save()
+        self.assertFalse(os.path.exists(self.shard_file('profiles', number)))
+        _, content = self.shard('profiles', number)
+        url = reverse('posts:profile', args=['renamed'])
+        self.assertIn(f'<loc>{BASE_URL}{url}</loc>', content)
+
+    def test_unknown_shard(self):
+        """Шард за пределами id — 404"""
+        response = self.client.get(
+            reverse('posts:sitemap_shard', args=['posts', 1000])
+        )
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,208 @@
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from sorl.thumbnail import default
+
+from core.testing import capture_on_commit_callbacks
+from posts import feed_cache, thumbnails
+from posts.models import Post
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+User = get_user_model()
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='author')
+        with mock.patch('posts.thumbnails.queue') as queue:
+            self.post = Post.objects.create(
+                text='Запись с картинкой',
+                author=self.user,
+                image=SimpleUploadedFile(
+                    'small.gif', SMALL_GIF, content_type='image/gif'
+                ),
+            )
+        self.queue = queue
+
+    def store_thumbnail(self, geometry, options, size):
+        """Регистрирует миниатюру так же, как это делает get_thumbnail()."""
+        thumbnail = thumbnails.backend.thumbnail_file(
+            self.post.image, geometry, **options
+        )
+        thumbnail.set_size(size)
+        default.kvstore.set(thumbnail)
+        return thumbnail
+
+    def test_upload_queues_thumbnails(self):
+        """Новое изображение ставит нарезку в очередь, правка текста — нет"""
+        self.queue.assert_called_once_with(self.post)
+        with mock.patch('posts.thumbnails.queue') as queue:
+            self.post.text = 'Новый текст'
+            self.post.save()
+        queue.assert_not_called()
+
+    def test_page_shows_placeholder_until_thumbnail_is_ready(self):
+        """Страница не создаёт миниатюру, а показывает заглушку"""
+        with mock.patch('posts.thumbnails.get_thumbnail') as get_thumbnail:
+            response = self.client.get(reverse('posts:index'))
+        get_thumbnail.assert_not_called()
+        self.assertContains(response, 'img/placeholder.svg')
+        self.assertIsNone(thumbnails.lookup(self.post.image, '960x339'))
+
+        ready = self.store_thumbnail(
+            '960x339', settings.POST_THUMBNAILS['960x339'], (960, 339)
+        )
+        webp = self.store_thumbnail(
+            *thumbnails.webp_variants('960x339', 2)[0], (2, 1)
+        )
+        # Так страницы сбрасывает generate() после нарезки.
+        feed_cache.bump(*feed_cache.post_scopes(self.post))
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, f'src="{ready.url}"')
+        self.assertContains(response, f'srcset="{webp.url} 2w"')
+        self.assertNotContains(response, 'img/placeholder.svg')
+
+    def test_page_looks_up_thumbnails_in_one_query(self):
+        """Миниатюры всех записей страницы ищутся одним запросом"""
+        for _ in range(3):
+            with mock.patch('posts.thumbnails.queue'):
+                Post.objects.create(
+                    text='Ещё запись',
+                    author=self.user,
+                    image=SimpleUploadedFile(
+                        'small.gif', SMALL_GIF, content_type='image/gif'
+                    ),
+                )
+        self.store_thumbnail(
+            '960x339', settings.POST_THUMBNAILS['960x339'], (960, 339)
+        )
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('posts:index'))
+        kvstore_queries = [
+            query for query in queries.captured_queries
+            if 'thumbnail_kvstore' in query['sql']
+        ]
+        self.assertEqual(len(kvstore_queries), 1)
+
+    def test_image_is_described_at_upload(self):
+        """Размеры, цвет и размер файла сохраняются при загрузке"""
+        expected = {
+            'image_width': 2,
+            'image_height': 1,
+            'image_color': self.post.image_color,
+            'image_size': len(SMALL_GIF),
+        }
+        self.assertRegex(self.post.image_color, r'^#[0-9a-f]{6}$')
+        self.assertEqual(
+            Post.objects.values(*expected).get(pk=self.post.pk), expected
+        )
+        Post.objects.update(
+            image_width=None, image_height=None, image_color='',
+            image_size=None,
+        )
+        call_command('describe_images', stdout=StringIO())
+        self.assertEqual(
+            Post.objects.values(*expected).get(pk=self.post.pk), expected
+        )
+
+    def test_pages_do_not_open_images_without_dimensions(self):
+        """Запись без размеров и без файла не ломает страницы"""
+        Post.objects.update(image='posts/missing.gif', image_width=None,
+                            image_height=None)
+        cache.clear()
+        for url in (
+            reverse('posts:index'),
+            reverse('posts:profile', args=(self.user.username,)),
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_generate_creates_every_size_and_resets_pages(self):
+        """Фоновая задача создаёт все размеры и сбрасывает кэш страниц"""
+        version = feed_cache.get_version('index')
+        with mock.patch('posts.thumbnails.get_thumbnail') as get_thumbnail, \
+                capture_on_commit_callbacks(execute=True):
+            call_command('generate_thumbnails', stdout=StringIO())
+        calls = [
+            (call.args[1], call.kwargs.get('format'))
+            for call in get_thumbnail.call_args_list
+        ]
+        # Оригинал шириной 2px: более широкие варианты не нужны.
+        self.assertEqual(calls, [('960x339', None), ('320x113', 'WEBP')])
+        self.assertNotEqual(feed_cache.get_version('index'), version)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageStorageTests(TransactionTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='author')
+
+    def create_post(self):
+        with mock.patch('posts.thumbnails.queue'):
+            return Post.objects.create(
+                text='Запись с картинкой',
+                author=self.user,
+                image=SimpleUploadedFile(
+                    'small.gif', SMALL_GIF, content_type='image/gif'
+                ),
+            )
+
+    def test_shared_image_is_deleted_with_last_post(self):
+        """Одинаковые картинки хранятся один раз и удаляются с последней
+        записью"""
+        first, second = self.create_post(), self.create_post()
+        self.assertEqual(first.image.name, second.image.name)
+        storage = first.image.storage
+        first.delete()
+        self.assertTrue(storage.exists(second.image.name))
+        second.delete()
+        self.assertFalse(storage.exists(second.image.name))
+
+    def test_replaced_image_is_deleted(self):
+        """Заменённая при правке картинка удаляется"""
+        post = self.create_post()
+        old_name = post.image.name
+        with mock.patch('posts.thumbnails.queue'):
+            post.image = SimpleUploadedFile(
+                'other.gif', SMALL_GIF + b'\x00', content_type='image/gif'
+            )
+            post.save()
+        self.assertNotEqual(post.image.name, old_name)
+        self.assertFalse(post.image.storage.exists(old_name))
+        self.assertTrue(post.image.storage.exists(post.image.name))
@@ -36,6 +36,8 @@ class GroupPostURLTests(TestCase):
              'posts/post_detail.html', HTTPStatus.OK),
             (reverse('posts:post_create'),
              'posts/create_post.html', HTTPStatus.OK),
+            (reverse('posts:post_search'),
+             'posts/search.html', HTTPStatus.OK),
             (reverse('posts:post_edit', kwargs={'post_id': cls.post.id}),
              'posts/create_post.html', HTTPStatus.OK),
             ('unexisting_page', 'core/404.html', HTTPStatus.NOT_FOUND),
@@ -1,14 +1,22 @@
 import tempfile
 import shutil
+from http import HTTPStatus
 
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase, override_settings
+from django.template import Context, Template
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
 from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.test.utils import CaptureQueriesContext
 
-from posts.models import Group, Post, Comment, Follow
+from posts.models import Group, Post, Comment, Follow, TimelineEntry
+from core import jobs
+from core.testing import capture_on_commit_callbacks
+from posts import feed_cache, follow_graph
 from posts.forms import PostForm, CommentForm
 
 
@@ -134,22 +142,44 @@ class PostPagesTests(TestCase):
         self.assertNotIn(self.post, response.context.get('page_obj'))
 
     def test_cache_index_page(self):
+        """Фрагмент ленты кэшируется и сбрасывается при записи поста"""
         reverse_name = reverse('posts:index')
         response_start = self.guest_client.get(reverse_name)
-        post = Post.objects.create(
-            text='Test Text',
-            author=self.user,
-            group=self.group,
-        )
+        with capture_on_commit_callbacks(execute=True):
+            post = Post.objects.create(
+                text='Test Text',
+                author=self.user,
+                group=self.group,
+            )
         response_after_post_create = self.guest_client.get(reverse_name)
-        post.delete()
-        response_after_post_delete = self.guest_client.get(reverse_name)
+        self.assertNotEqual(response_start.content,
+                            response_after_post_create.content)
+        self.assertContains(response_after_post_create, post.text)
+        # update() не посылает сигналов: версия не меняется,
+        # и лента отдаётся из кэша, пока его не очистят.
+        Post.objects.filter(pk=post.pk).update(text='Changed Text')
+        response_cached = self.guest_client.get(reverse_name)
         self.assertEqual(response_after_post_create.content,
-                         response_after_post_delete.content)
+                         response_cached.content)
         cache.clear()
         response_cache_cleared = self.guest_client.get(reverse_name)
-        self.assertEqual(response_start.content,
-                         response_cache_cleared.content)
+        self.assertContains(response_cache_cleared, 'Changed Text')
+        with capture_on_commit_callbacks(execute=True):
+            post.delete()
+        response_after_post_delete = self.guest_client.get(reverse_name)
+        self.assertNotContains(response_after_post_delete, 'Changed Text')
+
+    def test_comment_invalidates_post_page_cache(self):
+        """Новый комментарий сразу виден на странице поста"""
+        reverse_name = reverse('posts:post_detail',
+                               kwargs={'post_id': self.post.id})
+        self.guest_client.get(reverse_name)
+        with capture_on_commit_callbacks(execute=True):
+            Comment.objects.create(
+                post=self.post, author=self.user, text='Свежий коммент'
+            )
+        response = self.guest_client.get(reverse_name)
+        self.assertContains(response, 'Свежий коммент')
 
 
 class FollowPagesTests(TestCase):
@@ -164,6 +194,7 @@ class FollowPagesTests(TestCase):
         )
 
     def setUp(self):
+        cache.clear()
         self.follower_client = Client()
         self.following_client = Client()
         self.follower_client.force_login(self.follower)
@@ -211,3 +242,364 @@ class FollowPagesTests(TestCase):
         response = self.follower_client.get(reverse('posts:follow_index'))
         unfollow_posts_count = len(response.context.get('page_obj'))
         self.assertEqual(follow_posts_count - 1, unfollow_posts_count)
+
+    def test_new_post_is_fanned_out_to_followers(self):
+        """Новая запись раскладывается по лентам подписчиков фоновой
+        задачей, поставленной при публикации"""
+        Follow.objects.create(user=self.follower, author=self.following)
+        post = Post.objects.create(text='Новый пост', author=self.following)
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        jobs.run_pending()
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.follower, post=post
+        ).exists())
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        self.assertIn(post, response.context.get('page_obj').object_list)
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_pulled_author_posts_are_mixed_in_on_read(self):
+        """Записи авторов с большим числом подписчиков не раскладываются,
+        а подмешиваются в ленту при чтении
+        """
+        Follow.objects.create(user=self.follower, author=self.following)
+        post = Post.objects.create(text='Новый пост', author=self.following)
+        jobs.run_pending()
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        self.assertIn(post, response.context.get('page_obj').object_list)
+        self.assertIn(self.post, response.context.get('page_obj').object_list)
+
+    def test_follow_is_unique(self):
+        """Повторная подписка не создаёт дубликатов"""
+        url = reverse('posts:profile_follow',
+                      kwargs={'username': self.following.username})
+        self.follower_client.get(url)
+        self.follower_client.get(url)
+        self.assertEqual(Follow.objects.filter(
+            user=self.follower, author=self.following
+        ).count(), 1)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Follow.objects.create(user=self.follower, author=self.following)
+
+
+class FollowGraphTests(TransactionTestCase):
+    """Кэш графа подписок сбрасывается после фиксации транзакции."""
+
+    def setUp(self):
+        cache.clear()
+        self.follower = User.objects.create_user(username='TestFollower')
+        self.following = User.objects.create_user(username='TestFollowing')
+        self.follower_client = Client()
+        self.follower_client.force_login(self.follower)
+
+    def test_follow_graph_is_cached_and_kept_up_to_date(self):
+        """Состояние подписки читается из кэша и обновляется при записи"""
+        self.assertFalse(
+            follow_graph.is_following(self.follower, self.following)
+        )
+        with self.assertNumQueries(0):
+            self.assertFalse(
+                follow_graph.is_following(self.follower, self.following)
+            )
+        self.assertEqual(follow_graph.followers_count(self.following), 0)
+        self.follower_client.get(reverse('posts:profile_follow',
+                                 kwargs={'username': self.following.username}))
+        with self.assertNumQueries(1):
+            self.assertTrue(
+                follow_graph.is_following(self.follower, self.following)
+            )
+        self.assertEqual(follow_graph.followers_count(self.following), 1)
+        template = Template(
+            '{% load follow_tags %}'
+            '{% if user|is_following:author %}yes{% endif %}'
+        )
+        self.assertEqual(template.render(Context({
+            'user': self.follower, 'author': self.following
+        })), 'yes')
+        self.follower_client.get(reverse('posts:profile_unfollow',
+                                 kwargs={'username': self.following.username}))
+        self.assertFalse(
+            follow_graph.is_following(self.follower, self.following)
+        )
+        self.assertEqual(follow_graph.followers_count(self.following), 0)
+
+    def test_stale_graph_does_not_skip_writes(self):
+        """Подписка и отписка пишут в базу, даже если кэш устарел"""
+        self.assertFalse(
+            follow_graph.is_following(self.follower, self.following)
+        )
+        # bulk_create минует сигналы, и кэш остаётся прежним.
+        Follow.objects.bulk_create(
+            [Follow(user=self.follower, author=self.following)]
+        )
+        self.follower_client.get(reverse('posts:profile_unfollow',
+                                 kwargs={'username': self.following.username}))
+        self.assertFalse(Follow.objects.exists())
+        follow_graph.following_ids(self.follower.pk)
+        self.follower_client.get(reverse('posts:profile_follow',
+                                 kwargs={'username': self.following.username}))
+        self.assertTrue(Follow.objects.filter(
+            user=self.follower, author=self.following
+        ).exists())
+
+
+class PostSearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='NoNameAuthor')
+        cls.post = Post.objects.create(
+            text='Кошка спит на диване',
+            author=cls.user,
+        )
+        cls.other_post = Post.objects.create(
+            text='Собака гуляет во дворе',
+            author=cls.user,
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def search(self, query, **params):
+        response = self.guest_client.get(
+            reverse('posts:post_search'), {'q': query, **params}
+        )
+        return list(response.context['page_obj'])
+
+    def test_search_finds_posts_by_words(self):
+        """Поиск находит записи по словам текста без учёта регистра"""
+        self.assertEqual(self.search('КОШКА'), [self.post])
+        self.assertEqual(self.search('собака дворе'), [self.other_post])
+        self.assertEqual(self.search('"кошка OR'), [])
+
+    def test_search_ignores_control_characters(self):
+        """Управляющие символы в запросе не приводят к ошибке"""
+        self.assertEqual(self.search('\x00'), [])
+        self.assertEqual(self.search('кошка\x00'), [self.post])
+        self.assertEqual(self.search('\x01\x1f\x7f'), [])
+
+    def test_search_index_follows_edits(self):
+        """Индекс поиска обновляется при изменении и удалении записи"""
+        self.post.text = 'Попугай сидит на жёрдочке'
+        self.post.save()
+        self.assertEqual(self.search('кошка'), [])
+        self.assertEqual(self.search('попугай'), [self.post])
+        self.post.delete()
+        self.assertEqual(self.search('попугай'), [])
+
+    @override_settings(POSTS_LIMIT=1)
+    def test_search_results_are_paginated_by_cursor(self):
+        """Результаты поиска листаются курсором по рангу"""
+        Post.objects.create(text='Кошка и ещё одна кошка', author=self.user)
+        response = self.guest_client.get(
+            reverse('posts:post_search'), {'q': 'кошка'}
+        )
+        first = response.context['page_obj']
+        self.assertTrue(first.has_next())
+        second = self.search('кошка', after=first.next_cursor)
+        self.assertEqual(len(second), 1)
+        self.assertNotEqual(second[0], first[0])
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='NoNameAuthor')
+        cls.post = Post.objects.create(
+            text='Тестовый текст поста',
+            author=cls.user,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.author_client = Client()
+        self.author_client.force_login(self.user)
+
+    def test_unchanged_pages_answer_not_modified(self):
+        """Неизменившиеся страницы отвечают 304 по ETag и Last-Modified"""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': self.user}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                etag = response['ETag']
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag
+                )
+                self.assertEqual(response.status_code,
+                                 HTTPStatus.NOT_MODIFIED)
+                response = self.guest_client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+                )
+                self.assertEqual(response.status_code,
+                                 HTTPStatus.NOT_MODIFIED)
+
+    def test_writes_change_validators(self):
+        """Новый пост или комментарий меняют ETag страниц"""
+        index_url = reverse('posts:index')
+        detail_url = reverse('posts:post_detail',
+                             kwargs={'post_id': self.post.pk})
+        index_etag = self.guest_client.get(index_url)['ETag']
+        detail_etag = self.guest_client.get(detail_url)['ETag']
+        with capture_on_commit_callbacks(execute=True):
+            Post.objects.create(text='Новый пост', author=self.user)
+            Comment.objects.create(
+                post=self.post, author=self.user, text='Коммент'
+            )
+        response = self.guest_client.get(
+            index_url, HTTP_IF_NONE_MATCH=index_etag
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        response = self.guest_client.get(
+            detail_url, HTTP_IF_NONE_MATCH=detail_etag
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_new_post_by_author_changes_post_validators(self):
+        """Новая запись автора меняет ETag его старых записей:
+        там выводится число его записей"""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        etag = self.guest_client.get(url)['ETag']
+        with capture_on_commit_callbacks(execute=True):
+            Post.objects.create(text='Ещё пост', author=self.user)
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_new_login_changes_validators(self):
+        """После повторного входа страница с формой комментария
+        отдаётся заново: в ней новый CSRF-токен"""
+        User.objects.create_user(username='reader', password='password')
+        credentials = {'username': 'reader', 'password': 'password'}
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        client = Client()
+        client.post(reverse('users:login'), credentials)
+        etag = client.get(url)['ETag']
+        self.assertEqual(
+            client.get(url, HTTP_IF_NONE_MATCH=etag).status_code,
+            HTTPStatus.NOT_MODIFIED
+        )
+        client.get(reverse('users:logout'))
+        client.post(reverse('users:login'), credentials)
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_versions_change_only_after_commit(self):
+        """Кэш сбрасывается после фиксации, а не внутри транзакции"""
+        version = feed_cache.get_version('index')
+        with capture_on_commit_callbacks() as callbacks:
+            Post.objects.create(text='Новый пост', author=self.user)
+            self.assertEqual(feed_cache.get_version('index'), version)
+        self.assertTrue(callbacks)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(feed_cache.get_version('index'), version)
+
+    def test_author_and_group_renames_change_validators(self):
+        """Смена имени автора или названия группы меняет ETag страниц"""
+        group = Group.objects.create(
+            title='Старое название', slug='group', description='Описание'
+        )
+        post = Post.objects.create(
+            text='Пост в группе', author=self.user, group=group
+        )
+        detail_url = reverse('posts:post_detail',
+                             kwargs={'post_id': post.pk})
+        group_url = reverse('posts:group_posts', kwargs={'slug': group.slug})
+        detail_etag = self.guest_client.get(detail_url)['ETag']
+        group_etag = self.guest_client.get(group_url)['ETag']
+        with capture_on_commit_callbacks(execute=True):
+            group.title = 'Новое название'
+            group.save()
+        response = self.guest_client.get(
+            detail_url, HTTP_IF_NONE_MATCH=detail_etag
+        )
+        self.assertContains(response, 'Новое название')
+        response = self.guest_client.get(
+            group_url, HTTP_IF_NONE_MATCH=group_etag
+        )
+        self.assertContains(response, 'Новое название')
+
+        index_url = reverse('posts:index')
+        index_etag = self.guest_client.get(index_url)['ETag']
+        with capture_on_commit_callbacks(execute=True):
+            self.user.first_name, self.user.last_name = 'Лев', 'Толстой'
+            self.user.save()
+        response = self.guest_client.get(
+            index_url, HTTP_IF_NONE_MATCH=index_etag
+        )
+        self.assertContains(response, 'Лев Толстой')
+        # Вход обновляет только last_login: кэш не сбрасывается.
+        version = feed_cache.get_version('index')
+        with capture_on_commit_callbacks(execute=True):
+            self.client.force_login(self.user)
+        self.assertEqual(feed_cache.get_version('index'), version)
+
+    def test_validators_depend_on_user(self):
+        """ETag различается для гостя и авторизованного пользователя"""
+        url = reverse('posts:index')
+        guest_etag = self.guest_client.get(url)['ETag']
+        response = self.author_client.get(url, HTTP_IF_NONE_MATCH=guest_etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertIn('Cookie', response['Vary'])
+
+
+@override_settings(COMMENTS_LIMIT=2)
+class CommentPagesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(text='Пост', author=cls.author)
+        cls.comments = [
+            Comment.objects.create(
+                post=cls.post,
+                author=User.objects.create_user(username=f'reader{index}'),
+                text=f'Комментарий {index}',
+            )
+            for index in range(5)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_comments_are_loaded_in_portions(self):
+        """Комментарии выводятся порциями по COMMENTS_LIMIT"""
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        )
+        self.assertEqual(
+            list(response.context['comments']), self.comments[:2]
+        )
+        shown = []
+        comments = response.context['comments']
+        while comments.has_next():
+            shown += list(comments)
+            response = self.client.get(
+                reverse('posts:post_comments',
+                        kwargs={'post_id': self.post.pk}),
+                {'after': comments.next_cursor},
+            )
+            comments = response.context['comments']
+            self.assertTemplateUsed(response, 'posts/includes/comments.html')
+        shown += list(comments)
+        self.assertEqual(shown, self.comments)
+        self.assertNotContains(response, 'data-load-more')
+
+    def test_comment_authors_are_selected_in_one_query(self):
+        """Авторы комментариев не запрашиваются по одному"""
+        url = reverse('posts:post_comments', kwargs={'post_id': self.post.pk})
+        with override_settings(COMMENTS_LIMIT=1):
+            cache.clear()
+            with CaptureQueriesContext(connection) as few:
+                self.client.get(url)
+        cache.clear()
+        with override_settings(COMMENTS_LIMIT=5):
+            with CaptureQueriesContext(connection) as many:
+                response = self.client.get(url)
+        self.assertEqual(len(many), len(few))
+        for comment in self.comments:
+            self.assertContains(response, comment.author.username)
@@ -0,0 +1,232 @@
+"""Фоновая нарезка миниатюр изображений записей.
+
+Миниатюры всех размеров из POST_THUMBNAILS и их варианты в WebP
+для srcset (POST_IMAGE_WIDTHS) создаёт фоновая задача (core.jobs),
+поставленная при сохранении записи с новым изображением. Шаблоны только ищут
+готовую миниатюру (`lookup()`) и, пока её нет, показывают заглушку,
+так что обработка изображения никогда не выполняется внутри запроса.
+"""
+from collections import namedtuple
+
+from PIL import Image
+from django.conf import settings
+from django.core.cache import cache
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from core import jobs
+from . import feed_cache
+from .models import Post
+
+# Не даёт каждому показу страницы с заглушкой ставить задачу заново.
+QUEUED_KEY = 'thumbnail-queued:{}'
+QUEUED_TIMEOUT = 60
+
+Picture = namedtuple('Picture', 'src srcset')
+
+
+class LookupBackend(ThumbnailBackend):
+
+    def thumbnail_file(self, file_, geometry_string, **options):
+        """Миниатюра с тем же именем, что создал бы `get_thumbnail()`;
+        ни хранилище ключей, ни файлы не читаются."""
+        source = ImageFile(file_)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def lookup(self, file_, geometry_string, **options):
+        """Возвращает готовую миниатюру или None, ничего не создавая."""
+        return default.kvstore.get(
+            self.thumbnail_file(file_, geometry_string, **options)
+        )
+
+
+backend = LookupBackend()
+
+
+def webp_variants(geometry, source_width=None):
+    """Варианты миниатюры в WebP: [(геометрия, параметры sorl)].
+
+    Пропорции совпадают с исходной миниатюрой. Варианты не
+    растягиваются, поэтому если известна ширина оригинала, более
+    широкие варианты, кроме самого узкого, пропускаются.
+    """
+    width, height = (int(side) for side in geometry.split('x'))
+    options = settings.POST_THUMBNAILS[geometry]
+    widths = sorted(settings.POST_IMAGE_WIDTHS.items())
+    if source_width:
+        widths = widths[:1] + [
+            (variant, quality) for variant, quality in widths[1:]
+            if variant <= source_width
+        ]
+    return [
+        (f'{variant}x{round(variant * height / width)}', dict(
+            options, upscale=False, format='WEBP', quality=quality
+        ))
+        for variant, quality in widths
+    ]
+
+
+def all_variants(source_width=None):
+    for geometry, options in settings.POST_THUMBNAILS.items():
+        yield geometry, options
+        yield from webp_variants(geometry, source_width)
+
+
+def lookup(image, geometry, options=None):
+    if not image:
+        return None
+    if options is None:
+        options = settings.POST_THUMBNAILS[geometry]
+    return backend.lookup(image, geometry, **options)
+
+
+def _picture(image, geometry, get):
+    src = get(image, geometry, settings.POST_THUMBNAILS[geometry])
+    if src is None:
+        return Picture(None, '')
+    widths = {}
+    source_width = getattr(image.instance, 'image_width', None)
+    for variant_geometry, options in webp_variants(geometry, source_width):
+        variant = get(image, variant_geometry, options)
+        if variant is not None:
+            # Одинаковые по ширине (не растянутые) варианты не нужны.
+            widths.setdefault(variant.width, variant.url)
+    srcset = ', '.join(f'{url} {width}w' for width, url in widths.items())
+    return Picture(src, srcset)
+
+
+def picture(image, geometry):
+    """Миниатюра для `src` и готовые варианты WebP для `srcset`.
+
+    Если миниатюры страницы уже найдены `prefetch_pictures()`,
+    хранилище ключей не опрашивается.
+    """
+    prefetched = getattr(image.instance, '_pictures', {})
+    if geometry in prefetched:
+        return prefetched[geometry]
+    return _picture(image, geometry, lookup)
+
+
+def lookup_many(files):
+    """Как `kvstore.get()` для каждой миниатюры, но одним `get_many()`
+    к кэшу и одним запросом к базе для всего, чего в кэше нет.
+
+    Возвращает {ключ миниатюры: ImageFile или None}.
+    """
+    kvstore = default.kvstore
+    empty = cached_db_kvstore.EMPTY_VALUE
+    if not isinstance(kvstore, cached_db_kvstore.KVStore):
+        return {file_.key: kvstore.get(file_) for file_ in files}
+    keys = {add_prefix(file_.key): file_.key for file_ in files}
+    values = kvstore.cache.get_many(list(keys))
+    missing = [key for key in keys if key not in values]
+    if missing:
+        rows = dict(KVStoreModel.objects.filter(
+            key__in=missing
+        ).values_list('key', 'value'))
+        # Как и sorl, запоминаем в кэше и отсутствие записи.
+        found = {key: rows.get(key, empty) for key in missing}
+        kvstore.cache.set_many(
+            found, thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT
+        )
+        values.update(found)
+    return {
+        keys[key]: (
+            None if value == empty else deserialize_image_file(value)
+        )
+        for key, value in values.items()
+    }
+
+
+def prefetch_pictures(posts, geometry):
+    """Находит миниатюры всех записей страницы разом и запоминает их
+    в записях для `picture()`."""
+    posts = [post for post in posts if post.image]
+    files = []
+    for post in posts:
+        variants = [(geometry, settings.POST_THUMBNAILS[geometry])]
+        variants += webp_variants(geometry, post.image_width)
+        files += [
+            backend.thumbnail_file(post.image, variant, **options)
+            for variant, options in variants
+        ]
+    found = lookup_many(files)
+
+    def get(image, variant, options):
+        return found.get(backend.thumbnail_file(image, variant, **options).key)
+
+    for post in posts:
+        post._pictures = dict(
+            getattr(post, '_pictures', {}),
+            **{geometry: _picture(post.image, geometry, get)}
+        )
+
+
+def generate(post_id):
+    """Создаёт миниатюры записи и сбрасывает закэшированные страницы
+    с заглушкой."""
+    post = Post.objects.filter(pk=post_id).first()
+    if post is None or not post.image:
+        return
+    for geometry, options in all_variants(post.image_width):
+        get_thumbnail(post.image, geometry, **options)
+    cache.delete(QUEUED_KEY.format(post.image.name))
+    feed_cache.bump_on_commit(*feed_cache.post_scopes(post))
+
+
+def describe(image):
+    """Размеры, средний цвет (#rrggbb) и размер файла изображения.
+
+    Ключи совпадают с полями `Post`. Файл может быть ещё не сохранён
+    в хранилище (только что загружен).
+    """
+    image.open()
+    try:
+        with Image.open(image) as picture:
+            width, height = picture.size
+            # Для JPEG draft() декодирует сразу уменьшенную копию.
+            picture.draft('RGB', (64, 64))
+            picture = picture.convert('RGB')
+            picture.thumbnail((64, 64))
+            color = picture.resize((1, 1), Image.BOX).getpixel((0, 0))
+    finally:
+        image.seek(0)
+    return {
+        'image_width': width,
+        'image_height': height,
+        'image_color': '#%02x%02x%02x' % color,
+        'image_size': image.size,
+    }
+
+
+def forget(name):
+    """Удаляет миниатюры файла, который больше не используется."""
+    storage = Post._meta.get_field('image').storage
+    default.kvstore.delete(ImageFile(name, storage))
+
+
+def queue(post):
+    """Ставит нарезку миниатюр записи в очередь задач; повторные вызовы
+    для того же файла игнорируются."""
+    if not post.image:
+        return
+    if cache.add(QUEUED_KEY.format(post.image.name), True, QUEUED_TIMEOUT):
+        jobs.enqueue(
+            generate, post.pk,
+            key=f'thumbnails:{post.image.name}', priority=jobs.LOW
+        )
@@ -0,0 +1,114 @@
+"""Материализованная лента подписок (fan-out on write).
+
+Новая запись раскладывается по лентам подписчиков автора фоновой
+задачей, поставленной при публикации, поэтому чтение ленты — выборка
+по индексу (user, pub_date) без соединения Follow и Post. Записи авторов,
+у которых подписчиков больше TIMELINE_FANOUT_LIMIT, не раскладываются:
+такие авторы помечаются PulledAuthor, и их записи подмешиваются
+в ленту при чтении.
+"""
+from django.conf import settings
+from django.db.models import Q
+
+from . import follow_graph
+from .models import Follow, Post, PulledAuthor, TimelineEntry
+
+
+def _entries(user_ids, posts):
+    return [
+        TimelineEntry(
+            user_id=user_id,
+            post_id=post.pk,
+            author_id=post.author_id,
+            pub_date=post.pub_date,
+        )
+        for user_id in user_ids
+        for post in posts
+    ]
+
+
+def fan_out(post):
+    """Раскладывает новую запись по лентам подписчиков автора."""
+    if PulledAuthor.objects.filter(author_id=post.author_id).exists():
+        return
+    limit = settings.TIMELINE_FANOUT_LIMIT
+    followers = list(
+        Follow.objects.filter(author_id=post.author_id)
+        .values_list('user_id', flat=True)[:limit + 1]
+    )
+    if len(followers) > limit:
+        PulledAuthor.objects.get_or_create(author_id=post.author_id)
+        return
+    TimelineEntry.objects.bulk_create(
+        _entries(followers, [post]), batch_size=1000, ignore_conflicts=True
+    )
+
+
+def fan_out_post(post_id):
+    """Фоновая задача для `fan_out()`: запись могли удалить, пока
+    задача ждала в очереди."""
+    post = Post.objects.filter(pk=post_id).only(
+        'pk', 'author_id', 'pub_date'
+    ).first()
+    if post is not None:
+        fan_out(post)
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту подписчика последние записи автора."""
+    if PulledAuthor.objects.filter(author_id=author_id).exists():
+        return
+    posts = Post.objects.filter(author_id=author_id).only(
+        'pk', 'author_id', 'pub_date'
+    )[:settings.TIMELINE_BACKFILL_LIMIT]
+    TimelineEntry.objects.bulk_create(
+        _entries([user_id], posts), batch_size=1000, ignore_conflicts=True
+    )
+
+
+def prune(user_id, author_id):
+    """Убирает записи автора из ленты бывшего подписчика."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, author_id=author_id
+    ).delete()
+
+
+def rebuild(user):
+    """Собирает ленту пользователя заново по его подпискам."""
+    TimelineEntry.objects.filter(user=user).delete()
+    for author_id in Follow.objects.filter(user=user).values_list(
+        'author_id', flat=True
+    ):
+        backfill(user.pk, author_id)
+
+
+def get_timeline(user):
+    """Возвращает ленту подписок пользователя.
+
+    Если пользователь не подписан ни на одного «тяжёлого» автора,
+    лента читается целиком из TimelineEntry; иначе к ней подмешиваются
+    записи таких авторов.
+    """
+    followed = follow_graph.following_ids(user.pk)
+    pulled = []
+    if followed:
+        pulled = list(
+            PulledAuthor.objects.filter(author_id__in=followed)
+            .values_list('author_id', flat=True)
+        )
+    if not pulled:
+        return TimelineEntry.objects.filter(user=user).select_related(
+            'post__author', 'post__group'
+        )
+    return Post.objects.filter(
+        Q(id__in=TimelineEntry.objects.filter(user=user).values('post_id'))
+        | Q(author_id__in=pulled)
+    ).select_related('author', 'group')
+
+
+def as_posts(page_obj):
+    """Заменяет записи ленты на сами посты в странице пагинатора."""
+    page_obj.object_list = [
+        getattr(item, 'post', item) for item in page_obj.object_list
+    ]
+    return page_obj
@@ -1,6 +1,6 @@
-from django.urls import path
+from django.urls import path, re_path
 
-from . import views
+from . import feeds, views
 
 
 app_name = 'posts'
@@ -8,13 +8,35 @@ app_name = 'posts'
 urlpatterns = [
     path('group/<slug:slug>/', views.group_posts, name='group_posts'),
     path('', views.index, name='index'),
+    path('rss/', feeds.index_rss, name='index_rss'),
+    path('atom/', feeds.index_atom, name='index_atom'),
+    path('group/<slug:slug>/rss/', feeds.group_rss, name='group_rss'),
+    path('group/<slug:slug>/atom/', feeds.group_atom, name='group_atom'),
+    path('profile/<str:username>/rss/',
+         feeds.profile_rss,
+         name='profile_rss'),
+    path('profile/<str:username>/atom/',
+         feeds.profile_atom,
+         name='profile_atom'),
     path('profile/<str:username>/', views.profile, name='profile'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
+    path('search/', views.post_search, name='post_search'),
     path('create/', views.post_create, name='post_create'),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
+    path('posts/<int:post_id>/comments/',
+         views.post_comments,
+         name='post_comments'),
     path('posts/<int:post_id>/comment/',
          views.add_comment,
          name='add_comment'),
+    path('sitemap.xml', views.sitemap_index, name='sitemap_index'),
+    # Шарды лежат в корне: карта может ссылаться только на адреса
+    # не выше своего каталога.
+    re_path(r'^sitemap-(?P<section>posts|profiles|groups)-(?P<number>\d+)'
+            r'\.xml\.gz$',
+            views.sitemap_shard,
+            name='sitemap_shard'),
+    path('export/', views.post_export, name='post_export'),
     path('follow/', views.follow_index, name='follow_index'),
     path(
         'profile/<str:username>/follow/',
@@ -1,8 +1,188 @@
-from django.core.paginator import Paginator
+import base64
+import binascii
+import json
+import math
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Page, Paginator
 from django.conf import settings
+from django.db.models import Q
+
 
+def get_paginate(page_number, post_list, after=None, before=None,
+                 count=None):
+    """Возвращает страницу постов.
 
-def get_paginate(page_number, post_list):
+    Если в запросе есть курсор (`?after=` или `?before=`), страница
+    строится по ключу (pub_date, id) без OFFSET и COUNT(*), иначе
+    используется обычный постраничный вывод по номеру страницы.
+    `count` — известное заранее число постов (денормализованный
+    счётчик); с ним пагинатор не выполняет COUNT(*).
+    """
+    if after is not None or before is not None:
+        paginator = CursorPaginator(post_list, settings.POSTS_LIMIT)
+        return paginator.get_cursor_page(after, before)
     paginator = Paginator(post_list, settings.POSTS_LIMIT)
+    if count is not None:
+        paginator.count = count
     page_obj = paginator.get_page(page_number)
     return page_obj
+
+
+def get_comments_page(post, after=None):
+    """Комментарии к посту от старых к новым, не больше COMMENTS_LIMIT
+    за раз; следующая порция — по курсору `after`.
+
+    Автор комментария выбирается тем же запросом.
+    """
+    paginator = CursorPaginator(
+        post.comments.select_related('author').order_by('created', 'id'),
+        settings.COMMENTS_LIMIT,
+        keys=('created', 'id'),
+    )
+    return paginator.get_cursor_page(after)
+
+
+# Целые, которые SQLite может принять как параметр запроса.
+MIN_INTEGER, MAX_INTEGER = -2 ** 63, 2 ** 63 - 1
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def is_cursor_value(value):
+    """Подходит ли значение из JSON курсора в качестве ключа: строка,
+    конечное число или целое, которое поместится в SQLite."""
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, int):
+        return MIN_INTEGER <= value <= MAX_INTEGER
+    if isinstance(value, float):
+        return math.isfinite(value)
+    return isinstance(value, str)
+
+
+class CursorPage(Page):
+    """Страница курсорной пагинации, совместимая с шаблонами `Page`."""
+
+    def __init__(self, object_list, paginator, cursor=None, backwards=False,
+                 next_cursor=None, previous_cursor=None):
+        super().__init__(object_list, None, paginator)
+        self.cursor = cursor
+        self.backwards = backwards
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        direction = 'before' if self.backwards else 'after'
+        return '<Page %s %s>' % (direction, self.cursor or '')
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class CursorPaginator(Paginator):
+    """Пагинация по ключу: каждая страница — один индексный запрос.
+
+    `keys` задают порядок выборки так же, как `order_by()`; последний
+    ключ должен быть уникальным, чтобы порядок был однозначным.
+    """
+
+    def __init__(self, object_list, per_page, keys=('-pub_date', '-id')):
+        super().__init__(object_list, per_page)
+        self.keys = keys
+
+    def encode_cursor(self, obj):
+        # obj — экземпляр модели или словарь из values().
+        values = [
+            obj[key.lstrip('-')] if isinstance(obj, dict)
+            else getattr(obj, key.lstrip('-'))
+            for key in self.keys
+        ]
+        # isoformat() без усечения: курсор должен совпадать с ключом точно.
+        data = json.dumps([
+            value.isoformat() if hasattr(value, 'isoformat') else value
+            for value in values
+        ])
+        return base64.urlsafe_b64encode(data.encode()).decode()
+
+    def load_cursor(self, cursor):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (binascii.Error, ValueError, UnicodeError):
+            raise InvalidCursor(cursor)
+        if not isinstance(values, list) or len(values) != len(self.keys):
+            raise InvalidCursor(cursor)
+        if not all(is_cursor_value(value) for value in values):
+            raise InvalidCursor(cursor)
+        return values
+
+    def decode_cursor(self, cursor):
+        values = self.load_cursor(cursor)
+        opts = self.object_list.model._meta
+        try:
+            return [
+                opts.get_field(key.lstrip('-')).to_python(value)
+                for key, value in zip(self.keys, values)
+            ]
+        except (ValidationError, TypeError, ValueError):
+            raise InvalidCursor(cursor)
+
+    def _keyset_filter(self, values, backwards):
+        condition = Q()
+        for index, key in enumerate(self.keys):
+            descending = key.startswith('-') != backwards
+            lookup = 'lt' if descending else 'gt'
+            step = Q(**{f'{key.lstrip("-")}__{lookup}': values[index]})
+            for prev_key, prev_value in zip(self.keys, values[:index]):
+                step &= Q(**{prev_key.lstrip('-'): prev_value})
+            condition |= step
+        return condition
+
+    def _ordering(self, backwards):
+        if not backwards:
+            return self.keys
+        return [
+            key[1:] if key.startswith('-') else f'-{key}'
+            for key in self.keys
+        ]
+
+    def fetch(self, values, backwards):
+        """Возвращает до per_page + 1 объектов после ключа `values`."""
+        queryset = self.object_list
+        if values is not None:
+            queryset = queryset.filter(self._keyset_filter(values, backwards))
+        queryset = queryset.order_by(*self._ordering(backwards))
+        return list(queryset[:self.per_page + 1])
+
+    def cursor_page(self, cursor=None, backwards=False):
+        values = self.decode_cursor(cursor) if cursor else None
+        items = self.fetch(values, backwards)
+        has_more = len(items) > self.per_page
+        items = items[:self.per_page]
+        if backwards:
+            items.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, bool(cursor)
+        next_cursor = previous_cursor = None
+        if items and has_next:
+            next_cursor = self.encode_cursor(items[-1])
+        if items and has_previous:
+            previous_cursor = self.encode_cursor(items[0])
+        return CursorPage(
+            items, self, cursor, backwards, next_cursor, previous_cursor
+        )
+
+    def get_cursor_page(self, after=None, before=None):
+        """Как `get_page()`: битый курсор ведёт на первую страницу."""
+        try:
+            if before:
+                return self.cursor_page(before, backwards=True)
+            return self.cursor_page(after)
+        except InvalidCursor:
+            return self.cursor_page()
@@ -1,65 +1,132 @@
+from urllib.parse import urlencode
+
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
+from django.http import (FileResponse, Http404, HttpResponse,
+                         HttpResponseBadRequest, StreamingHttpResponse)
 from django.shortcuts import get_object_or_404, redirect, render
+from django.utils.cache import get_conditional_response
+from django.utils.functional import SimpleLazyObject
+from django.utils.http import http_date
+from django.views.decorators.vary import vary_on_cookie
 
 from .models import Group, Post, User, Follow
-from .forms import PostForm, CommentForm
-from .utils import get_paginate
+from .forms import PostForm, CommentForm, ExportForm
+from .search import search_posts
+from .utils import get_comments_page, get_paginate
+from .conditional import (conditional_page, group_scopes, index_scopes,
+                          post_scopes, profile_scopes)
+from . import export, feed_cache, follow_graph, sitemaps, timeline
 
 
+@vary_on_cookie
+@conditional_page(index_scopes)
 def index(request):
     page_obj = get_paginate(
         request.GET.get('page'),
-        Post.objects.select_related('author', 'group')
+        Post.objects.select_related('author', 'group'),
+        request.GET.get('after'),
+        request.GET.get('before'),
     )
     context = {
-        'page_obj': page_obj
+        'page_obj': page_obj,
+        'feed_version': feed_cache.get_version('index'),
     }
     return render(request, 'posts/index.html', context)
 
 
+@vary_on_cookie
+@conditional_page(group_scopes)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     page_obj = get_paginate(
         request.GET.get('page'),
-        group.posts.select_related('author')
+        group.posts.select_related('author'),
+        request.GET.get('after'),
+        request.GET.get('before'),
+        count=group.posts_count,
     )
     context = {
         'group': group,
         'page_obj': page_obj,
+        'feed_version': feed_cache.get_version(f'group:{group.pk}'),
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@vary_on_cookie
+@conditional_page(profile_scopes)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    # Строки счётчика нет, пока автор ничего не публиковал.
+    stats = getattr(author, 'stats', None)
     page_obj = get_paginate(
         request.GET.get('page'),
-        author.posts.select_related('group')
+        author.posts.select_related('group'),
+        request.GET.get('after'),
+        request.GET.get('before'),
+        count=stats.posts_count if stats else None,
     )
-    following = Follow.objects.filter(user__username=request.user,
-                                      author=author)
     context = {
         'author': author,
         'page_obj': page_obj,
-        'following': following,
+        'following': follow_graph.is_following(request.user, author),
+        'followers_count': follow_graph.followers_count(author),
+        'feed_version': feed_cache.get_version(f'author:{author.pk}'),
     }
     return render(request, 'posts/profile.html', context)
 
 
+def post_search(request):
+    query = request.GET.get('q', '').strip()
+    page_obj = search_posts(
+        query,
+        request.GET.get('after'),
+        request.GET.get('before'),
+    )
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'query_prefix': urlencode({'q': query}) + '&',
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@vary_on_cookie
+@conditional_page(post_scopes)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post.objects.select_related('author'), id=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), id=post_id
+    )
     comment_form = CommentForm(request.POST or None)
-    comments = post.comments.all()
     author = post.author
     context = {
         'author': author,
         'post': post,
         'form': comment_form,
-        'comments': comments,
+        # Запрос выполнится, только если фрагмент не найден в кэше.
+        'comments': SimpleLazyObject(lambda: get_comments_page(post)),
+        'feed_version': feed_cache.get_version(f'post:{post.pk}'),
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+@vary_on_cookie
+@conditional_page(post_scopes)
+def post_comments(request, post_id):
+    """Следующая порция комментариев для кнопки «Показать ещё»."""
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    context = {
+        'post': post,
+        'comments': get_comments_page(post, request.GET.get('after')),
+        'comments_cursor': request.GET.get('after', ''),
+        'feed_version': feed_cache.get_version(f'post:{post.pk}'),
+    }
+    return render(request, 'posts/includes/comments.html', context)
+
+
 @login_required
 def post_create(request):
     form = PostForm(request.POST or None, request.FILES or None)
@@ -110,8 +177,11 @@ def add_comment(request, post_id):
 def follow_index(request):
     page_obj = get_paginate(
         request.GET.get('page'),
-        Post.objects.filter(author__following__user=request.user)
+        timeline.get_timeline(request.user),
+        request.GET.get('after'),
+        request.GET.get('before'),
     )
+    timeline.as_posts(page_obj)
     context = {
         'page_obj': page_obj
     }
@@ -130,3 +200,44 @@ def profile_unfollow(request, username):
     user = get_object_or_404(User, username=username)
     Follow.objects.filter(user=request.user, author=user).delete()
     return redirect('posts:profile', username)
+
+
+@staff_member_required
+def post_export(request):
+    form = ExportForm(request.GET)
+    if not form.is_valid():
+        return HttpResponseBadRequest(form.errors.as_text())
+    filters = dict(form.cleaned_data)
+    kind, data_format = filters.pop('kind'), filters.pop('format')
+    response = StreamingHttpResponse(
+        export.stream(kind, data_format, **filters),
+        content_type=export.CONTENT_TYPES[data_format]
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{kind}.{data_format}"'
+    )
+    return response
+
+
+def sitemap_index(request):
+    base_url = request.build_absolute_uri('/')[:-1]
+    return HttpResponse(
+        sitemaps.index(base_url), content_type='application/xml'
+    )
+
+
+def sitemap_shard(request, section, number):
+    number = int(number)
+    if number >= sitemaps.shard_count(section):
+        raise Http404
+    shard, modified = sitemaps.open_shard(
+        request.build_absolute_uri('/')[:-1], section, number
+    )
+    modified = int(modified)
+    response = get_conditional_response(request, last_modified=modified)
+    if response is None:
+        response = FileResponse(shard, content_type='application/gzip')
+    else:
+        shard.close()
+    response['Last-Modified'] = http_date(modified)
+    return response
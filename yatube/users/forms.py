@@ -1,6 +1,10 @@
 from django.contrib.auth.forms import (PasswordChangeForm, PasswordResetForm,
                                        SetPasswordForm, UserCreationForm)
 from django.contrib.auth import get_user_model
+from django.template import loader
+
+from core import jobs
+from .tasks import send_email
 
 
 User = get_user_model()
@@ -23,6 +27,24 @@ class PassResetForm(PasswordResetForm):
         model = User
         fields = ('email')
 
+    def send_mail(self, subject_template_name, email_template_name,
+                  context, from_email, to_email,
+                  html_email_template_name=None):
+        # Письмо собирается в запросе (в контексте есть объекты,
+        # которые не сериализуются), а отправляется из очереди задач.
+        subject = loader.render_to_string(subject_template_name, context)
+        subject = ''.join(subject.splitlines())
+        body = loader.render_to_string(email_template_name, context)
+        html_body = None
+        if html_email_template_name is not None:
+            html_body = loader.render_to_string(
+                html_email_template_name, context
+            )
+        jobs.enqueue(
+            send_email, subject, body, from_email, [to_email], html_body,
+            priority=jobs.HIGH
+        )
+
 
 class SetPassForm(SetPasswordForm):
     class Meta:
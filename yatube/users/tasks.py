@@ -0,0 +1,9 @@
+from django.core.mail import EmailMultiAlternatives
+
+
+def send_email(subject, body, from_email, recipients, html_body=None):
+    """Фоновая задача: отправляет готовое письмо."""
+    message = EmailMultiAlternatives(subject, body, from_email, recipients)
+    if html_body:
+        message.attach_alternative(html_body, 'text/html')
+    message.send()
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import tempfile
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -39,10 +40,12 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
+    'api.apps.ApiConfig',
     'sorl.thumbnail',
 ]
 
 MIDDLEWARE = [
+    'core.querybudget.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -75,12 +78,36 @@ TEMPLATES = [
     },
 ]
 
+# Кэш не хранится рядом с кодом: по умолчанию — во временном каталоге
+# системы, путь можно задать переменной окружения DJANGO_CACHE_PATH.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.environ.get(
+            'DJANGO_CACHE_PATH',
+            os.path.join(tempfile.gettempdir(), 'yatube-cache.sqlite3'),
+        ),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            'MAX_SIZE': 256 * 2 ** 20,
+        },
     }
 }
 
+# Тесты пишут кэш и карту сайта во временный каталог.
+TEST_RUNNER = 'core.testing.TempFilesRunner'
+
+# Горячие фрагменты: сколько секунд отдавать устаревшее значение,
+# пока его пересчитывает один запрос, и параметры пересчёта: срок
+# блокировки и сколько секунд без значения ждать чужого пересчёта.
+SWR_STALE_TIMEOUT = 300
+SWR_LOCK_TIMEOUT = 30
+SWR_WAIT_TIMEOUT = 3
+SWR_BETA = 1.0
+
+# Страницы, которые `manage.py warmup` запрашивает при прогреве.
+WARMUP_URLS = ['/']
+
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
 DATABASES = {
@@ -92,6 +119,10 @@ DATABASES = {
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Кто отдаёт байты файлов из MEDIA_ROOT: None — само приложение,
+# 'x-sendfile' или 'x-accel-redirect' — веб-сервер перед ним.
+MEDIA_SENDFILE = None
+MEDIA_ACCEL_PREFIX = '/protected-media/'
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -109,7 +140,79 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 POSTS_LIMIT = 10
+COMMENTS_LIMIT = 50
+# Размер страницы JSON API по умолчанию и наибольший через ?limit=.
+API_PAGE_SIZE = 20
+API_MAX_PAGE_SIZE = 500
 LETTERS_LIMIT = 15
+# RSS/Atom: число записей в ленте и срок хранения готового XML
+# (устаревает и раньше — при новой записи в области ленты).
+FEED_ITEMS = 20
+FEED_CACHE_TIMEOUT = 21600
+# Карта сайта: сколько id записей (авторов, групп) в одном шарде
+# и где хранятся сжатые шарды.
+SITEMAP_SHARD_SIZE = 10000
+SITEMAP_ROOT = os.path.join(BASE_DIR, 'sitemaps')
+# Сколько строк выгрузки читается из базы и кодируется за раз.
+EXPORT_CHUNK_SIZE = 2000
+
+# Лента подписок: авторы с большим числом подписчиков не раскладываются
+# по лентам при публикации, их записи подмешиваются при чтении.
+TIMELINE_FANOUT_LIMIT = 10000
+TIMELINE_BACKFILL_LIMIT = 200
+# Сколько секунд живёт закэшированный граф подписок (posts.follow_graph).
+FOLLOW_GRAPH_TIMEOUT = 3600
+
+# Размеры миниатюр изображений записей; создаются фоновой задачей.
+POST_THUMBNAILS = {
+    '960x339': {'crop': 'center', 'upscale': True},
+}
+# Для srcset каждая миниатюра нарезается ещё и в WebP нескольких ширин:
+# ширина -> качество. Крупные варианты показываются на экранах с высокой
+# плотностью пикселей, где артефакты сжатия менее заметны.
+POST_IMAGE_WIDTHS = {320: 80, 640: 75, 960: 70, 1920: 60}
+
+# Очередь фоновых задач (core.jobs, manage.py run_workers): сколько
+# задач исполнитель выполняет одновременно, как часто опрашивает
+# очередь, через сколько секунд взятая, но не завершённая задача
+# снова становится видна, и повторы упавших задач: число попыток,
+# первая задержка (затем удваивается) и её предел. JOB_EAGER выполняет
+# задачи сразу после фиксации транзакции, без run_workers (разработка).
+JOB_EAGER = DEBUG
+JOB_WORKERS = 4
+JOB_POLL_INTERVAL = 1
+JOB_VISIBILITY_TIMEOUT = 300
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_DELAY = 10
+JOB_RETRY_MAX_DELAY = 3600
+
+# Бюджет SQL-запросов на запрос к сайту (core.querybudget): действует
+# при DEBUG и в тестах. Наибольшее число запросов по имени вида (для
+# холодного кэша, вошедшего пользователя и записей с картинками, ещё
+# без миниатюр; для форм — отправка с новой картинкой), для остальных
+# видов — QUERY_BUDGET_DEFAULT; сколько одинаковых по форме запросов
+# считается N+1; бросать ли исключение вместо предупреждения в журнал.
+QUERY_BUDGET_ENABLED = DEBUG
+QUERY_BUDGETS = {
+    'posts:index': 6,
+    'posts:group_posts': 8,
+    'posts:profile': 10,
+    'posts:post_detail': 7,
+    'posts:post_comments': 5,
+    'posts:post_search': 6,
+    'posts:follow_index': 8,
+    # Запись, её счётчики, задачи нарезки и раскладки, ссылка на файл.
+    'posts:post_create': 11,
+    # То же, плюс перенос между группами и освобождение старого файла.
+    'posts:post_edit': 14,
+    'posts:add_comment': 5,
+    # Подписка сразу раскладывает записи автора в ленту подписчика.
+    'posts:profile_follow': 8,
+    'posts:profile_unfollow': 6,
+}
+QUERY_BUDGET_DEFAULT = 10
+QUERY_DUPLICATES_LIMIT = 3
+QUERY_BUDGET_RAISE = False
 
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
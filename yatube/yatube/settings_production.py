@@ -0,0 +1,36 @@
+"""Настройки для боевого сервера.
+
+    export DJANGO_SETTINGS_MODULE=yatube.settings_production
+    YATUBE_WARMUP=1 gunicorn yatube.wsgi
+"""
+import os
+
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASES, TEMPLATES
+
+SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY', SECRET_KEY)  # noqa: F405
+
+DEBUG = False
+# settings.py вычисляет их из DEBUG ещё до этого файла.
+QUERY_BUDGET_ENABLED = False
+# Задачи выполняет manage.py run_workers.
+JOB_EAGER = False
+
+ALLOWED_HOSTS = os.environ.get(
+    'DJANGO_ALLOWED_HOSTS', ','.join(ALLOWED_HOSTS)  # noqa: F405
+).split(',')
+
+# Шаблоны разбираются один раз на процесс и хранятся в памяти.
+TEMPLATES = [dict(TEMPLATES[0], APP_DIRS=False)]
+TEMPLATES[0]['OPTIONS'] = dict(TEMPLATES[0]['OPTIONS'], loaders=[
+    ('django.template.loaders.cached.Loader', [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]),
+])
+
+# Соединение с базой переиспользуется между запросами.
+DATABASES = {'default': dict(DATABASES['default'], CONN_MAX_AGE=600)}
+
+# Например, nginx: location /protected-media/ { internal; alias ...; }
+MEDIA_SENDFILE = os.environ.get('MEDIA_SENDFILE') or None
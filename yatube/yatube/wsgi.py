@@ -14,3 +14,11 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
 
 application = get_wsgi_application()
+
+# YATUBE_WARMUP=1 прогревает каждый воркер при старте, а
+# YATUBE_WARMUP=preload — мастер-процесс до fork (gunicorn --preload):
+# тогда соединения с базой открывает уже каждый воркер сам.
+if os.environ.get('YATUBE_WARMUP'):
+    from core.warmup import warmup
+
+    warmup(databases=os.environ['YATUBE_WARMUP'] != 'preload')